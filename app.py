@@ -1,7 +1,10 @@
+import threading
 from app import create_app
+from app.services.warmup import WarmupService
 
 app = create_app()
 
 if __name__ == '__main__':
+    # 开发服务器：后台预热，预热完成前 /readyz 返回503
+    threading.Thread(target=WarmupService.warm_up, daemon=True).start()
     app.run(debug=True, host='0.0.0.0', port=5000)
-
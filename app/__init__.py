@@ -6,14 +6,27 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
-    # 启用CORS支持
-    CORS(app)
+    # 启用CORS支持；Arrow响应的分页和截断信息在自定义响应头中，需要允许跨域读取
+    CORS(app, expose_headers=['ETag', 'X-Query-Id', 'X-Truncated', 'X-Truncated-Reason', 'X-Table-Name',
+                              'X-Total', 'X-Total-Approximate', 'X-Limit', 'X-Offset', 'X-Approximate',
+                              'X-Next-Cursor', 'X-Has-More'])
+    
+    # 请求计时和指标
+    from app.services import metrics as metrics_service
+    metrics_service.init_app(app)
     
     # 注册Blueprint
-    from app.api import datasets, reports, data
+    from app.api import datasets, reports, data, admin, metrics, health
     app.register_blueprint(datasets.bp, url_prefix='/api/datasets')
     app.register_blueprint(reports.bp, url_prefix='/api/reports')
     app.register_blueprint(data.bp, url_prefix='/api/data')
+    app.register_blueprint(admin.bp, url_prefix='/api/admin')
+    app.register_blueprint(metrics.bp)
+    app.register_blueprint(health.bp)
+    
+    # 固定配置中的热点数据集到内存副本（后台复制，不阻塞启动）
+    from app.services.dataset_service import DatasetService
+    DatasetService.pin_configured_datasets()
     
     return app
 
@@ -0,0 +1,188 @@
+from flask import Blueprint, request, jsonify
+from app.db import pool_stats, evict_idle_connections, replica_manager, federated_pool
+from app.services.index_advisor import index_advisor
+from app.services.metrics import metrics_summary
+from app.services.slow_query_log import slow_query_log
+from app.services.query_cache import query_cache
+from app.services.query_guard import running_queries
+from app.services.totals_cache import totals_cache
+
+bp = Blueprint('admin', __name__)
+
+@bp.route('/pools', methods=['GET'])
+def get_pools():
+    """获取连接池统计信息"""
+    try:
+        return jsonify({
+            'code': 200,
+            'data': pool_stats() + [federated_pool.stats()],
+        })
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
+
+@bp.route('/pools/evict', methods=['POST'])
+def evict_pools():
+    """立即关闭所有空闲超时的连接"""
+    try:
+        evicted = evict_idle_connections() + federated_pool.evict_idle()
+        return jsonify({
+            'code': 200,
+            'data': {'evicted': evicted},
+        })
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
+
+@bp.route('/caches', methods=['GET'])
+def get_caches():
+    """获取各类缓存的统计信息"""
+    try:
+        return jsonify({
+            'code': 200,
+            'data': {
+                'query': query_cache.stats(),
+                'totals': totals_cache.stats(),
+            },
+        })
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
+
+@bp.route('/caches/clear', methods=['POST'])
+def clear_caches():
+    """清空查询结果缓存和总数缓存"""
+    try:
+        query_cache.clear()
+        totals_cache.clear()
+        return jsonify({
+            'code': 200,
+            'message': 'Caches cleared',
+        })
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
+
+@bp.route('/indexes/recommendations', methods=['GET'])
+def get_index_recommendations():
+    """根据记录的查询模式给出索引建议"""
+    try:
+        return jsonify({
+            'code': 200,
+            'data': {
+                'recommendations': index_advisor.recommendations(
+                    dataset_id=request.args.get('dataset_id', type=int),
+                    min_count=request.args.get('min_count', type=int),
+                ),
+                'stats': index_advisor.stats(),
+            },
+        })
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
+
+@bp.route('/indexes/apply', methods=['POST'])
+def apply_index_recommendations():
+    """创建当前建议的索引"""
+    try:
+        data = request.get_json(silent=True) or {}
+        created = index_advisor.apply(
+            dataset_id=data.get('dataset_id'),
+            min_count=data.get('min_count'),
+        )
+        return jsonify({
+            'code': 200,
+            'data': {'created': created},
+        })
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
+
+@bp.route('/slow-queries', methods=['GET'])
+def get_slow_queries():
+    """查看慢查询：按规范化语句聚合的统计和最近的慢查询记录"""
+    try:
+        dataset_id = request.args.get('dataset_id', type=int)
+        return jsonify({
+            'code': 200,
+            'data': {
+                'statements': slow_query_log.statements(dataset_id),
+                'recent': slow_query_log.entries(dataset_id, request.args.get('limit', 100, type=int)),
+                'stats': slow_query_log.stats(),
+            },
+        })
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
+
+@bp.route('/slow-queries/clear', methods=['POST'])
+def clear_slow_queries():
+    """清空内存中的慢查询记录（旁路文件中的记录保留）"""
+    try:
+        slow_query_log.clear()
+        return jsonify({
+            'code': 200,
+            'message': 'Slow query log cleared',
+        })
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
+
+@bp.route('/metrics', methods=['GET'])
+def get_metrics_summary():
+    """各项延迟、行数和响应大小指标的 p50/p95/p99"""
+    try:
+        return jsonify({
+            'code': 200,
+            'data': metrics_summary(),
+        })
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
+
+@bp.route('/queries', methods=['GET'])
+def get_running_queries():
+    """获取所有工作进程中执行中的自定义SQL查询"""
+    try:
+        dataset_id = request.args.get('dataset_id', type=int)
+        return jsonify({
+            'code': 200,
+            'data': running_queries.running(dataset_id),
+        })
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
+
+@bp.route('/replicas', methods=['GET'])
+def get_replicas():
+    """获取内存副本的内存占用、命中和加载统计"""
+    try:
+        return jsonify({
+            'code': 200,
+            'data': replica_manager.stats(),
+        })
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
@@ -0,0 +1,40 @@
+import hashlib
+import json
+from typing import Optional
+from flask import Response, request
+
+
+def make_etag(*parts) -> str:
+    """由版本标识和请求参数生成强ETag（不含引号）"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def request_payload():
+    """参与ETag计算的请求参数：GET取查询字符串，其他方法取JSON请求体"""
+    if request.method == 'GET':
+        return sorted(request.args.items(multi=True))
+    return request.get_json(silent=True)
+
+
+def not_modified(etag: Optional[str]) -> Optional[Response]:
+    """If-None-Match 与当前ETag匹配时返回304响应，否则（或etag为None时）返回None
+
+    路由在执行查询、序列化JSON之前调用，命中时只花费一次版本检查。
+    POST接口同样支持（由前端显式发送 If-None-Match）。
+    """
+    if not etag or not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def with_etag(response: Response, etag: Optional[str]) -> Response:
+    """为200响应附加ETag；no-cache 要求客户端每次使用前重新验证"""
+    if not etag:
+        return response
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -1,24 +1,142 @@
-from flask import Blueprint, request, jsonify
+import json
+from flask import Blueprint, Response, request, jsonify
+from app.api.conditional import make_etag, not_modified, with_etag
 from app.services.data_service import DataService
+from app.services.dataset_service import DatasetService
+from app.services.query_guard import QueryInterruptedError, running_queries
+from app.services.result_format import ARROW_MIMETYPE, arrow_ipc_stream, check_format, to_columnar
 
 bp = Blueprint('data', __name__)
 service = DataService()
 
+def _ndjson_response(stream):
+    """把查询生成器转换为NDJSON流式响应
+
+    第一行为表头（columns等），之后每行一条记录，最后一行为 {"done": true, "rows": n}。
+    查询在取表头时执行，因此SQL错误仍以普通的400响应返回。
+    """
+    header = next(stream)
+
+    def generate():
+        rows = 0
+        try:
+            yield json.dumps(header, ensure_ascii=False) + '\n'
+            for batch in stream:
+                rows += len(batch)
+                yield ''.join(json.dumps(row, ensure_ascii=False, default=str) + '\n' for row in batch)
+            yield json.dumps({'done': True, 'rows': rows}) + '\n'
+        except Exception as e:
+            yield json.dumps({'error': str(e), 'rows': rows}, ensure_ascii=False) + '\n'
+        finally:
+            stream.close()
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+def _arrow_response(stream):
+    """把查询生成器转换为 Arrow IPC 流式响应，每批行对应一个 RecordBatch"""
+    header = next(stream)
+
+    def generate():
+        try:
+            yield from arrow_ipc_stream(header['columns'], stream)
+        finally:
+            stream.close()
+
+    headers = {}
+    if header.get('table_name'):
+        headers['X-Table-Name'] = header['table_name']
+    return Response(generate(), mimetype=ARROW_MIMETYPE, headers=headers)
+
+def _data_etag(data):
+    """非流式查询的ETag：数据集的数据版本加上请求参数，数据集不存在时不生成"""
+    version = DatasetService.get_dataset_version(data['dataset_id'])
+    return make_etag(request.path, version, data) if version else None
+
+def _federated_etag(data):
+    """跨数据集查询的ETag：所有数据集的数据版本加上请求参数，有数据集不存在时不生成"""
+    versions = [DatasetService.get_dataset_version(dataset_id) for dataset_id in data.get('dataset_ids') or []]
+    if not versions or not all(versions):
+        return None
+    return make_etag(request.path, versions, data)
+
+def _format_rows(result, result_format):
+    """columnar 格式下把 data 转换为与 columns 对齐的列数组"""
+    if result_format == 'columnar':
+        return to_columnar(result['columns'], result['data'])
+    return result['data']
+
+def _table_data_headers(result):
+    """非流式Arrow响应的分页信息（JSON格式中的 total、next_cursor 等字段）放在响应头中"""
+    headers = {'X-Total-Approximate': str(bool(result.get('total_approximate'))).lower()}
+    for name, key in (('X-Total', 'total'), ('X-Limit', 'limit'), ('X-Offset', 'offset')):
+        # 键集分页没有 offset，count_mode 不计数时没有 total
+        if result.get(key) is not None:
+            headers[name] = str(result[key])
+    if result.get('table_name'):
+        headers['X-Table-Name'] = result['table_name']
+    if result.get('approximate'):
+        headers['X-Approximate'] = 'true'
+    if 'next_cursor' in result:
+        headers['X-Has-More'] = str(bool(result['has_more'])).lower()
+        if result['next_cursor']:
+            headers['X-Next-Cursor'] = result['next_cursor']
+    return headers
+
 @bp.route('/query', methods=['POST'])
 def query_sql():
-    """执行SQL查询"""
+    """执行SQL查询（受数据集执行预算约束，可按 query_id 取消）"""
     try:
         data = request.get_json()
+        result_format = check_format(data.get('format'))
+        if data.get('stream'):
+            # 流式响应只受时间预算约束，不限制行数和字节数（内存占用只与批大小有关）
+            stream = service.stream_sql(
+                dataset_id=data['dataset_id'],
+                sql=data['sql'],
+                params=data.get('params', []),
+                query_id=data.get('query_id'),
+                timeout_ms=data.get('timeout_ms'),
+            )
+            return _arrow_response(stream) if result_format == 'arrow' else _ndjson_response(stream)
+        etag = _data_etag(data)
+        cached = not_modified(etag)
+        if cached:
+            return cached
         result = service.execute_sql(
             dataset_id=data['dataset_id'],
             sql=data['sql'],
             params=data.get('params', []),
+            use_cache=data.get('use_cache', True),
+            query_id=data.get('query_id'),
+            timeout_ms=data.get('timeout_ms'),
+            max_rows=data.get('max_rows'),
+            max_bytes=data.get('max_bytes'),
         )
-        return jsonify({
+        if result_format == 'arrow':
+            # 与JSON格式相同的行数、字节数上限，截断信息放在响应头中
+            headers = {'X-Query-Id': result['query_id'], 'X-Truncated': str(result['truncated']).lower()}
+            if result['truncated_reason']:
+                headers['X-Truncated-Reason'] = result['truncated_reason']
+            return with_etag(Response(b''.join(arrow_ipc_stream(result['columns'], [result['data']])),
+                                      mimetype=ARROW_MIMETYPE, headers=headers), etag)
+        return with_etag(jsonify({
             'code': 200,
-            'data': result['data'],
+            'format': result_format,
+            'data': _format_rows(result, result_format),
             'columns': result['columns'],
-        })
+            'query_id': result['query_id'],
+            'truncated': result['truncated'],
+            'truncated_reason': result['truncated_reason'],
+        }), etag)
+    except QueryInterruptedError as e:
+        # 超时返回408，被取消返回409
+        code = 408 if e.reason == 'timeout' else 409
+        return jsonify({
+            'code': code,
+            'message': str(e),
+            'reason': e.reason,
+            'query_id': e.query_id,
+        }), code
     except ValueError as e:
         return jsonify({
             'code': 400,
@@ -30,27 +148,234 @@ def query_sql():
             'message': str(e),
         }), 500
 
+@bp.route('/query/<query_id>/cancel', methods=['POST'])
+def cancel_query(query_id):
+    """取消执行中的查询"""
+    if not running_queries.cancel(query_id):
+        return jsonify({
+            'code': 404,
+            'message': 'Query not found or already finished',
+        }), 404
+    return jsonify({
+        'code': 200,
+        'data': {'success': True},
+    })
+
 @bp.route('/table-data', methods=['POST'])
 def get_table_data():
     """获取数据表数据，支持可选的table_name，当未指定时根据过滤条件自动选择表"""
     try:
         data = request.get_json()
+        result_format = check_format(data.get('format'))
+        if data.get('stream'):
+            # 流式响应默认返回全部行
+            stream = service.stream_table_data(
+                dataset_id=data['dataset_id'],
+                table_name=data.get('table_name'),
+                filters=data.get('filters', []),
+                limit=data.get('limit'),
+                offset=data.get('offset', 0),
+            )
+            return _arrow_response(stream) if result_format == 'arrow' else _ndjson_response(stream)
+        etag = _data_etag(data)
+        cached = not_modified(etag)
+        if cached:
+            return cached
         result = service.get_table_data(
             dataset_id=data['dataset_id'],
             table_name=data.get('table_name'),  # 改为可选
             filters=data.get('filters', []),
             limit=data.get('limit', 100),
             offset=data.get('offset', 0),
+            pagination=data.get('pagination', 'offset'),
+            cursor=data.get('cursor'),
+            order_by=data.get('order_by'),
+            order=data.get('order', 'asc'),
+            count_mode=data.get('count_mode', 'exact'),
+            use_cache=data.get('use_cache', True),
+            approximate=data.get('approximate', False),
         )
-        return jsonify({
+        if result_format == 'arrow':
+            return with_etag(Response(b''.join(arrow_ipc_stream(result['columns'], [result['data']])),
+                                      mimetype=ARROW_MIMETYPE, headers=_table_data_headers(result)), etag)
+        response = {
             'code': 200,
-            'data': result['data'],
+            'format': result_format,
+            'data': _format_rows(result, result_format),
             'columns': result['columns'],
             'total': result['total'],
+            'total_approximate': result.get('total_approximate', False),
             'limit': result['limit'],
             'offset': result['offset'],
             'table_name': result.get('table_name'),  # 返回实际使用的表名
-        })
+        }
+        if result.get('approximate'):
+            # 近似模式：行取自样本，total 为估计值
+            response['approximate'] = True
+            response['total_interval'] = result['total_interval']
+            response['sample'] = result['sample']
+        if 'next_cursor' in result:
+            # 键集分页模式
+            response['next_cursor'] = result['next_cursor']
+            response['has_more'] = result['has_more']
+        return with_etag(jsonify(response), etag)
+    except ValueError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e),
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
+
+@bp.route('/aggregate', methods=['POST'])
+def aggregate_data():
+    """在服务端按维度聚合数据，只返回分组结果"""
+    try:
+        data = request.get_json()
+        result_format = check_format(data.get('format'))
+        etag = _data_etag(data)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        result = service.aggregate(
+            dataset_id=data['dataset_id'],
+            table_name=data.get('table_name'),
+            dimensions=data.get('dimensions', []),
+            measures=data.get('measures', []),
+            filters=data.get('filters', []),
+            sort=data.get('sort', []),
+            limit=data.get('limit'),
+            use_cache=data.get('use_cache', True),
+            use_rollup=data.get('use_rollup', True),
+            approximate=data.get('approximate', False),
+        )
+        if result_format == 'arrow':
+            return with_etag(Response(b''.join(arrow_ipc_stream(result['columns'], [result['data']])),
+                                      mimetype=ARROW_MIMETYPE, headers={'X-Table-Name': result['table_name']}),
+                             etag)
+        return with_etag(jsonify({
+            'code': 200,
+            'format': result_format,
+            'data': _format_rows(result, result_format),
+            'columns': result['columns'],
+            'table_name': result['table_name'],
+            'rollup': result['rollup'],
+            'approximate': result['approximate'],
+            'sample': result['sample'],
+            'estimates': result['estimates'],
+        }), etag)
+    except ValueError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e),
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
+
+@bp.route('/federated/query', methods=['POST'])
+def query_federated_sql():
+    """跨数据集执行SQL查询，表以 ds<数据集ID>.<表名> 引用"""
+    try:
+        data = request.get_json()
+        result_format = check_format(data.get('format'))
+        if result_format == 'arrow':
+            raise ValueError("Arrow format is not supported for federated queries")
+        etag = _federated_etag(data)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        result = service.execute_federated_sql(
+            dataset_ids=data['dataset_ids'],
+            sql=data['sql'],
+            params=data.get('params', []),
+            use_cache=data.get('use_cache', True),
+            query_id=data.get('query_id'),
+            timeout_ms=data.get('timeout_ms'),
+            max_rows=data.get('max_rows'),
+            max_bytes=data.get('max_bytes'),
+        )
+        return with_etag(jsonify({
+            'code': 200,
+            'format': result_format,
+            'data': _format_rows(result, result_format),
+            'columns': result['columns'],
+            'datasets': result['datasets'],
+            'query_id': result['query_id'],
+            'truncated': result['truncated'],
+            'truncated_reason': result['truncated_reason'],
+        }), etag)
+    except QueryInterruptedError as e:
+        code = 408 if e.reason == 'timeout' else 409
+        return jsonify({
+            'code': code,
+            'message': str(e),
+            'reason': e.reason,
+            'query_id': e.query_id,
+        }), code
+    except ValueError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e),
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
+
+@bp.route('/federated/table-data', methods=['POST'])
+def get_federated_table_data():
+    """合并多个数据集中同名表的数据，过滤条件下推到每个数据集"""
+    try:
+        data = request.get_json()
+        result_format = check_format(data.get('format'))
+        if result_format == 'arrow':
+            raise ValueError("Arrow format is not supported for federated queries")
+        etag = _federated_etag(data)
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        result = service.get_federated_table_data(
+            dataset_ids=data['dataset_ids'],
+            table_name=data['table_name'],
+            filters=data.get('filters', []),
+            limit=data.get('limit', 100),
+            offset=data.get('offset', 0),
+            count_mode=data.get('count_mode', 'exact'),
+            use_cache=data.get('use_cache', True),
+            query_id=data.get('query_id'),
+            timeout_ms=data.get('timeout_ms'),
+            max_rows=data.get('max_rows'),
+            max_bytes=data.get('max_bytes'),
+        )
+        return with_etag(jsonify({
+            'code': 200,
+            'format': result_format,
+            'data': _format_rows(result, result_format),
+            'columns': result['columns'],
+            'total': result['total'],
+            'limit': result['limit'],
+            'offset': result['offset'],
+            'table_name': result['table_name'],
+            'dataset_ids': result['dataset_ids'],
+            'query_id': result['query_id'],
+            'truncated': result['truncated'],
+            'truncated_reason': result['truncated_reason'],
+        }), etag)
+    except QueryInterruptedError as e:
+        code = 408 if e.reason == 'timeout' else 409
+        return jsonify({
+            'code': code,
+            'message': str(e),
+            'reason': e.reason,
+            'query_id': e.query_id,
+        }), code
     except ValueError as e:
         return jsonify({
             'code': 400,
@@ -87,3 +412,31 @@ def insert_data():
             'message': str(e),
         }), 500
 
+
+@bp.route('/bulk-insert', methods=['POST'])
+def bulk_insert_data():
+    """批量插入数据：rows 为对象数组，或 columns 为 {字段名: 值数组}"""
+    try:
+        data = request.get_json()
+        result = service.bulk_insert_table_data(
+            dataset_id=data['dataset_id'],
+            table_name=data['table_name'],
+            rows=data.get('rows'),
+            columns=data.get('columns'),
+            batch_size=data.get('batch_size'),
+            atomic=data.get('atomic', False),
+        )
+        return jsonify({
+            'code': 200,
+            'data': result,
+        })
+    except ValueError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e),
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
@@ -1,5 +1,10 @@
+import json
 from flask import Blueprint, request, jsonify
+from app.api.conditional import make_etag, not_modified, with_etag
 from app.services.dataset_service import DatasetService
+from app.services.import_service import ImportService
+from app.services.rollup_service import RollupService
+from app.services.sample_service import SampleService
 
 bp = Blueprint('datasets', __name__)
 service = DatasetService()
@@ -8,11 +13,15 @@ service = DatasetService()
 def get_datasets():
     """获取数据集列表"""
     try:
+        etag = make_etag(request.path, service.get_datasets_version())
+        cached = not_modified(etag)
+        if cached:
+            return cached
         datasets = service.get_datasets()
-        return jsonify({
+        return with_etag(jsonify({
             'code': 200,
             'data': [ds.to_dict() for ds in datasets],
-        })
+        }), etag)
     except Exception as e:
         return jsonify({
             'code': 500,
@@ -33,6 +42,11 @@ def create_dataset():
             'code': 200,
             'data': dataset.to_dict(),
         }), 201
+    except ValueError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e),
+        }), 400
     except Exception as e:
         return jsonify({
             'code': 500,
@@ -43,11 +57,16 @@ def create_dataset():
 def get_tables(dataset_id):
     """获取数据表列表"""
     try:
+        version = service.get_dataset_version(dataset_id)
+        etag = make_etag(request.path, version) if version else None
+        cached = not_modified(etag)
+        if cached:
+            return cached
         tables = service.get_tables(dataset_id)
-        return jsonify({
+        return with_etag(jsonify({
             'code': 200,
             'data': [table.to_dict() for table in tables],
-        })
+        }), etag)
     except Exception as e:
         return jsonify({
             'code': 500,
@@ -107,3 +126,306 @@ def add_column(dataset_id, table_name):
             'message': str(e),
         }), 500
 
+
+def _form_list(value):
+    """表单中的列表参数：JSON数组或逗号分隔的字符串"""
+    if not value:
+        return []
+    if value.lstrip().startswith('['):
+        return json.loads(value)
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+@bp.route('/<int:dataset_id>/import', methods=['POST'])
+def import_file(dataset_id):
+    """上传CSV/Parquet文件并在后台导入到数据表，返回导入任务"""
+    try:
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            raise ValueError("file is required")
+        form = request.form
+        file_format = ImportService.detect_format(upload.filename, form.get('format'))
+        fields = json.loads(form['fields']) if form.get('fields') else None
+        indexes = _form_list(form.get('indexes'))
+        file_path = ImportService.save_upload(upload)
+        job = ImportService.start_import(
+            dataset_id=dataset_id,
+            table_name=form.get('table_name'),
+            file_path=file_path,
+            file_name=upload.filename,
+            file_format=file_format,
+            fields=fields,
+            indexes=indexes,
+            if_exists=form.get('if_exists', 'fail'),
+            delimiter=form.get('delimiter', ','),
+            encoding=form.get('encoding', 'utf-8-sig'),
+            has_header=form.get('has_header', 'true').lower() not in ('false', '0'),
+        )
+        return jsonify({
+            'code': 200,
+            'data': job,
+        }), 202
+    except ValueError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e),
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
+
+@bp.route('/<int:dataset_id>/imports', methods=['GET'])
+def get_imports(dataset_id):
+    """获取数据集最近的导入任务"""
+    return jsonify({
+        'code': 200,
+        'data': ImportService.list_jobs(dataset_id),
+    })
+
+@bp.route('/imports/<job_id>', methods=['GET'])
+def get_import(job_id):
+    """获取导入任务进度"""
+    job = ImportService.get_job(job_id)
+    if not job:
+        return jsonify({
+            'code': 404,
+            'message': 'Import job not found',
+        }), 404
+    return jsonify({
+        'code': 200,
+        'data': job,
+    })
+
+@bp.route('/<int:dataset_id>/rollups', methods=['GET'])
+def get_rollups(dataset_id):
+    """获取数据集的汇总表"""
+    try:
+        return jsonify({
+            'code': 200,
+            'data': RollupService.list_rollups(dataset_id),
+        })
+    except ValueError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e),
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
+
+@bp.route('/<int:dataset_id>/rollups', methods=['POST'])
+def create_rollup(dataset_id):
+    """创建由触发器增量维护的汇总表"""
+    try:
+        data = request.get_json()
+        result = RollupService.create_rollup(
+            dataset_id=dataset_id,
+            name=data['name'],
+            source_table=data['source_table'],
+            dimensions=data.get('dimensions', []),
+            measures=data.get('measures', []),
+        )
+        return jsonify({
+            'code': 200,
+            'data': result,
+        }), 201
+    except ValueError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e),
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
+
+@bp.route('/<int:dataset_id>/rollups/<name>', methods=['DELETE'])
+def drop_rollup(dataset_id, name):
+    """删除汇总表及其触发器"""
+    try:
+        if not RollupService.drop_rollup(dataset_id, name):
+            return jsonify({
+                'code': 404,
+                'message': 'Rollup not found',
+            }), 404
+        return jsonify({
+            'code': 200,
+            'data': {'success': True},
+        })
+    except ValueError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e),
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
+
+@bp.route('/<int:dataset_id>/rollups/<name>/refresh', methods=['POST'])
+def refresh_rollup(dataset_id, name):
+    """从源表全量重建汇总表"""
+    try:
+        result = RollupService.refresh_rollup(dataset_id, name)
+        if not result:
+            return jsonify({
+                'code': 404,
+                'message': 'Rollup not found',
+            }), 404
+        return jsonify({
+            'code': 200,
+            'data': result,
+        })
+    except ValueError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e),
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
+
+@bp.route('/<int:dataset_id>/replica', methods=['POST'])
+def pin_dataset(dataset_id):
+    """把数据集固定到内存副本"""
+    try:
+        data = request.get_json(silent=True) or {}
+        return jsonify({
+            'code': 200,
+            'data': service.pin_dataset(dataset_id, wait=bool(data.get('wait', False))),
+        })
+    except ValueError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e),
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
+
+@bp.route('/<int:dataset_id>/replica', methods=['DELETE'])
+def unpin_dataset(dataset_id):
+    """取消固定并释放内存副本"""
+    try:
+        if not service.unpin_dataset(dataset_id):
+            return jsonify({
+                'code': 404,
+                'message': 'Dataset is not pinned',
+            }), 404
+        return jsonify({
+            'code': 200,
+            'data': {'success': True},
+        })
+    except ValueError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e),
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
+
+@bp.route('/<int:dataset_id>/samples', methods=['GET'])
+def get_samples(dataset_id):
+    """获取数据集的样本表"""
+    try:
+        return jsonify({
+            'code': 200,
+            'data': SampleService.list_samples(dataset_id),
+        })
+    except ValueError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e),
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
+
+@bp.route('/<int:dataset_id>/samples', methods=['POST'])
+def create_sample(dataset_id):
+    """为表创建由触发器维护的样本表，用于近似查询"""
+    try:
+        data = request.get_json()
+        result = SampleService.create_sample(
+            dataset_id=dataset_id,
+            table_name=data['table_name'],
+            target_rows=data.get('target_rows'),
+        )
+        return jsonify({
+            'code': 200,
+            'data': result,
+        }), 201
+    except ValueError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e),
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
+
+@bp.route('/<int:dataset_id>/samples/<table_name>', methods=['DELETE'])
+def drop_sample(dataset_id, table_name):
+    """删除样本表及其触发器"""
+    try:
+        if not SampleService.drop_sample(dataset_id, table_name):
+            return jsonify({
+                'code': 404,
+                'message': 'Sample not found',
+            }), 404
+        return jsonify({
+            'code': 200,
+            'data': {'success': True},
+        })
+    except ValueError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e),
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
+
+@bp.route('/<int:dataset_id>/samples/<table_name>/refresh', methods=['POST'])
+def refresh_sample(dataset_id, table_name):
+    """按源表当前行数重新抽样（可选新的 target_rows）"""
+    try:
+        data = request.get_json(silent=True) or {}
+        result = SampleService.refresh_sample(dataset_id, table_name, data.get('target_rows'))
+        if not result:
+            return jsonify({
+                'code': 404,
+                'message': 'Sample not found',
+            }), 404
+        return jsonify({
+            'code': 200,
+            'data': result,
+        })
+    except ValueError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e),
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
@@ -0,0 +1,39 @@
+import os
+from flask import Blueprint, jsonify
+from app.db import system_connection
+from app.services.warmup import WarmupService
+
+bp = Blueprint('health', __name__)
+
+@bp.route('/healthz', methods=['GET'])
+def liveness():
+    """存活检查：进程能处理请求即返回200，不访问数据库"""
+    return jsonify({
+        'code': 200,
+        'data': {'status': 'alive', 'pid': os.getpid()},
+    })
+
+@bp.route('/readyz', methods=['GET'])
+def readiness():
+    """就绪检查：预热完成且系统数据库可读时返回200，否则返回503"""
+    state = WarmupService.get_state()
+    state['pid'] = os.getpid()
+    if state['status'] != 'ready':
+        return jsonify({
+            'code': 503,
+            'message': f"Worker is not ready ({state['status']})",
+            'data': state,
+        }), 503
+    try:
+        with system_connection(readonly=True) as conn:
+            conn.execute('SELECT 1').fetchone()
+    except Exception as e:
+        return jsonify({
+            'code': 503,
+            'message': f"System database unavailable: {e}",
+            'data': state,
+        }), 503
+    return jsonify({
+        'code': 200,
+        'data': state,
+    })
@@ -0,0 +1,9 @@
+from flask import Blueprint, Response
+from app.services.metrics import render_prometheus
+
+bp = Blueprint('metrics', __name__)
+
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """以Prometheus文本格式导出指标"""
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
@@ -1,18 +1,49 @@
 from flask import Blueprint, request, jsonify
+from app.api.conditional import make_etag, not_modified, request_payload, with_etag
 from app.services.report_service import ReportService
+from app.services.report_data_service import ReportDataService
+from app.services.report_views import report_views
 
 bp = Blueprint('reports', __name__)
 service = ReportService()
 
 @bp.route('', methods=['GET'])
 def get_reports():
-    """获取报表列表"""
+    """获取报表列表
+
+    默认返回全部报表的完整内容（含config）；fields=summary 时返回不含config的摘要，
+    支持分页、排序和按名称前缀搜索。
+    """
     try:
-        reports = service.get_all_reports()
-        return jsonify({
+        etag = make_etag(request.path, service.get_reports_version(), request_payload())
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        if request.args.get('fields') != 'summary':
+            reports = service.get_all_reports()
+            return with_etag(jsonify({
+                'code': 200,
+                'data': [r.to_dict() for r in reports],
+            }), etag)
+        result = service.list_reports(
+            limit=request.args.get('limit', type=int),
+            offset=request.args.get('offset', 0, type=int),
+            sort=request.args.get('sort', 'updated_at'),
+            order=request.args.get('order', 'desc'),
+            search=request.args.get('search'),
+        )
+        return with_etag(jsonify({
             'code': 200,
-            'data': [r.to_dict() for r in reports],
-        })
+            'data': result['data'],
+            'total': result['total'],
+            'limit': result['limit'],
+            'offset': result['offset'],
+        }), etag)
+    except ValueError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e),
+        }), 400
     except Exception as e:
         return jsonify({
             'code': 500,
@@ -42,18 +73,99 @@ def create_report():
 
 @bp.route('/<int:report_id>', methods=['GET'])
 def get_report(report_id):
-    """获取报表详情"""
+    """获取报表详情，ETag由报表修订号生成，未修改时不读取和解析配置"""
     try:
+        version = service.get_report_version(report_id)
+        if version is None:
+            return jsonify({
+                'code': 404,
+                'message': 'Report not found',
+            }), 404
+        etag = make_etag(request.path, version)
+        cached = not_modified(etag)
+        if cached:
+            return cached
         report = service.get_report(report_id)
         if not report:
             return jsonify({
                 'code': 404,
                 'message': 'Report not found',
             }), 404
-        return jsonify({
+        return with_etag(jsonify({
             'code': 200,
             'data': report.to_dict(),
-        })
+        }), etag)
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
+
+@bp.route('/<int:report_id>/data', methods=['POST'])
+def get_report_data(report_id):
+    """一次请求获取报表所有组件的数据"""
+    try:
+        data = request.get_json(silent=True) or {}
+        version = ReportDataService.get_data_version(report_id)
+        if version:
+            report_views.record(report_id)
+        etag = make_etag(request.path, version, data) if version else None
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        result = ReportDataService.get_report_data(
+            report_id=report_id,
+            component_values=data.get('component_values', {}),
+            limit=data.get('limit', 100),
+        )
+        if result is None:
+            return jsonify({
+                'code': 404,
+                'message': 'Report not found',
+            }), 404
+        return with_etag(jsonify({
+            'code': 200,
+            'data': result,
+        }), etag)
+    except ValueError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e),
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': str(e),
+        }), 500
+
+@bp.route('/<int:report_id>/sources', methods=['POST'])
+def resolve_report_sources(report_id):
+    """在服务端求值条件数据源，返回每个组件选中的数据源"""
+    try:
+        data = request.get_json(silent=True) or {}
+        version = ReportDataService.get_data_version(report_id)
+        etag = make_etag(request.path, version, data) if version else None
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        result = ReportDataService.resolve_sources(
+            report_id=report_id,
+            component_values=data.get('component_values', {}),
+        )
+        if result is None:
+            return jsonify({
+                'code': 404,
+                'message': 'Report not found',
+            }), 404
+        return with_etag(jsonify({
+            'code': 200,
+            'data': result,
+        }), etag)
+    except ValueError as e:
+        return jsonify({
+            'code': 400,
+            'message': str(e),
+        }), 400
     except Exception as e:
         return jsonify({
             'code': 500,
@@ -1,3 +1,4 @@
+import json
 import os
 from pathlib import Path
 
@@ -11,7 +12,107 @@ class Config:
     DATABASE_PATH = DATABASE_DIR / 'system.db'
     DATASETS_DIR = BASE_DIR / 'datasets'
     
+    # 连接池配置
+    POOL_MAX_SIZE = int(os.environ.get('POOL_MAX_SIZE', 8))
+    POOL_IDLE_TIMEOUT = float(os.environ.get('POOL_IDLE_TIMEOUT', 300))  # 秒，空闲连接超过该时间被关闭
+    POOL_CHECKOUT_TIMEOUT = float(os.environ.get('POOL_CHECKOUT_TIMEOUT', 30))  # 秒，等待可用连接的最长时间
+    POOL_HEALTH_CHECK_INTERVAL = float(os.environ.get('POOL_HEALTH_CHECK_INTERVAL', 30))  # 秒
+    
+    # SQLite连接参数
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # 毫秒
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -16000))  # 负数表示KB，约16MB
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    
+    # 总数缓存与估算配置
+    TOTALS_CACHE_SIZE = int(os.environ.get('TOTALS_CACHE_SIZE', 2048))
+    COUNT_ESTIMATE_SAMPLE_SIZE = int(os.environ.get('COUNT_ESTIMATE_SAMPLE_SIZE', 10000))
+    
+    # 查询结果缓存配置
+    QUERY_CACHE_ENABLED = os.environ.get('QUERY_CACHE_ENABLED', '1') != '0'
+    QUERY_CACHE_MAX_ENTRIES = int(os.environ.get('QUERY_CACHE_MAX_ENTRIES', 1000))
+    QUERY_CACHE_MAX_BYTES = int(os.environ.get('QUERY_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    QUERY_CACHE_TTL = float(os.environ.get('QUERY_CACHE_TTL', 300))  # 秒
+    
+    # 流式响应每批读取的行数
+    STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', 1000))
+    
+    # 批量插入：每批行数（每批一次 executemany 和一个SAVEPOINT）及其上限
+    BULK_INSERT_BATCH_SIZE = int(os.environ.get('BULK_INSERT_BATCH_SIZE', 5000))
+    BULK_INSERT_MAX_BATCH_SIZE = int(os.environ.get('BULK_INSERT_MAX_BATCH_SIZE', 100000))
+    
+    # 文件导入：上传文件暂存目录、后台导入线程数、类型推断采样行数、每个事务的行数、保留的任务记录数
+    IMPORT_DIR = BASE_DIR / 'uploads'
+    IMPORT_WORKERS = int(os.environ.get('IMPORT_WORKERS', 2))
+    IMPORT_INFER_ROWS = int(os.environ.get('IMPORT_INFER_ROWS', 1000))
+    IMPORT_COMMIT_ROWS = int(os.environ.get('IMPORT_COMMIT_ROWS', 200000))
+    IMPORT_JOB_HISTORY = int(os.environ.get('IMPORT_JOB_HISTORY', 100))
+    # 导入任务记录文件（与系统数据库分开，多个工作进程共用）
+    IMPORT_JOBS_PATH = os.environ.get('IMPORT_JOBS_PATH') or DATABASE_DIR / 'import_jobs.db'
+    # 导入进度写入任务记录的最小间隔（秒），状态变化时总是立即写入
+    IMPORT_PROGRESS_INTERVAL = float(os.environ.get('IMPORT_PROGRESS_INTERVAL', 1.0))
+    
+    # 索引建议：查询模式达到次数阈值后才给出建议；AUTO_CREATE 开启时自动创建建议的索引
+    INDEX_ADVISOR_MIN_QUERIES = int(os.environ.get('INDEX_ADVISOR_MIN_QUERIES', 20))
+    INDEX_ADVISOR_MAX_COLUMNS = int(os.environ.get('INDEX_ADVISOR_MAX_COLUMNS', 4))
+    INDEX_ADVISOR_MAX_PATTERNS = int(os.environ.get('INDEX_ADVISOR_MAX_PATTERNS', 5000))
+    INDEX_ADVISOR_AUTO_CREATE = os.environ.get('INDEX_ADVISOR_AUTO_CREATE', '0') == '1'
+    
+    # 慢查询日志：超过阈值的查询保留在内存环形缓冲区中，设置 SLOW_QUERY_LOG_PATH 时同时写入该SQLite文件
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 200))
+    SLOW_QUERY_LOG_SIZE = int(os.environ.get('SLOW_QUERY_LOG_SIZE', 500))
+    SLOW_QUERY_LOG_PATH = os.environ.get('SLOW_QUERY_LOG_PATH') or None
+    
+    # 请求与查询指标（/metrics）
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+    # 各工作进程的指标快照文件（与系统数据库分开）及写入间隔（秒），/metrics 合并所有工作进程的快照
+    METRICS_PATH = os.environ.get('METRICS_PATH') or DATABASE_DIR / 'metrics.db'
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 10))
+    # 同一次服务启动的所有工作进程共用的标识（由 gunicorn.conf.py 设置），之前启动遗留的快照不参与合并
+    SERVER_INSTANCE_ID = os.environ.get('SERVER_INSTANCE_ID') or f'pid-{os.getpid()}'
+    
+    # 自定义SQL查询的执行预算（0表示不限制）：超时时间按数据库执行时间计算，行数和估算字节数超限时截断结果。
+    # QUERY_DATASET_BUDGETS 为JSON，按数据集覆盖默认值，如 {"3": {"timeout_ms": 5000, "max_rows": 10000}}
+    QUERY_TIMEOUT_MS = float(os.environ.get('QUERY_TIMEOUT_MS', 30000))
+    QUERY_MAX_ROWS = int(os.environ.get('QUERY_MAX_ROWS', 100000))
+    QUERY_MAX_BYTES = int(os.environ.get('QUERY_MAX_BYTES', 64 * 1024 * 1024))
+    QUERY_DATASET_BUDGETS = json.loads(os.environ.get('QUERY_DATASET_BUDGETS') or '{}')
+    QUERY_PROGRESS_STEPS = int(os.environ.get('QUERY_PROGRESS_STEPS', 10000))  # 进度回调间隔的虚拟机指令数
+    # 执行中查询的登记文件（与系统数据库分开，多个工作进程共用），以及检查其他进程取消请求的间隔（秒）
+    RUNNING_QUERIES_PATH = os.environ.get('RUNNING_QUERIES_PATH') or DATABASE_DIR / 'running_queries.db'
+    QUERY_CANCEL_POLL_INTERVAL = float(os.environ.get('QUERY_CANCEL_POLL_INTERVAL', 0.2))
+    
+    # 工作进程数，由 gunicorn.conf.py 设置；按进程划分的资源（如内存副本预算）按它平分
+    WORKER_PROCESSES = max(int(os.environ.get('WORKER_PROCESSES', 1)), 1)
+    
+    # 内存副本：MEMORY_REPLICA_DATASETS 为启动时固定到内存的数据集ID（逗号分隔），已加载副本的总大小不超过预算。
+    # 每个工作进程各自持有副本，MEMORY_REPLICA_BUDGET_BYTES 是整个服务的预算，每个进程使用其中的 1/WORKER_PROCESSES
+    MEMORY_REPLICA_DATASETS = [int(x) for x in os.environ.get('MEMORY_REPLICA_DATASETS', '').split(',') if x.strip()]
+    MEMORY_REPLICA_BUDGET_BYTES = int(os.environ.get('MEMORY_REPLICA_BUDGET_BYTES', 256 * 1024 * 1024))
+    
+    # 跨数据集查询：一次查询最多附加的数据集数（不超过SQLite的上限10）
+    FEDERATED_MAX_DATASETS = int(os.environ.get('FEDERATED_MAX_DATASETS', 8))
+    
+    # 近似查询的样本表：目标样本行数、置信水平（样本通过 POST /api/datasets/<id>/samples 创建）
+    SAMPLE_TARGET_ROWS = int(os.environ.get('SAMPLE_TARGET_ROWS', 100000))
+    SAMPLE_CONFIDENCE = float(os.environ.get('SAMPLE_CONFIDENCE', 0.95))
+    
+    # 报表列表默认每页条数及上限
+    REPORT_LIST_PAGE_SIZE = int(os.environ.get('REPORT_LIST_PAGE_SIZE', 50))
+    REPORT_LIST_MAX_PAGE_SIZE = int(os.environ.get('REPORT_LIST_MAX_PAGE_SIZE', 1000))
+    
+    # 报表访问次数统计文件（与系统数据库分开）及写入间隔（秒），用于预热访问最多的报表
+    REPORT_VIEWS_PATH = os.environ.get('REPORT_VIEWS_PATH') or DATABASE_DIR / 'report_views.db'
+    REPORT_VIEWS_FLUSH_INTERVAL = float(os.environ.get('REPORT_VIEWS_FLUSH_INTERVAL', 10))
+    
+    # 工作进程启动预热：每个数据集预先建立的只读连接数，以及预先执行默认查询的报表数
+    WARMUP_CONNECTIONS = int(os.environ.get('WARMUP_CONNECTIONS', 2))
+    WARMUP_REPORTS = int(os.environ.get('WARMUP_REPORTS', 20))
+    
+    # 报表数据批量解析的并发线程数
+    REPORT_DATA_WORKERS = int(os.environ.get('REPORT_DATA_WORKERS', 8))
+    
     # 确保目录存在
     DATABASE_DIR.mkdir(exist_ok=True)
     DATASETS_DIR.mkdir(exist_ok=True)
+    IMPORT_DIR.mkdir(exist_ok=True)
 
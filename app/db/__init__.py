@@ -0,0 +1,31 @@
+from app.db.pool import (
+    ConnectionPool,
+    get_pool,
+    get_connection,
+    system_connection,
+    close_pool,
+    closing_database,
+    close_all_pools,
+    evict_idle_connections,
+    pool_stats,
+)
+from app.db.schema_catalog import (
+    RESERVED_TABLE_PREFIX,
+    SchemaCatalog,
+    TableSchema,
+    get_schema_catalog,
+    invalidate_schema_catalog,
+    quote_identifier,
+)
+from app.db.generation import get_data_version
+from app.db.memory_replica import MemoryReplicaManager, replica_manager, read_connection
+from app.db.federation import FederatedPool, federated_pool, federated_connection, check_alias
+
+__all__ = [
+    'ConnectionPool', 'get_pool', 'get_connection', 'system_connection',
+    'close_pool', 'closing_database', 'close_all_pools', 'evict_idle_connections', 'pool_stats',
+    'RESERVED_TABLE_PREFIX', 'SchemaCatalog', 'TableSchema', 'get_schema_catalog', 'invalidate_schema_catalog', 'quote_identifier',
+    'get_data_version',
+    'MemoryReplicaManager', 'replica_manager', 'read_connection',
+    'FederatedPool', 'federated_pool', 'federated_connection', 'check_alias',
+]
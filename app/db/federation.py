@@ -0,0 +1,159 @@
+import re
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict
+from app.config import Config
+from app.db.pool import ConnectionPool, _check_not_closing, _normalize_path
+
+# SQLite 编译期默认最多 ATTACH 10 个数据库
+SQLITE_MAX_ATTACHED = 10
+
+_ALIAS_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]{0,63}$')
+_RESERVED_ALIASES = {'main', 'temp'}
+
+
+def check_alias(alias: str) -> str:
+    """别名只允许字母、数字和下划线，且不能是 main/temp"""
+    if not isinstance(alias, str) or not _ALIAS_PATTERN.match(alias) or alias.lower() in _RESERVED_ALIASES:
+        raise ValueError(f"Invalid database alias: {alias}")
+    return alias
+
+
+class FederatedPool(ConnectionPool):
+    """跨数据集查询的只读连接池
+
+    每个连接的主库是私有的空内存库，数据集文件以只读方式 ATTACH 为固定别名。连接归还后
+    保留已附加的数据库，借出时优先选择已附加了所需别名最多的空闲连接，只补充缺少的，
+    并分离本次不需要的，借出的连接上只附加了请求的数据集。
+    """
+
+    def __init__(self, max_attached: int = None):
+        super().__init__(':memory:', readonly=True)
+        self.database_path = 'federated'
+        self.max_attached = min(max_attached or Config.FEDERATED_MAX_DATASETS, SQLITE_MAX_ATTACHED)
+        # 连接 -> {别名: 数据库路径}
+        self._attached: Dict[int, Dict[str, str]] = {}
+        self._attaches = 0
+        self._detaches = 0
+        self._reuses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # 以URI方式打开，ATTACH 的文件名同样按URI解析，从而可以使用 mode=ro
+        conn = sqlite3.connect('file::memory:', uri=True, check_same_thread=False,
+                               timeout=Config.SQLITE_BUSY_TIMEOUT / 1000.0)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {int(Config.SQLITE_BUSY_TIMEOUT)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        # 不影响 ATTACH/DETACH，但禁止在连接私有的主库中建表，避免污染池化连接
+        conn.execute("PRAGMA query_only = ON")
+        with self._cond:
+            self._attached[id(conn)] = {}
+        return conn
+
+    def _close_quietly(self, conn: sqlite3.Connection):
+        with self._cond:
+            self._attached.pop(id(conn), None)
+        super()._close_quietly(conn)
+
+    def _prefer_idle_locked(self, attachments: Dict[str, str]):
+        """把已附加所需数据库最多的空闲连接移到队尾，使 acquire 优先借出它（调用方持有锁）"""
+        best_index, best_score = None, 0
+        for index, pooled in enumerate(self._idle):
+            attached = self._attached.get(id(pooled.conn), {})
+            score = sum(1 for alias, path in attachments.items() if attached.get(alias) == path)
+            if score > best_score:
+                best_index, best_score = index, score
+        if best_index is not None and best_index != len(self._idle) - 1:
+            pooled = self._idle[best_index]
+            del self._idle[best_index]
+            self._idle.append(pooled)
+
+    def _sync_attachments(self, conn: sqlite3.Connection, attachments: Dict[str, str]):
+        attached = self._attached.setdefault(id(conn), {})
+        # 分离本次不需要的别名以及指向其他文件的同名别名：用户SQL只能读取本次请求的数据集，
+        # 否则结果会取决于借到哪个连接，且缓存键和ETag中都不包含这些数据集
+        stale = [alias for alias, path in attached.items() if attachments.get(alias) != path]
+        missing = [alias for alias in attachments if attached.get(alias) != attachments[alias]]
+        for alias in stale:
+            conn.execute(f'DETACH DATABASE "{alias}"')
+            del attached[alias]
+            self._detaches += 1
+        for alias in missing:
+            path = attachments[alias]
+            conn.execute(f'ATTACH DATABASE ? AS "{alias}"', ('file:' + path.replace('\\', '/') + '?mode=ro',))
+            conn.execute(f'PRAGMA "{alias}".cache_size = {int(Config.SQLITE_CACHE_SIZE)}')
+            conn.execute(f'PRAGMA "{alias}".mmap_size = {int(Config.SQLITE_MMAP_SIZE)}')
+            attached[alias] = path
+            self._attaches += 1
+        if not missing:
+            self._reuses += 1
+
+    def acquire_attached(self, attachments: Dict[str, str]) -> sqlite3.Connection:
+        """借出附加了 attachments（{别名: 数据库路径}）的连接"""
+        if len(attachments) > self.max_attached:
+            raise ValueError(f"At most {self.max_attached} datasets can be attached to one query")
+        attachments = {check_alias(alias): _normalize_path(path) for alias, path in attachments.items()}
+        with self._cond:
+            self._prefer_idle_locked(attachments)
+        conn = self.acquire()
+        try:
+            self._sync_attachments(conn, attachments)
+            # 附加完成后再检查：与删除文件并发时，删除方可能在附加登记之前检查过借出中的连接
+            for path in attachments.values():
+                _check_not_closing(path)
+        except Exception:
+            # 附加状态不确定，丢弃该连接
+            self.release(conn, discard=True)
+            raise
+        return conn
+
+    def in_use_count(self, database_path) -> int:
+        """附加了某个数据库文件且正在借出中的连接数"""
+        path = _normalize_path(database_path)
+        with self._cond:
+            return sum(1 for key in self._holders
+                       if path in self._attached.get(key, {}).values())
+
+    def detach_path(self, database_path) -> int:
+        """关闭附加了某个数据库文件的空闲连接（删除或替换数据库文件前调用），返回关闭数量"""
+        path = _normalize_path(database_path)
+        with self._cond:
+            matched = [pooled for pooled in self._idle
+                       if path in self._attached.get(id(pooled.conn), {}).values()]
+            for pooled in matched:
+                self._idle.remove(pooled)
+                self._discarded += 1
+        for pooled in matched:
+            self._close_quietly(pooled.conn)
+        return len(matched)
+
+    def stats(self) -> Dict:
+        stats = super().stats()
+        with self._cond:
+            stats.update({
+                'max_attached': self.max_attached,
+                'attached': sum(len(attached) for attached in self._attached.values()),
+                'attaches': self._attaches,
+                'detaches': self._detaches,
+                'attachment_reuses': self._reuses,
+            })
+        return stats
+
+
+federated_pool = FederatedPool()
+
+
+@contextmanager
+def federated_connection(attachments: Dict[str, str]):
+    """借出附加了指定数据集的只读连接（上下文管理器），退出时归还并保留附加状态"""
+    conn = federated_pool.acquire_attached(attachments)
+    try:
+        yield conn
+    except sqlite3.DatabaseError as e:
+        federated_pool.release(conn, discard=type(e) in (sqlite3.DatabaseError, sqlite3.InternalError))
+        raise
+    except BaseException:
+        federated_pool.release(conn)
+        raise
+    else:
+        federated_pool.release(conn)
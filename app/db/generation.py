@@ -0,0 +1,32 @@
+import os
+from app.db.pool import _normalize_path
+
+
+def _file_signature(path: str) -> str:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return '-'
+    return f"{stat.st_mtime_ns:x}.{stat.st_size:x}"
+
+
+def _read_header(path: str, offset: int, length: int) -> str:
+    try:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            return f.read(length).hex()
+    except OSError:
+        return '-'
+
+
+def get_data_version(database_path) -> str:
+    """数据库内容的版本标识，用于生成ETag和判断缓存、内存副本是否过期
+
+    只由数据库文件本身的状态组成，同一份数据在所有工作进程中得到相同的版本：
+    数据库文件和WAL文件的修改时间与大小、数据库头的文件修改计数（回滚日志模式下每次提交递增），
+    以及 -shm 中 wal-index 头的事务计数和最后一帧位置（WAL模式下每次提交变化，WAL从头复用、
+    文件大小不变时同样能区分）。只需几次 stat 和小块读取，不访问数据库连接。
+    """
+    path = _normalize_path(database_path)
+    return '-'.join((_file_signature(path), _read_header(path, 24, 4),
+                     _file_signature(path + '-wal'), _read_header(path + '-shm', 0, 48)))
@@ -0,0 +1,254 @@
+import hashlib
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from app.config import Config
+from app.db.generation import get_data_version
+from app.db.pool import ConnectionPool, _normalize_path, get_connection
+
+_replica_names = itertools.count(1)
+
+
+class _ReplicaPool(ConnectionPool):
+    """内存副本的只读连接池，连接打开同一个共享缓存的内存数据库"""
+
+    def __init__(self, uri: str, source_path: str):
+        super().__init__(source_path, readonly=True)
+        self.uri = uri
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+
+class _Replica:
+    """一个已加载的内存副本：锚定连接保证内存数据库在没有读连接时也不被释放"""
+
+    def __init__(self, source_path: str, version: str, anchor: sqlite3.Connection, uri: str,
+                 size: int, load_time: float):
+        self.source_path = source_path
+        self.version = version
+        self.anchor = anchor
+        self.pool = _ReplicaPool(uri, source_path)
+        self.size = size
+        self.load_time = load_time
+        self.loaded_at = time.time()
+        self.hits = 0
+
+    def close(self):
+        # 借出中的连接在归还时关闭，最后一个连接关闭后内存数据库被释放
+        self.pool.close()
+        try:
+            self.anchor.close()
+        except sqlite3.Error:
+            pass
+
+
+class MemoryReplicaManager:
+    """热点数据集的内存副本
+
+    固定（pin）的数据集通过 backup API 复制到共享缓存的内存数据库，只读查询从副本读取。
+    每次读取前比较源文件的数据版本：副本过期时本次读取回落到数据库文件，并在后台重新复制，
+    因此不会读到旧数据，也不会让请求等待复制完成。已加载副本的总大小受内存预算限制，
+    超出时按最近最少使用淘汰（被淘汰的数据集仍保持固定，下次访问时重新加载）。
+    """
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self._pinned: Dict[str, int] = {}
+        self._replicas: 'OrderedDict[str, _Replica]' = OrderedDict()
+        self._loading = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='memory-replica')
+        self._hits = 0
+        self._fallbacks = 0
+        self._loads = 0
+        self._evictions = 0
+
+    @staticmethod
+    def _file_size(path: str) -> int:
+        size = 0
+        for suffix in ('', '-wal'):
+            try:
+                size += os.path.getsize(path + suffix)
+            except OSError:
+                pass
+        return size
+
+    def pin(self, database_path: str, dataset_id: int = None, wait: bool = False) -> Dict:
+        """固定数据集并加载内存副本；文件大小超过整个内存预算时拒绝"""
+        path = _normalize_path(database_path)
+        if not os.path.exists(path):
+            raise ValueError(f"Database file {database_path} not found")
+        if self._file_size(path) > self.budget_bytes:
+            raise ValueError(f"Dataset is larger than the memory replica budget ({self.budget_bytes} bytes)")
+        with self._lock:
+            self._pinned[path] = dataset_id
+        future = self._schedule(path)
+        if wait and future is not None:
+            future.result()
+        return self.replica_stats(path)
+
+    def unpin(self, database_path: str) -> bool:
+        path = _normalize_path(database_path)
+        with self._lock:
+            if path not in self._pinned:
+                return False
+            del self._pinned[path]
+            replica = self._replicas.pop(path, None)
+        if replica:
+            replica.close()
+        return True
+
+    def is_pinned(self, database_path: str) -> bool:
+        return _normalize_path(database_path) in self._pinned
+
+    def _schedule(self, path: str):
+        with self._lock:
+            if path in self._loading or path not in self._pinned:
+                return None
+            self._loading.add(path)
+        return self._executor.submit(self._load, path)
+
+    def _load(self, path: str):
+        """把数据库文件复制到新的内存数据库，完成后替换旧副本"""
+        try:
+            # 先取版本再复制：复制期间发生的写入会让副本在下次读取时被判定为过期
+            version = get_data_version(path)
+            started = time.perf_counter()
+            name = hashlib.sha1(path.encode('utf-8')).hexdigest()[:12]
+            uri = f"file:replica_{name}_{next(_replica_names)}?mode=memory&cache=shared"
+            anchor = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            try:
+                source = sqlite3.connect('file:' + path.replace('\\', '/') + '?mode=ro', uri=True)
+                try:
+                    source.backup(anchor)
+                finally:
+                    source.close()
+                page_count = anchor.execute("PRAGMA page_count").fetchone()[0]
+                page_size = anchor.execute("PRAGMA page_size").fetchone()[0]
+            except Exception:
+                anchor.close()
+                raise
+            replica = _Replica(path, version, anchor, uri, page_count * page_size,
+                               time.perf_counter() - started)
+
+            to_close = []
+            with self._lock:
+                if path not in self._pinned:
+                    # 加载期间被取消固定
+                    to_close.append(replica)
+                else:
+                    old = self._replicas.pop(path, None)
+                    if old:
+                        to_close.append(old)
+                    self._replicas[path] = replica
+                    self._loads += 1
+                    to_close.extend(self._evict_locked(keep=path))
+            for item in to_close:
+                item.close()
+        finally:
+            with self._lock:
+                self._loading.discard(path)
+
+    def _evict_locked(self, keep: str) -> List[_Replica]:
+        """总大小超出预算时淘汰最久未使用的副本（调用方持有锁）"""
+        evicted = []
+        total = sum(replica.size for replica in self._replicas.values())
+        for path in list(self._replicas):
+            if total <= self.budget_bytes:
+                break
+            if path == keep:
+                continue
+            replica = self._replicas.pop(path)
+            total -= replica.size
+            evicted.append(replica)
+            self._evictions += 1
+        return evicted
+
+    def acquire_replica(self, database_path: str) -> Optional[_Replica]:
+        """返回与源文件版本一致的副本；未固定时返回None，过期或未加载时安排后台加载并返回None"""
+        path = _normalize_path(database_path)
+        if path not in self._pinned:
+            return None
+        with self._lock:
+            replica = self._replicas.get(path)
+            if replica is not None and replica.version == get_data_version(path):
+                self._replicas.move_to_end(path)
+                replica.hits += 1
+                self._hits += 1
+                return replica
+            self._fallbacks += 1
+        self._schedule(path)
+        return None
+
+    def replica_stats(self, database_path: str) -> Dict:
+        path = _normalize_path(database_path)
+        with self._lock:
+            replica = self._replicas.get(path)
+            return {
+                'database_path': path,
+                'dataset_id': self._pinned.get(path),
+                'pinned': path in self._pinned,
+                'loaded': replica is not None,
+                'loading': path in self._loading,
+                'size_bytes': replica.size if replica else 0,
+                'load_time_ms': round(replica.load_time * 1000, 3) if replica else None,
+                'loaded_at': replica.loaded_at if replica else None,
+                'hits': replica.hits if replica else 0,
+                'fresh': replica is not None and replica.version == get_data_version(path),
+            }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            paths = list(self._pinned)
+            summary = {
+                'budget_bytes': self.budget_bytes,
+                'used_bytes': sum(replica.size for replica in self._replicas.values()),
+                'hits': self._hits,
+                'fallbacks': self._fallbacks,
+                'loads': self._loads,
+                'evictions': self._evictions,
+            }
+        summary['replicas'] = [self.replica_stats(path) for path in paths]
+        return summary
+
+    def close(self):
+        with self._lock:
+            replicas = list(self._replicas.values())
+            self._replicas.clear()
+            self._pinned.clear()
+        for replica in replicas:
+            replica.close()
+
+
+replica_manager = MemoryReplicaManager(Config.MEMORY_REPLICA_BUDGET_BYTES // Config.WORKER_PROCESSES)
+
+
+@contextmanager
+def read_connection(database_path):
+    """借出只读连接：数据集已固定到内存且副本是最新的时从内存副本借出，否则从数据库文件的只读连接池借出"""
+    replica = replica_manager.acquire_replica(database_path)
+    conn = None
+    if replica is not None:
+        try:
+            conn = replica.pool.acquire()
+        except RuntimeError:
+            # 副本恰好被淘汰或替换，连接池已关闭
+            conn = None
+    if conn is None:
+        with get_connection(database_path, readonly=True) as conn:
+            yield conn
+        return
+    try:
+        yield conn
+    finally:
+        replica.pool.release(conn)
@@ -0,0 +1,345 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Set, Tuple
+from app.config import Config
+
+
+def _normalize_path(database_path) -> str:
+    """统一数据库路径，保证同一文件只对应一个连接池"""
+    return os.path.abspath(str(database_path))
+
+
+class _PooledConnection:
+    """连接池中的连接及其元信息"""
+
+    __slots__ = ('conn', 'created_at', 'last_used', 'last_checked')
+
+    def __init__(self, conn: sqlite3.Connection):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+        self.last_checked = now
+
+
+class ConnectionPool:
+    """单个SQLite数据库文件的连接池
+
+    连接在创建时统一设置WAL、cache_size、mmap_size、busy_timeout等参数，
+    只读连接池以 mode=ro 打开并开启 query_only，用于SELECT路径。
+    """
+
+    def __init__(self, database_path, readonly: bool = False, max_size: int = None,
+                 idle_timeout: float = None, checkout_timeout: float = None,
+                 health_check_interval: float = None):
+        self.database_path = _normalize_path(database_path)
+        self.readonly = readonly
+        self.max_size = max_size or Config.POOL_MAX_SIZE
+        self.idle_timeout = idle_timeout if idle_timeout is not None else Config.POOL_IDLE_TIMEOUT
+        self.checkout_timeout = checkout_timeout if checkout_timeout is not None else Config.POOL_CHECKOUT_TIMEOUT
+        self.health_check_interval = (health_check_interval if health_check_interval is not None
+                                      else Config.POOL_HEALTH_CHECK_INTERVAL)
+
+        self._idle = deque()
+        self._holders: Dict[int, _PooledConnection] = {}
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+
+        # 统计信息
+        self._created = 0
+        self._discarded = 0
+        self._evicted = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._health_failures = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.readonly:
+            uri = 'file:' + self.database_path.replace('\\', '/') + '?mode=ro'
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                                   timeout=Config.SQLITE_BUSY_TIMEOUT / 1000.0)
+        else:
+            conn = sqlite3.connect(self.database_path, check_same_thread=False,
+                                   timeout=Config.SQLITE_BUSY_TIMEOUT / 1000.0)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(f"PRAGMA busy_timeout = {int(Config.SQLITE_BUSY_TIMEOUT)}")
+        cursor.execute(f"PRAGMA cache_size = {int(Config.SQLITE_CACHE_SIZE)}")
+        cursor.execute(f"PRAGMA mmap_size = {int(Config.SQLITE_MMAP_SIZE)}")
+        cursor.execute("PRAGMA temp_store = MEMORY")
+        if self.readonly:
+            cursor.execute("PRAGMA query_only = ON")
+        else:
+            # journal_mode 是持久化到文件的设置，只需由写连接设置
+            cursor.execute("PRAGMA journal_mode = WAL")
+            cursor.execute("PRAGMA synchronous = NORMAL")
+        cursor.close()
+        return conn
+
+    def _is_healthy(self, pooled: _PooledConnection) -> bool:
+        try:
+            pooled.conn.execute("SELECT 1").fetchone()
+            pooled.last_checked = time.monotonic()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _close_quietly(self, conn: sqlite3.Connection):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _evict_expired_locked(self, now: float) -> list:
+        """取出空闲超时的连接（调用方持有锁），返回待关闭的连接"""
+        expired = []
+        if self.idle_timeout <= 0:
+            return expired
+        # 连接按归还时间排列，最左侧的空闲最久
+        while self._idle and now - self._idle[0].last_used > self.idle_timeout:
+            expired.append(self._idle.popleft())
+            self._evicted += 1
+        return expired
+
+    def acquire(self) -> sqlite3.Connection:
+        """借出一个连接，连接数达到上限时等待归还"""
+        started = time.monotonic()
+        deadline = started + self.checkout_timeout
+        waited = False
+        to_close = []
+        pooled = None
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError(f"Connection pool for {self.database_path} is closed")
+                to_close.extend(self._evict_expired_locked(time.monotonic()))
+                if self._idle:
+                    # 后进先出，优先复用最热的连接
+                    pooled = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._in_use < self.max_size:
+                    self._in_use += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        f"Timed out waiting for a connection to {self.database_path}")
+                waited = True
+                self._cond.wait(remaining)
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+                self._wait_time += time.monotonic() - started
+
+        for item in to_close:
+            self._close_quietly(item.conn)
+
+        try:
+            if pooled is not None and time.monotonic() - pooled.last_checked > self.health_check_interval:
+                if not self._is_healthy(pooled):
+                    with self._cond:
+                        self._health_failures += 1
+                        self._discarded += 1
+                    self._close_quietly(pooled.conn)
+                    pooled = None
+            if pooled is None:
+                pooled = _PooledConnection(self._connect())
+                with self._cond:
+                    self._created += 1
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._holders[id(pooled.conn)] = pooled
+        return pooled.conn
+
+    def release(self, conn: sqlite3.Connection, discard: bool = False):
+        """归还连接；未提交的事务会被回滚"""
+        with self._cond:
+            pooled = self._holders.pop(id(conn), None)
+        if pooled is None:
+            return
+        if not discard:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+                conn.row_factory = sqlite3.Row
+            except sqlite3.Error:
+                discard = True
+        pooled.last_used = time.monotonic()
+
+        to_close = []
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed:
+                self._discarded += 1
+                to_close.append(pooled)
+            else:
+                self._idle.append(pooled)
+            to_close.extend(self._evict_expired_locked(pooled.last_used))
+            self._cond.notify()
+
+        for item in to_close:
+            self._close_quietly(item.conn)
+
+    @contextmanager
+    def connection(self):
+        """以上下文管理器形式借出连接，退出时自动归还"""
+        conn = self.acquire()
+        try:
+            yield conn
+        except sqlite3.DatabaseError as e:
+            # 连接级错误（如文件损坏）时丢弃该连接，普通SQL错误的连接可继续复用
+            self.release(conn, discard=type(e) in (sqlite3.DatabaseError, sqlite3.InternalError))
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def evict_idle(self) -> int:
+        """关闭所有空闲超时的连接，返回关闭数量"""
+        with self._cond:
+            expired = self._evict_expired_locked(time.monotonic())
+        for item in expired:
+            self._close_quietly(item.conn)
+        return len(expired)
+
+    def close(self, require_idle: bool = False) -> bool:
+        """关闭连接池的所有空闲连接，借出中的连接在归还时关闭
+
+        require_idle 为真时，如果仍有借出中的连接则不关闭并返回False。
+        """
+        with self._cond:
+            if require_idle and self._in_use:
+                return False
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._discarded += len(idle)
+            self._cond.notify_all()
+        for item in idle:
+            self._close_quietly(item.conn)
+        return True
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                'database_path': self.database_path,
+                'readonly': self.readonly,
+                'max_size': self.max_size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'created': self._created,
+                'discarded': self._discarded,
+                'evicted': self._evicted,
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_time_ms': round(self._wait_time * 1000, 3),
+                'health_check_failures': self._health_failures,
+                'closed': self._closed,
+            }
+
+
+_pools: Dict[Tuple[str, bool], ConnectionPool] = {}
+_pools_lock = threading.Lock()
+# 正在删除或替换的数据库文件，期间不为其创建新的连接池
+_closing: Set[str] = set()
+
+
+def _check_not_closing(path: str):
+    if path in _closing:
+        raise ValueError(f"Database file {os.path.basename(path)} is being replaced")
+
+
+def get_pool(database_path, readonly: bool = False) -> ConnectionPool:
+    """获取（必要时创建）指定数据库文件的连接池"""
+    key = (_normalize_path(database_path), readonly)
+    pool = _pools.get(key)
+    if pool is not None and not pool._closed:
+        return pool
+    with _pools_lock:
+        _check_not_closing(key[0])
+        pool = _pools.get(key)
+        if pool is None or pool._closed:
+            pool = ConnectionPool(key[0], readonly=readonly)
+            _pools[key] = pool
+        return pool
+
+
+def get_connection(database_path, readonly: bool = False):
+    """从数据集数据库的连接池中借出连接（上下文管理器）"""
+    return get_pool(database_path, readonly).connection()
+
+
+def system_connection(readonly: bool = False):
+    """从系统数据库（Config.DATABASE_PATH）的连接池中借出连接（上下文管理器）"""
+    return get_pool(Config.DATABASE_PATH, readonly).connection()
+
+
+def close_pool(database_path, require_idle: bool = False) -> bool:
+    """关闭某个数据库文件的全部连接池（删除或替换数据库文件前调用）
+
+    require_idle 为真时，仍有连接借出中的连接池保持打开，并返回False。
+    """
+    path = _normalize_path(database_path)
+    closed = True
+    with _pools_lock:
+        for key in [key for key in _pools if key[0] == path]:
+            if _pools[key].close(require_idle=require_idle):
+                del _pools[key]
+            else:
+                closed = False
+    return closed
+
+
+@contextmanager
+def closing_database(database_path):
+    """把数据库文件标记为关闭中并关闭其全部连接池，在 with 块内删除或替换文件
+
+    标记在关闭连接池之前设置、在 with 块结束后清除，期间 get_pool 不会为该文件创建新的连接池，
+    关闭和删除之间不会有请求重新打开文件。仍有连接借出中时抛出 ValueError。
+    """
+    path = _normalize_path(database_path)
+    with _pools_lock:
+        _check_not_closing(path)
+        _closing.add(path)
+    try:
+        if not close_pool(path, require_idle=True):
+            raise ValueError(f"Database file {os.path.basename(path)} is in use by a running query")
+        yield
+    finally:
+        with _pools_lock:
+            _closing.discard(path)
+
+
+def close_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def evict_idle_connections() -> int:
+    """对所有连接池执行空闲连接淘汰"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return sum(pool.evict_idle() for pool in pools)
+
+
+def pool_stats() -> list:
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in pools]
@@ -0,0 +1,175 @@
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set
+from app.db.pool import get_connection, _normalize_path
+
+
+# 服务自身维护的表（汇总表、样本表及其定义表）使用的保留前缀，这些表不出现在表列表中
+RESERVED_TABLE_PREFIX = '__bi_'
+
+
+def quote_identifier(name: str) -> str:
+    """为SQLite标识符加双引号"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+class TableSchema:
+    """单张表的结构信息"""
+
+    def __init__(self, name: str, fields: List[Dict], without_rowid: bool = False):
+        self.name = name
+        self.fields = fields
+        self.without_rowid = without_rowid
+        self.primary_key = [f['name'] for f in fields if f['pk']]
+        self.field_names = [f['name'] for f in fields]
+        self.field_names_lower = {name.lower() for name in self.field_names}
+
+    @property
+    def hidden(self) -> bool:
+        # 服务自身维护的表（汇总表、样本表等），不出现在表列表中
+        return self.name.lower().startswith(RESERVED_TABLE_PREFIX)
+
+    @property
+    def internal(self) -> bool:
+        # sqlite_sequence 等SQLite内部表，以及服务维护的表
+        return self.name.lower().startswith('sqlite_') or self.hidden
+
+    def has_field(self, field_name: str) -> bool:
+        return field_name.lower() in self.field_names_lower
+
+    def resolve_field(self, field_name: str) -> Optional[str]:
+        """返回字段在表中的实际名称（不区分大小写），不存在时返回None"""
+        if not field_name:
+            return None
+        lowered = field_name.lower()
+        for name in self.field_names:
+            if name.lower() == lowered:
+                return name
+        return None
+
+    def to_schema_info(self) -> Dict:
+        return {'fields': [dict(f) for f in self.fields]}
+
+
+class SchemaCatalog:
+    """某个数据集数据库的表结构快照，对应一个 PRAGMA schema_version"""
+
+    def __init__(self, database_path: str, schema_version: int, tables: List[TableSchema]):
+        self.database_path = database_path
+        self.schema_version = schema_version
+        # 保持 sqlite_master 中的顺序
+        self.tables: Dict[str, TableSchema] = {t.name: t for t in tables}
+        self._by_lower = {t.name.lower(): t for t in tables}
+        self._order = {t.name: i for i, t in enumerate(tables)}
+        self._user_tables = [t.name for t in tables if not t.internal]
+        # 倒排索引：小写字段名 -> 包含该字段的表（不含SQLite内部表）
+        self.column_index: Dict[str, Set[str]] = {}
+        for t in tables:
+            if t.internal:
+                continue
+            for field_name in t.field_names_lower:
+                self.column_index.setdefault(field_name, set()).add(t.name)
+
+    def table_names(self, include_internal: bool = False) -> List[str]:
+        if include_internal:
+            return [name for name, t in self.tables.items() if not t.hidden]
+        return list(self._user_tables)
+
+    def tables_with_field(self, field_name: str) -> List[str]:
+        """包含指定字段（不区分大小写）的表，按 sqlite_master 顺序"""
+        tables = self.column_index.get(field_name.lower(), ())
+        return sorted(tables, key=self._order.__getitem__)
+
+    def select_table(self, field_names: Iterable[str]) -> Optional[str]:
+        """根据字段名选择表
+
+        优先返回包含全部字段的表（集合求交），否则返回包含字段最多的表，
+        同等条件下取 sqlite_master 中靠前的表；都没有时返回第一个表。
+        """
+        if not self._user_tables:
+            return None
+        fields = {name.lower() for name in field_names if name}
+        if not fields:
+            return self._user_tables[0]
+
+        candidates = [self.column_index.get(name, set()) for name in fields]
+        matched = set.intersection(*candidates)
+        if matched:
+            return min(matched, key=self._order.__getitem__)
+
+        # 部分匹配：统计每张表命中的字段数
+        counts = Counter()
+        for tables in candidates:
+            counts.update(tables)
+        if not counts:
+            return self._user_tables[0]
+        return min(counts, key=lambda name: (-counts[name], self._order[name]))
+
+    def get_table(self, table_name: str) -> Optional[TableSchema]:
+        if not table_name:
+            return None
+        # SQLite的表名不区分大小写
+        return self.tables.get(table_name) or self._by_lower.get(table_name.lower())
+
+
+def _read_schema_version(conn) -> int:
+    return conn.execute("PRAGMA schema_version").fetchone()[0]
+
+
+def _load_catalog(database_path: str, conn) -> SchemaCatalog:
+    """一次查询读取全部表和字段"""
+    version = _read_schema_version(conn)
+    rows = conn.execute('''
+        SELECT m.name AS table_name, p.name, p.type, p."notnull", p.dflt_value, p.pk, m.sql
+        FROM sqlite_master AS m
+        JOIN pragma_table_info(m.name) AS p
+        WHERE m.type = 'table'
+        ORDER BY m.rowid, p.cid
+    ''').fetchall()
+
+    grouped: Dict[str, List[Dict]] = {}
+    without_rowid = set()
+    for row in rows:
+        if row[6] and 'WITHOUT ROWID' in row[6].upper():
+            without_rowid.add(row[0])
+        grouped.setdefault(row[0], []).append({
+            'name': row[1],
+            'type': row[2],
+            'notnull': bool(row[3]),
+            'default': row[4],
+            'pk': bool(row[5]),
+        })
+    tables = [TableSchema(name, fields, name in without_rowid) for name, fields in grouped.items()]
+    return SchemaCatalog(database_path, version, tables)
+
+
+_catalogs: Dict[str, SchemaCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_schema_catalog(database_path, conn=None) -> SchemaCatalog:
+    """获取数据集的表结构目录
+
+    每次调用只执行一次 PRAGMA schema_version 检查，版本未变时直接返回缓存；
+    表结构发生变化（包括其他进程修改）时重新加载。可传入已借出的连接复用。
+    """
+    path = _normalize_path(database_path)
+    if conn is None:
+        with get_connection(path, readonly=True) as pooled_conn:
+            return get_schema_catalog(path, pooled_conn)
+
+    cached = _catalogs.get(path)
+    version = _read_schema_version(conn)
+    if cached is not None and cached.schema_version == version:
+        return cached
+
+    catalog = _load_catalog(path, conn)
+    with _catalogs_lock:
+        _catalogs[path] = catalog
+    return catalog
+
+
+def invalidate_schema_catalog(database_path):
+    """丢弃数据集的表结构缓存（建表、加字段或替换数据库文件后调用）"""
+    with _catalogs_lock:
+        _catalogs.pop(_normalize_path(database_path), None)
@@ -1,7 +1,7 @@
-import sqlite3
 import json
 from typing import List, Optional
 from app.config import Config
+from app.db import get_schema_catalog
 from app.models.dataset import Dataset
 
 class DataTable:
@@ -29,38 +29,19 @@ class DataTable:
             return []
         
         try:
-            conn = sqlite3.connect(dataset.database_path)
-            cursor = conn.cursor()
-            
-            # 获取所有表名
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            tables = cursor.fetchall()
+            # 表结构来自按schema_version缓存的目录，避免逐表PRAGMA table_info
+            catalog = get_schema_catalog(dataset.database_path)
             
             result = []
-            for (table_name,) in tables:
-                # 获取表结构
-                cursor.execute(f"PRAGMA table_info({table_name})")
-                columns = cursor.fetchall()
-                
-                fields = []
-                for col in columns:
-                    fields.append({
-                        'name': col[1],
-                        'type': col[2],
-                        'notnull': bool(col[3]),
-                        'default': col[4],
-                        'pk': bool(col[5]),
-                    })
-                
+            for table_name in catalog.table_names(include_internal=True):
                 result.append(DataTable(
                     id=len(result) + 1,
                     dataset_id=dataset_id,
                     table_name=table_name,
                     display_name=table_name,
-                    schema_info={'fields': fields},
+                    schema_info=catalog.get_table(table_name).to_schema_info(),
                 ))
             
-            conn.close()
             return result
         except Exception as e:
             print(f"Error reading tables: {e}")
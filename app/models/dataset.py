@@ -1,7 +1,60 @@
-import sqlite3
+import threading
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
+from flask import g, has_request_context
 from app.config import Config
+from app.db import system_connection, get_data_version
+
+# 进程级元数据缓存：保存 datasets 表的行，Dataset.save 时清空；每次使用前用系统数据库的数据版本校验，
+# 其他进程（多worker）修改数据集后缓存同样失效
+_cache_lock = threading.Lock()
+_cached_rows: Dict[int, Optional[Dict]] = {}
+_cached_all: Optional[List[Dict]] = None
+_cache_version: Optional[str] = None
+_cache_epoch = 0
+
+
+def _check_cache_version() -> int:
+    """系统数据库版本变化时清空缓存，返回当前缓存代数（用于丢弃失效期间读到的结果）"""
+    global _cache_version, _cached_all, _cache_epoch
+    version = get_data_version(Config.DATABASE_PATH)
+    with _cache_lock:
+        if version != _cache_version:
+            _cached_rows.clear()
+            _cached_all = None
+            _cache_version = version
+            _cache_epoch += 1
+        return _cache_epoch
+
+
+def invalidate_dataset_cache():
+    global _cache_version, _cached_all, _cache_epoch
+    with _cache_lock:
+        _cached_rows.clear()
+        _cached_all = None
+        _cache_version = None
+        _cache_epoch += 1
+
+
+def _identity_map() -> Optional[Dict[int, Optional['Dataset']]]:
+    """当前请求内的标识映射：同一请求中多次按ID获取数据集返回同一对象，不再访问缓存或系统数据库"""
+    if not has_request_context():
+        return None
+    if '_dataset_identity_map' not in g:
+        g._dataset_identity_map = {}
+    return g._dataset_identity_map
+
+
+def _row_dict(row) -> Dict:
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'description': row['description'] or '',
+        'database_path': row['database_path'],
+        'created_at': row['created_at'],
+        'updated_at': row['updated_at'],
+    }
+
 
 class Dataset:
     def __init__(self, id: int = None, name: str = '', description: str = '', 
@@ -25,76 +78,94 @@ class Dataset:
     
     @staticmethod
     def get_all() -> List['Dataset']:
-        conn = sqlite3.connect(Config.DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, name, description, database_path, created_at, updated_at
-            FROM datasets
-            ORDER BY created_at DESC
-        ''')
-        
-        rows = cursor.fetchall()
-        conn.close()
+        global _cached_all
+        epoch = _check_cache_version()
+        rows = _cached_all
+        if rows is None:
+            with system_connection(readonly=True) as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute('''
+                    SELECT id, name, description, database_path, created_at, updated_at
+                    FROM datasets
+                    ORDER BY created_at DESC
+                ''')
+                
+                rows = [_row_dict(row) for row in cursor.fetchall()]
+            with _cache_lock:
+                if epoch == _cache_epoch:
+                    _cached_all = rows
         
-        return [Dataset(
-            id=row['id'],
-            name=row['name'],
-            description=row['description'] or '',
-            database_path=row['database_path'],
-            created_at=row['created_at'],
-            updated_at=row['updated_at'],
-        ) for row in rows]
+        identity_map = _identity_map()
+        if identity_map is None:
+            return [Dataset(**row) for row in rows]
+        # 列表中的数据集复用请求内已获取的对象
+        datasets = []
+        for row in rows:
+            dataset = identity_map.get(row['id'])
+            if dataset is None:
+                dataset = identity_map[row['id']] = Dataset(**row)
+            datasets.append(dataset)
+        return datasets
     
     @staticmethod
     def get_by_id(dataset_id: int) -> Optional['Dataset']:
-        conn = sqlite3.connect(Config.DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        """按ID获取数据集：先查请求内标识映射，再查进程级缓存，都未命中时查询系统数据库"""
+        identity_map = _identity_map()
+        if identity_map is not None and dataset_id in identity_map:
+            return identity_map[dataset_id]
         
-        cursor.execute('''
-            SELECT id, name, description, database_path, created_at, updated_at
-            FROM datasets
-            WHERE id = ?
-        ''', (dataset_id,))
+        epoch = _check_cache_version()
+        with _cache_lock:
+            cached = dataset_id in _cached_rows
+            row = _cached_rows.get(dataset_id)
+        if not cached:
+            with system_connection(readonly=True) as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute('''
+                    SELECT id, name, description, database_path, created_at, updated_at
+                    FROM datasets
+                    WHERE id = ?
+                ''', (dataset_id,))
+                
+                result = cursor.fetchone()
+            # 不存在的ID同样缓存，避免重复查询
+            row = _row_dict(result) if result else None
+            with _cache_lock:
+                if epoch == _cache_epoch:
+                    _cached_rows[dataset_id] = row
         
-        row = cursor.fetchone()
-        conn.close()
-        
-        if row:
-            return Dataset(
-                id=row['id'],
-                name=row['name'],
-                description=row['description'] or '',
-                database_path=row['database_path'],
-                created_at=row['created_at'],
-                updated_at=row['updated_at'],
-            )
-        return None
+        dataset = Dataset(**row) if row else None
+        if identity_map is not None:
+            identity_map[dataset_id] = dataset
+        return dataset
     
     def save(self) -> 'Dataset':
-        conn = sqlite3.connect(Config.DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        if self.id:
-            # 更新
-            cursor.execute('''
-                UPDATE datasets
-                SET name = ?, description = ?, database_path = ?, updated_at = ?
-                WHERE id = ?
-            ''', (self.name, self.description, self.database_path, 
-                  datetime.now().strftime('%Y-%m-%d %H:%M:%S'), self.id))
-        else:
-            # 插入
-            cursor.execute('''
-                INSERT INTO datasets (name, description, database_path, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (self.name, self.description, self.database_path, 
-                  self.created_at, self.updated_at))
-            self.id = cursor.lastrowid
-        
-        conn.commit()
-        conn.close()
+        with system_connection() as conn:
+            cursor = conn.cursor()
+            
+            if self.id:
+                # 更新
+                cursor.execute('''
+                    UPDATE datasets
+                    SET name = ?, description = ?, database_path = ?, updated_at = ?
+                    WHERE id = ?
+                ''', (self.name, self.description, self.database_path, 
+                      datetime.now().strftime('%Y-%m-%d %H:%M:%S'), self.id))
+            else:
+                # 插入
+                cursor.execute('''
+                    INSERT INTO datasets (name, description, database_path, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (self.name, self.description, self.database_path, 
+                      self.created_at, self.updated_at))
+                self.id = cursor.lastrowid
+            
+            conn.commit()
+        invalidate_dataset_cache()
+        identity_map = _identity_map()
+        if identity_map is not None:
+            identity_map[self.id] = self
         return self
 
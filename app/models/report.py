@@ -1,13 +1,19 @@
-import sqlite3
 import json
 from datetime import datetime
-from typing import List, Optional
-from app.config import Config
+from typing import Dict, List, Optional, Tuple
+from app.db import system_connection
+
+# 报表列表允许的排序字段
+SUMMARY_SORT_FIELDS = ('updated_at', 'created_at', 'name', 'id')
+
 
 class Report:
+    # 修订号字段和列表排序使用的索引，旧的系统数据库在第一次访问时补建
+    _schema_ready = False
+    
     def __init__(self, id: int = None, name: str = '', description: str = '',
                  config: dict = None, created_by: str = '', 
-                 created_at: str = None, updated_at: str = None):
+                 created_at: str = None, updated_at: str = None, revision: int = 0):
         self.id = id
         self.name = name
         self.description = description
@@ -15,6 +21,7 @@ class Report:
         self.created_by = created_by
         self.created_at = created_at or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         self.updated_at = updated_at or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.revision = revision
     
     def to_dict(self):
         return {
@@ -25,22 +32,22 @@ class Report:
             'created_by': self.created_by,
             'created_at': self.created_at,
             'updated_at': self.updated_at,
+            'revision': self.revision,
         }
     
     @staticmethod
     def get_all() -> List['Report']:
-        conn = sqlite3.connect(Config.DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, name, description, config, created_by, created_at, updated_at
-            FROM reports
-            ORDER BY updated_at DESC
-        ''')
-        
-        rows = cursor.fetchall()
-        conn.close()
+        Report.ensure_schema()
+        with system_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT id, name, description, config, created_by, created_at, updated_at, revision
+                FROM reports
+                ORDER BY updated_at DESC
+            ''')
+            
+            rows = cursor.fetchall()
         
         reports = []
         for row in rows:
@@ -56,23 +63,92 @@ class Report:
                 created_by=row['created_by'] or '',
                 created_at=row['created_at'],
                 updated_at=row['updated_at'],
+                revision=row['revision'],
             ))
         return reports
     
     @staticmethod
-    def get_by_id(report_id: int) -> Optional['Report']:
-        conn = sqlite3.connect(Config.DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+    def ensure_schema():
+        if Report._schema_ready:
+            return
+        with system_connection() as conn:
+            columns = [row['name'] for row in conn.execute('PRAGMA table_info(reports)').fetchall()]
+            if 'revision' not in columns:
+                conn.execute('ALTER TABLE reports ADD COLUMN revision INTEGER NOT NULL DEFAULT 0')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_reports_updated_at ON reports (updated_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_reports_created_at ON reports (created_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_reports_name ON reports (name)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_reports_name_nocase ON reports (name COLLATE NOCASE)')
+            conn.commit()
+        Report._schema_ready = True
+    
+    @staticmethod
+    def list_summaries(limit: int = 50, offset: int = 0, sort: str = 'updated_at', order: str = 'desc',
+                       search: str = None) -> Tuple[List[Dict], int]:
+        """报表摘要列表：只查询 id/名称/描述/创建人/时间，不读取和解析 config
         
-        cursor.execute('''
-            SELECT id, name, description, config, created_by, created_at, updated_at
-            FROM reports
-            WHERE id = ?
-        ''', (report_id,))
+        返回 (当前页摘要, 满足搜索条件的总数)；search 按名称前缀匹配（不区分大小写），
+        前缀 LIKE 可以使用 idx_reports_name_nocase 做范围查找，不必扫描全表。
+        """
+        if sort not in SUMMARY_SORT_FIELDS:
+            raise ValueError(f"Unsupported sort field: {sort}")
+        direction = 'ASC' if str(order).lower() == 'asc' else 'DESC'
+        Report.ensure_schema()
         
-        row = cursor.fetchone()
-        conn.close()
+        where_sql = '1=1'
+        params = []
+        if search:
+            escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            where_sql = "name LIKE ? ESCAPE '\\'"
+            params.append(f'{escaped}%')
+        
+        with system_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            
+            # id 作为第二排序键保证翻页稳定
+            cursor.execute(f'''
+                SELECT id, name, description, created_by, created_at, updated_at
+                FROM reports
+                WHERE {where_sql}
+                ORDER BY {sort} {direction}, id {direction}
+                LIMIT ? OFFSET ?
+            ''', params + [limit, offset])
+            rows = cursor.fetchall()
+            
+            cursor.execute(f'SELECT COUNT(*) FROM reports WHERE {where_sql}', params)
+            total = cursor.fetchone()[0]
+        
+        summaries = [{
+            'id': row['id'],
+            'name': row['name'],
+            'description': row['description'] or '',
+            'created_by': row['created_by'] or '',
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+        } for row in rows]
+        return summaries, total
+    
+    @staticmethod
+    def get_version(report_id: int) -> Optional[Tuple[int, str]]:
+        """报表的 (修订号, 更新时间)，不读取config，用于生成ETag；报表不存在时返回None"""
+        Report.ensure_schema()
+        with system_connection(readonly=True) as conn:
+            row = conn.execute('SELECT revision, updated_at FROM reports WHERE id = ?', (report_id,)).fetchone()
+        return (row['revision'], row['updated_at']) if row else None
+    
+    @staticmethod
+    def get_by_id(report_id: int) -> Optional['Report']:
+        Report.ensure_schema()
+        with system_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT id, name, description, config, created_by, created_at, updated_at, revision
+                FROM reports
+                WHERE id = ?
+            ''', (report_id,))
+            
+            row = cursor.fetchone()
         
         if row:
             try:
@@ -87,44 +163,45 @@ class Report:
                 created_by=row['created_by'] or '',
                 created_at=row['created_at'],
                 updated_at=row['updated_at'],
+                revision=row['revision'],
             )
         return None
     
     def save(self) -> 'Report':
-        conn = sqlite3.connect(Config.DATABASE_PATH)
-        cursor = conn.cursor()
-        
         config_json = json.dumps(self.config)
+        Report.ensure_schema()
         
-        if self.id:
-            # 更新
-            cursor.execute('''
-                UPDATE reports
-                SET name = ?, description = ?, config = ?, updated_at = ?
-                WHERE id = ?
-            ''', (self.name, self.description, config_json,
-                  datetime.now().strftime('%Y-%m-%d %H:%M:%S'), self.id))
-        else:
-            # 插入
-            cursor.execute('''
-                INSERT INTO reports (name, description, config, created_by, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (self.name, self.description, config_json, self.created_by,
-                  self.created_at, self.updated_at))
-            self.id = cursor.lastrowid
-        
-        conn.commit()
-        conn.close()
+        with system_connection() as conn:
+            cursor = conn.cursor()
+            
+            if self.id:
+                # 更新，修订号递增（updated_at 只精确到秒，同一秒内的多次保存靠修订号区分）
+                self.updated_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                cursor.execute('''
+                    UPDATE reports
+                    SET name = ?, description = ?, config = ?, updated_at = ?, revision = revision + 1
+                    WHERE id = ?
+                ''', (self.name, self.description, config_json, self.updated_at, self.id))
+                self.revision += 1
+            else:
+                # 插入
+                cursor.execute('''
+                    INSERT INTO reports (name, description, config, created_by, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (self.name, self.description, config_json, self.created_by,
+                      self.created_at, self.updated_at))
+                self.id = cursor.lastrowid
+            
+            conn.commit()
         return self
     
     def delete(self) -> bool:
-        conn = sqlite3.connect(Config.DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('DELETE FROM reports WHERE id = ?', (self.id,))
-        affected = cursor.rowcount
-        conn.commit()
-        conn.close()
+        with system_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('DELETE FROM reports WHERE id = ?', (self.id,))
+            affected = cursor.rowcount
+            conn.commit()
         
         return affected > 0
 
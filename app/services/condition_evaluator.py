@@ -0,0 +1,127 @@
+import math
+from typing import Any, Callable, Dict, Optional
+
+# 条件数据源的服务端求值，规则与前端 ChartComponent 中的
+# evaluateConditionalSource / evaluateCondition 保持一致（包括JS的类型转换语义）
+
+
+def _js_string(value: Any) -> str:
+    """模拟JS的 String(value)"""
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float):
+        if math.isnan(value):
+            return 'NaN'
+        if value.is_integer():
+            return str(int(value))
+        return repr(value)
+    if isinstance(value, (list, tuple)):
+        return ','.join('' if v is None else _js_string(v) for v in value)
+    if isinstance(value, dict):
+        return '[object Object]'
+    return str(value)
+
+
+def _js_number(value: Any) -> float:
+    """模拟JS的 Number(value)，无法转换时返回NaN"""
+    if value is None:
+        return 0.0
+    if isinstance(value, bool):
+        return 1.0 if value else 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        text = value.strip()
+        if not text:
+            return 0.0
+        try:
+            return float(text)
+        except ValueError:
+            return math.nan
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return 0.0
+        if len(value) == 1:
+            return _js_number(value[0])
+    return math.nan
+
+
+def _js_strict_equal(a: Any, b: Any) -> bool:
+    """模拟JS的 ===（数组、对象按引用比较）"""
+    if isinstance(a, (list, dict)) or isinstance(b, (list, dict)):
+        return a is b
+    if isinstance(a, bool) or isinstance(b, bool):
+        return isinstance(a, bool) and isinstance(b, bool) and a == b
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return a == b
+    return type(a) is type(b) and a == b
+
+
+def evaluate_condition(condition: Dict, value: Any) -> bool:
+    """评估单个条件"""
+    if value is None:
+        return False
+
+    operator = condition.get('operator') or '='
+    # 如果是组件值模式，根据模式选择比较值
+    if condition.get('valueType') == 'component' and condition.get('componentValueMode') == 'fixed':
+        condition_value = condition.get('componentTargetValue')
+    else:
+        condition_value = condition.get('staticValue')
+
+    if operator == '=':
+        return _js_string(value) == _js_string(condition_value)
+    if operator == '!=':
+        return _js_string(value) != _js_string(condition_value)
+    if operator in ('>', '<', '>=', '<='):
+        left, right = _js_number(value), _js_number(condition_value)
+        if math.isnan(left) or math.isnan(right):
+            return False
+        if operator == '>':
+            return left > right
+        if operator == '<':
+            return left < right
+        if operator == '>=':
+            return left >= right
+        return left <= right
+    if operator == 'LIKE':
+        return _js_string(condition_value) in _js_string(value)
+    if operator == 'IN':
+        in_values = condition_value if isinstance(condition_value, list) else [condition_value]
+        return any(_js_strict_equal(value, item) for item in in_values)
+    return False
+
+
+def select_conditional_source(data_source: Dict,
+                              get_component_value: Callable[[str, str], Any]) -> Optional[Dict]:
+    """按顺序匹配条件数据源，返回第一个匹配的数据源配置，全部不匹配时返回None"""
+    for source in data_source.get('conditionalSources') or []:
+        # 为了向后兼容，支持旧的 condition 格式
+        if source.get('conditions') is not None:
+            conditions = source['conditions']
+        else:
+            conditions = [source['condition']] if source.get('condition') else []
+        logic_operator = source.get('logicOperator') or 'AND'
+
+        results = []
+        for condition in conditions:
+            condition_value = None
+            if condition.get('valueType') == 'static':
+                condition_value = condition.get('staticValue')
+            elif condition.get('valueType') == 'component' and condition.get('componentId'):
+                condition_value = get_component_value(condition['componentId'],
+                                                      condition.get('componentField') or 'value')
+            results.append(evaluate_condition(condition, condition_value))
+
+        if logic_operator == 'AND':
+            matched = len(results) > 0 and all(results)
+        elif logic_operator == 'OR':
+            matched = any(results)
+        else:
+            matched = False
+
+        if matched:
+            return source
+    return None
@@ -1,137 +1,610 @@
+import base64
+import hashlib
+import json
 import sqlite3
-from typing import List, Dict, Any
+import time
+from contextlib import nullcontext
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from app.config import Config
+from app.db import (
+    get_connection, get_schema_catalog, get_data_version, quote_identifier,
+    read_connection, federated_connection,
+)
 from app.models.dataset import Dataset
+from app.services.index_advisor import index_advisor
+from app.services.metrics import FEDERATED_DATASET_LABEL, observe_query
+from app.services.query_cache import query_cache, normalize_sql, make_params_key
+from app.services.query_guard import QueryInterruptedError, fetch_capped, resolve_budget, running_queries
+from app.services.rollup_service import RollupService
+from app.services.sample_service import SampleService
+from app.services.slow_query_log import slow_query_log
+from app.services.totals_cache import totals_cache
+
+# 聚合函数：接口名称 -> SQL模板
+AGGREGATE_FUNCTIONS = {
+    'sum': 'SUM({field})',
+    'avg': 'AVG({field})',
+    'count': 'COUNT({field})',
+    'min': 'MIN({field})',
+    'max': 'MAX({field})',
+    'count_distinct': 'COUNT(DISTINCT {field})',
+}
+
+def _observe_query(database_path: str, dataset_id: int, table_name: str, sql: str, params: List[Any],
+                   duration: float, rows: int, source: str):
+    """记录一次查询的耗时：写入延迟指标，超过阈值时写入慢查询日志"""
+    observe_query(source, dataset_id, duration, rows)
+    slow_query_log.observe(database_path, dataset_id, table_name, sql, params, duration, rows, source)
+
+def _timed_fetchall(cursor, sql: str, params: List[Any], database_path: str, dataset_id: int,
+                    table_name: str, source: str) -> list:
+    """执行查询并取回全部结果，同时记录耗时"""
+    started = time.perf_counter()
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    _observe_query(database_path, dataset_id, table_name, sql, params,
+                   time.perf_counter() - started, len(rows), source)
+    return rows
 
 class DataService:
     @staticmethod
-    def execute_sql(dataset_id: int, sql: str, params: List[Any] = None) -> Dict:
-        dataset = Dataset.get_by_id(dataset_id)
-        if not dataset:
-            raise ValueError(f"Dataset {dataset_id} not found")
+    def _build_where(filters: List[Dict]) -> Tuple[str, List[Any]]:
+        """根据过滤条件构建WHERE子句和参数"""
+        where_clauses = []
+        params = []
         
-        params = params or []
+        for filter_item in filters or []:
+            field = filter_item.get('field')
+            operator = filter_item.get('operator', '=')
+            value = filter_item.get('value')
+            
+            if field and value is not None:
+                if operator == '>=':
+                    where_clauses.append(f"{field} >= ?")
+                elif operator == '<=':
+                    where_clauses.append(f"{field} <= ?")
+                elif operator == '>':
+                    where_clauses.append(f"{field} > ?")
+                elif operator == '<':
+                    where_clauses.append(f"{field} < ?")
+                elif operator == 'LIKE':
+                    where_clauses.append(f"{field} LIKE ?")
+                else:
+                    where_clauses.append(f"{field} = ?")
+                params.append(value)
         
+        where_sql = ' AND '.join(where_clauses) if where_clauses else '1=1'
+        return where_sql, params
+    
+    @staticmethod
+    def _check_select_sql(sql: str):
         # 简单的SQL安全检查（仅允许SELECT）
         sql_upper = sql.strip().upper()
         if not sql_upper.startswith('SELECT'):
             raise ValueError("Only SELECT queries are allowed")
+    
+    @staticmethod
+    def _stream_rows(database_path: str, sql: str, params: List[Any], header: Dict,
+                     batch_size: int, dataset_id: int = None, timeout_ms: float = None) -> Iterator:
+        """在生成器中执行查询：先产出表头，再用 fetchmany 按批产出行，连接在生成器结束或关闭时归还
+        
+        header 中带 query_id 时登记为可取消的查询，timeout_ms 限制累计的数据库执行时间。
+        """
+        with read_connection(database_path) as conn:
+            if header.get('query_id'):
+                # 查询ID在表头中返回给客户端，执行期间就可能被取消，立即写入共享登记表
+                guard = running_queries.guard(conn, header['query_id'], dataset_id, sql, timeout_ms, shared=True)
+            else:
+                guard = nullcontext()
+            with guard as query:
+                cursor = conn.cursor()
+                # 只统计数据库执行时间，不包括客户端消费每批数据的时间
+                started = time.perf_counter()
+                try:
+                    cursor.execute(sql, params)
+                except Exception as e:
+                    # 被中止的查询交给 guard 转换为 QueryInterruptedError
+                    if query and (query.cancelled or query.timed_out):
+                        raise
+                    raise ValueError(f"SQL execution error: {str(e)}")
+                elapsed = time.perf_counter() - started
+                rows_read = 0
+                columns = [description[0] for description in cursor.description] if cursor.description else []
+                if query:
+                    query.pause()
+                yield {**header, 'columns': columns}
+                while True:
+                    if query:
+                        query.resume()
+                    started = time.perf_counter()
+                    rows = cursor.fetchmany(batch_size)
+                    elapsed += time.perf_counter() - started
+                    if query:
+                        query.pause()
+                    if not rows:
+                        break
+                    rows_read += len(rows)
+                    yield [dict(row) for row in rows]
+                _observe_query(database_path, dataset_id, header.get('table_name'), sql, params,
+                               elapsed, rows_read, 'stream')
+    
+    @staticmethod
+    def stream_sql(dataset_id: int, sql: str, params: List[Any] = None, batch_size: int = None,
+                   query_id: str = None, timeout_ms: float = None) -> Iterator:
+        """流式执行SQL查询
+        
+        返回生成器：第一项为 {'query_id': ..., 'columns': [...]}，之后每项为一批行（字典列表）。
+        内存占用只与批大小有关，与结果集大小无关，因此不限制行数，只限制数据库执行时间。
+        """
+        dataset = Dataset.get_by_id(dataset_id)
+        if not dataset:
+            raise ValueError(f"Dataset {dataset_id} not found")
+        
+        DataService._check_select_sql(sql)
+        budget = resolve_budget(dataset.id, timeout_ms)
+        header = {'query_id': query_id or running_queries.new_query_id()}
+        return DataService._stream_rows(dataset.database_path, sql, params or [], header,
+                                        batch_size or Config.STREAM_BATCH_SIZE, dataset.id,
+                                        budget['timeout_ms'])
+    
+    @staticmethod
+    def stream_table_data(dataset_id: int, table_name: str = None, filters: List[Dict] = None,
+                          limit: int = None, offset: int = 0, batch_size: int = None) -> Iterator:
+        """流式获取表数据，生成器格式同 stream_sql，表头中额外包含实际使用的表名
+        
+        limit 为空时返回全部满足条件的行；流式模式不计算总数。
+        """
+        dataset = Dataset.get_by_id(dataset_id)
+        if not dataset:
+            raise ValueError(f"Dataset {dataset_id} not found")
+        
+        filters = filters or []
+        
+        # 如果未指定表名，根据过滤条件自动选择表
+        if not table_name:
+            table_name = DataService.find_table_by_filters(dataset_id, filters)
+        
+        where_sql, params = DataService._build_where(filters)
+        index_advisor.record(dataset.id, dataset.database_path, table_name, filters)
+        sql = f"SELECT * FROM {table_name} WHERE {where_sql} LIMIT ? OFFSET ?"
+        params = params + [limit if limit is not None else -1, offset or 0]
+        
+        return DataService._stream_rows(dataset.database_path, sql, params, {'table_name': table_name},
+                                        batch_size or Config.STREAM_BATCH_SIZE, dataset.id)
+    
+    @staticmethod
+    def execute_sql(dataset_id: int, sql: str, params: List[Any] = None, use_cache: bool = True,
+                    query_id: str = None, timeout_ms: float = None, max_rows: int = None,
+                    max_bytes: int = None) -> Dict:
+        """执行自定义SQL查询
+        
+        查询受数据集的执行预算约束：超过 timeout_ms 时中止并抛出 QueryInterruptedError，
+        结果超过 max_rows 行或约 max_bytes 字节时截断（truncated 为 True）。执行中的查询
+        可以通过 query_id 取消。
+        """
+        dataset = Dataset.get_by_id(dataset_id)
+        if not dataset:
+            raise ValueError(f"Dataset {dataset_id} not found")
+        
+        params = params or []
+        
+        DataService._check_select_sql(sql)
+        budget = resolve_budget(dataset.id, timeout_ms, max_rows, max_bytes)
+        client_query_id = bool(query_id)
+        query_id = query_id or running_queries.new_query_id()
+        
+        # 相同数据集、规范化SQL、参数和结果上限的查询直接从结果缓存返回
+        cache_key = (dataset.database_path, 'sql', normalize_sql(sql), make_params_key(params),
+                     budget['max_rows'], budget['max_bytes'])
+        version = get_data_version(dataset.database_path)
+        if use_cache:
+            cached = query_cache.get(cache_key, version)
+            if cached is not None:
+                return {**cached, 'query_id': query_id}
         
         try:
-            conn = sqlite3.connect(dataset.database_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            cursor.execute(sql, params)
-            rows = cursor.fetchall()
-            
-            # 获取列名
-            columns = [description[0] for description in cursor.description] if cursor.description else []
-            
-            # 转换为字典列表
-            data = [dict(row) for row in rows]
+            with read_connection(dataset.database_path) as conn:
+                with running_queries.guard(conn, query_id, dataset.id, sql, budget['timeout_ms'],
+                                           shared=client_query_id):
+                    cursor = conn.cursor()
+                    started = time.perf_counter()
+                    cursor.execute(sql, params)
+                    
+                    # 获取列名
+                    columns = [description[0] for description in cursor.description] if cursor.description else []
+                    
+                    rows, truncated = fetch_capped(cursor, columns, budget['max_rows'], budget['max_bytes'])
+                    cursor.close()
+                    _observe_query(dataset.database_path, dataset.id, None, sql, params,
+                                   time.perf_counter() - started, len(rows), 'sql')
+                
+                # 转换为字典列表
+                data = [dict(row) for row in rows]
             
-            conn.close()
+            result = {
+                'data': data,
+                'columns': columns,
+                'truncated': truncated is not None,
+                'truncated_reason': truncated,
+                'max_rows': budget['max_rows'],
+                'max_bytes': budget['max_bytes'],
+            }
+        except QueryInterruptedError:
+            raise
+        except Exception as e:
+            raise ValueError(f"SQL execution error: {str(e)}")
+        
+        if use_cache:
+            query_cache.put(cache_key, version, result)
+        return {**result, 'query_id': query_id}
+    
+    @staticmethod
+    def federated_alias(dataset_id: int) -> str:
+        """数据集在跨数据集查询中的别名，SQL中以 ds<ID>.<表名> 引用"""
+        return f"ds{int(dataset_id)}"
+    
+    @staticmethod
+    def _federated_datasets(dataset_ids: List[int]) -> List[Dataset]:
+        if not dataset_ids:
+            raise ValueError("At least one dataset is required")
+        unique_ids = list(dict.fromkeys(int(dataset_id) for dataset_id in dataset_ids))
+        if len(unique_ids) > Config.FEDERATED_MAX_DATASETS:
+            raise ValueError(f"At most {Config.FEDERATED_MAX_DATASETS} datasets can be queried together")
+        datasets = []
+        for dataset_id in unique_ids:
+            dataset = Dataset.get_by_id(dataset_id)
+            if not dataset:
+                raise ValueError(f"Dataset {dataset_id} not found")
+            datasets.append(dataset)
+        return datasets
+    
+    @staticmethod
+    def _federated_budget(datasets: List[Dataset], timeout_ms: float = None, max_rows: int = None,
+                          max_bytes: int = None) -> Dict:
+        """跨数据集查询取所有数据集中最严格的预算（0表示不限制）"""
+        budgets = [resolve_budget(dataset.id, timeout_ms, max_rows, max_bytes) for dataset in datasets]
+        return {key: min((budget[key] for budget in budgets if budget[key]), default=0)
+                for key in ('timeout_ms', 'max_rows', 'max_bytes')}
+    
+    @staticmethod
+    def execute_federated_sql(dataset_ids: List[int], sql: str, params: List[Any] = None,
+                              use_cache: bool = True, query_id: str = None, timeout_ms: float = None,
+                              max_rows: int = None, max_bytes: int = None) -> Dict:
+        """跨数据集执行SQL查询
+        
+        各数据集以只读方式附加到同一个连接，表以 ds<ID>.<表名> 引用，因此可以在一条SQL中
+        UNION ALL 或关联多个数据集。执行预算取各数据集中最严格的，结果格式同 execute_sql。
+        """
+        datasets = DataService._federated_datasets(dataset_ids)
+        params = params or []
+        
+        DataService._check_select_sql(sql)
+        budget = DataService._federated_budget(datasets, timeout_ms, max_rows, max_bytes)
+        client_query_id = bool(query_id)
+        query_id = query_id or running_queries.new_query_id()
+        attachments = {DataService.federated_alias(dataset.id): dataset.database_path for dataset in datasets}
+        
+        cache_key = (tuple(sorted(attachments.items())), 'federated_sql', normalize_sql(sql),
+                     make_params_key(params), budget['max_rows'], budget['max_bytes'])
+        version = tuple(get_data_version(dataset.database_path) for dataset in datasets)
+        if use_cache:
+            cached = query_cache.get(cache_key, version)
+            if cached is not None:
+                return {**cached, 'query_id': query_id}
+        
+        dataset_label = ','.join(str(dataset.id) for dataset in datasets)
+        try:
+            with federated_connection(attachments) as conn:
+                with running_queries.guard(conn, query_id, dataset_label, sql, budget['timeout_ms'],
+                                           shared=client_query_id):
+                    cursor = conn.cursor()
+                    started = time.perf_counter()
+                    cursor.execute(sql, params)
+                    columns = [description[0] for description in cursor.description] if cursor.description else []
+                    rows, truncated = fetch_capped(cursor, columns, budget['max_rows'], budget['max_bytes'])
+                    cursor.close()
+                    duration = time.perf_counter() - started
+                observe_query('federated', FEDERATED_DATASET_LABEL, duration, len(rows))
+                slow_query_log.observe(attachments, dataset_label, None, sql, params, duration, len(rows), 'federated')
+                data = [dict(row) for row in rows]
             
-            return {
+            result = {
                 'data': data,
                 'columns': columns,
+                'datasets': {DataService.federated_alias(dataset.id): dataset.id for dataset in datasets},
+                'truncated': truncated is not None,
+                'truncated_reason': truncated,
+                'max_rows': budget['max_rows'],
+                'max_bytes': budget['max_bytes'],
             }
+        except QueryInterruptedError:
+            raise
         except Exception as e:
             raise ValueError(f"SQL execution error: {str(e)}")
+        
+        if use_cache:
+            query_cache.put(cache_key, version, result)
+        return {**result, 'query_id': query_id}
     
     @staticmethod
-    def find_table_by_filters(dataset_id: int, filters: List[Dict] = None) -> str:
-        """根据过滤条件中的字段自动选择表"""
-        dataset = Dataset.get_by_id(dataset_id)
-        if not dataset:
-            raise ValueError(f"Dataset {dataset_id} not found")
+    def get_federated_table_data(dataset_ids: List[int], table_name: str, filters: List[Dict] = None,
+                                 limit: int = 100, offset: int = 0, count_mode: str = 'exact',
+                                 use_cache: bool = True, query_id: str = None, timeout_ms: float = None,
+                                 max_rows: int = None, max_bytes: int = None) -> Dict:
+        """把多个数据集中的同名表合并为一个结果（UNION ALL）
         
+        只返回所有数据集的该表都具有的字段（按第一个数据集中的顺序），每行附加来源数据集ID
+        __dataset_id。过滤条件下推到每个数据集的子查询中，因此各自的索引都能生效。
+        count_mode 为 'exact' 时返回各数据集计数之和，为 'none' 时不计算总数。
+        与 execute_federated_sql 相同，受各数据集中最严格的执行预算约束，可以按 query_id 取消。
+        """
+        if count_mode not in ('exact', 'none'):
+            raise ValueError(f"Unsupported count mode: {count_mode}")
+        datasets = DataService._federated_datasets(dataset_ids)
         filters = filters or []
+        budget = DataService._federated_budget(datasets, timeout_ms, max_rows, max_bytes)
+        client_query_id = bool(query_id)
+        query_id = query_id or running_queries.new_query_id()
         
-        # 如果没有过滤条件，返回第一个表
-        if not filters:
-            try:
-                conn = sqlite3.connect(dataset.database_path)
-                cursor = conn.cursor()
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' LIMIT 1")
-                result = cursor.fetchone()
-                conn.close()
-                if result:
-                    return result[0]
-                raise ValueError("No tables found in dataset")
-            except Exception as e:
-                raise ValueError(f"Find table error: {str(e)}")
+        tables = []
+        for dataset in datasets:
+            table = get_schema_catalog(dataset.database_path).get_table(table_name)
+            if not table:
+                raise ValueError(f"Table {table_name} not found in dataset {dataset.id}")
+            tables.append(table)
         
-        # 从过滤条件中提取字段名
-        filter_fields = []
+        columns = [field['name'] for field in tables[0].fields
+                   if all(table.has_field(field['name']) for table in tables[1:])]
+        if not columns:
+            raise ValueError(f"Table {table_name} has no fields shared by all datasets")
+        shared = {column.lower() for column in columns}
         for filter_item in filters:
             field = filter_item.get('field')
-            if field:
-                filter_fields.append(field.lower())
+            if field and field.lower() not in shared:
+                raise ValueError(f"Filter field {field} is not shared by all datasets")
         
-        if not filter_fields:
-            # 如果没有有效字段，返回第一个表
-            try:
-                conn = sqlite3.connect(dataset.database_path)
-                cursor = conn.cursor()
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' LIMIT 1")
-                result = cursor.fetchone()
-                conn.close()
-                if result:
-                    return result[0]
-                raise ValueError("No tables found in dataset")
-            except Exception as e:
-                raise ValueError(f"Find table error: {str(e)}")
+        where_sql, where_params = DataService._build_where(filters)
+        branches = []
+        branch_counts = []
+        params = []
+        count_params = []
+        for dataset, table in zip(datasets, tables):
+            alias = DataService.federated_alias(dataset.id)
+            source = f"{alias}.{quote_identifier(table.name)}"
+            select_list = ', '.join(quote_identifier(table.resolve_field(column)) for column in columns)
+            branches.append(f"SELECT {int(dataset.id)} AS __dataset_id, {select_list} FROM {source} WHERE {where_sql}")
+            branch_counts.append(f"(SELECT COUNT(*) FROM {source} WHERE {where_sql})")
+            params.extend(where_params)
+            count_params.extend(where_params)
+            index_advisor.record(dataset.id, dataset.database_path, table.name, filters)
         
-        # 查找包含这些字段的表
+        sql = ' UNION ALL '.join(branches) + " LIMIT ? OFFSET ?"
+        params.extend([limit if limit is not None else -1, offset or 0])
+        count_sql = f"SELECT {' + '.join(branch_counts)}"
+        attachments = {DataService.federated_alias(dataset.id): dataset.database_path for dataset in datasets}
+        
+        cache_key = (tuple(sorted(attachments.items())), 'federated_table', normalize_sql(sql),
+                     make_params_key(params), count_mode, budget['max_rows'], budget['max_bytes'])
+        version = tuple(get_data_version(dataset.database_path) for dataset in datasets)
+        if use_cache:
+            cached = query_cache.get(cache_key, version)
+            if cached is not None:
+                return {**cached, 'query_id': query_id}
+        
+        dataset_label = ','.join(str(dataset.id) for dataset in datasets)
         try:
-            conn = sqlite3.connect(dataset.database_path)
-            cursor = conn.cursor()
-            
-            # 获取所有表名
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
-            tables = cursor.fetchall()
-            
-            # 查找包含所有过滤字段的表
-            for (table_name,) in tables:
-                cursor.execute(f"PRAGMA table_info({table_name})")
-                columns = cursor.fetchall()
-                table_fields = [col[1].lower() for col in columns]
-                
-                # 检查表是否包含所有过滤字段
-                if all(field in table_fields for field in filter_fields):
-                    conn.close()
-                    return table_name
-            
-            # 如果没有找到包含所有字段的表，查找包含最多字段的表
-            best_table = None
-            best_match_count = 0
-            
-            for (table_name,) in tables:
-                cursor.execute(f"PRAGMA table_info({table_name})")
-                columns = cursor.fetchall()
-                table_fields = [col[1].lower() for col in columns]
-                
-                match_count = sum(1 for field in filter_fields if field in table_fields)
-                if match_count > best_match_count:
-                    best_match_count = match_count
-                    best_table = table_name
+            with federated_connection(attachments) as conn:
+                with running_queries.guard(conn, query_id, dataset_label, sql, budget['timeout_ms'],
+                                           shared=client_query_id):
+                    cursor = conn.cursor()
+                    started = time.perf_counter()
+                    cursor.execute(sql, params)
+                    result_columns = [description[0] for description in cursor.description]
+                    rows, truncated = fetch_capped(cursor, result_columns, budget['max_rows'], budget['max_bytes'])
+                    duration = time.perf_counter() - started
+                    total = None
+                    if count_mode == 'exact':
+                        cursor.execute(count_sql, count_params)
+                        total = cursor.fetchone()[0]
+                    cursor.close()
+                observe_query('federated', FEDERATED_DATASET_LABEL, duration, len(rows))
+                slow_query_log.observe(attachments, dataset_label, tables[0].name, sql, params, duration, len(rows),
+                                       'federated')
+                data = [dict(row) for row in rows]
+        except QueryInterruptedError:
+            raise
+        except Exception as e:
+            raise ValueError(f"Query error: {str(e)}")
+        
+        result = {
+            'data': data,
+            'columns': result_columns,
+            'total': total,
+            'limit': limit,
+            'offset': offset,
+            'table_name': tables[0].name,
+            'dataset_ids': [dataset.id for dataset in datasets],
+            'truncated': truncated is not None,
+            'truncated_reason': truncated,
+        }
+        if use_cache:
+            query_cache.put(cache_key, version, result)
+        return {**result, 'query_id': query_id}
+    
+    @staticmethod
+    def find_table_by_filters(dataset_id: int, filters: List[Dict] = None) -> str:
+        """根据过滤条件中的字段自动选择表"""
+        dataset = Dataset.get_by_id(dataset_id)
+        if not dataset:
+            raise ValueError(f"Dataset {dataset_id} not found")
+        
+        filters = filters or []
+        
+        try:
+            # 通过schema目录的字段倒排索引选表，代价与过滤字段数成正比
+            catalog = get_schema_catalog(dataset.database_path)
             
-            conn.close()
+            # 从过滤条件中提取字段名
+            filter_fields = [filter_item.get('field') for filter_item in filters if filter_item.get('field')]
             
-            if best_table:
-                return best_table
-            else:
-                # 如果还是没找到，返回第一个表
-                if tables:
-                    return tables[0][0]
+            # 包含所有字段的表优先，其次是包含字段最多的表，否则返回第一个表
+            table_name = catalog.select_table(filter_fields)
+            if not table_name:
                 raise ValueError("No tables found in dataset")
+            return table_name
         except Exception as e:
             raise ValueError(f"Find table error: {str(e)}")
     
+    @staticmethod
+    def _encode_cursor(payload: Dict) -> str:
+        raw = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+    
+    @staticmethod
+    def _decode_cursor(token: str) -> Dict:
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        except Exception:
+            raise ValueError("Invalid cursor")
+        if not isinstance(payload, dict) or not isinstance(payload.get('v'), list):
+            raise ValueError("Invalid cursor")
+        return payload
+    
+    @staticmethod
+    def _filters_fingerprint(filters: List[Dict]) -> str:
+        normalized = json.dumps(filters or [], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16]
+    
+    @staticmethod
+    def _seek_clause(order_column: str, key_columns: List[str], last_values: List[Any],
+                     descending: bool) -> Tuple[str, List[Any]]:
+        """构建键集分页的范围条件，使用行值比较以便走索引定位
+        
+        排序列允许为NULL：SQLite升序时NULL在前，降序时NULL在后。
+        """
+        op = '<' if descending else '>'
+        keys = ', '.join(key_columns)
+        key_marks = ', '.join('?' for _ in key_columns)
+        if not order_column:
+            return f"({keys}) {op} ({key_marks})", list(last_values)
+        
+        order_value, key_values = last_values[0], list(last_values[1:])
+        if order_value is None:
+            if descending:
+                return f"({order_column} IS NULL AND ({keys}) {op} ({key_marks}))", key_values
+            return f"(({order_column} IS NULL AND ({keys}) {op} ({key_marks})) OR {order_column} IS NOT NULL)", key_values
+        clause = f"({order_column}, {keys}) {op} (?, {key_marks})"
+        if descending:
+            clause = f"({clause} OR {order_column} IS NULL)"
+        return clause, [order_value] + key_values
+    
+    @staticmethod
+    def _estimate_table_rows(cursor, table) -> int:
+        """不扫描表估算行数：优先使用 sqlite_stat1（ANALYZE结果），否则用rowid范围近似"""
+        try:
+            cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = ? COLLATE NOCASE", (table.name,))
+            counts = [int(row[0].split()[0]) for row in cursor.fetchall() if row[0]]
+            if counts:
+                return max(counts)
+        except Exception:
+            # 数据库未执行过ANALYZE时没有 sqlite_stat1
+            pass
+        if table.without_rowid:
+            return -1
+        cursor.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {quote_identifier(table.name)}")
+        low, high = cursor.fetchone()
+        if low is None:
+            return 0
+        return high - low + 1
+    
+    @staticmethod
+    def _estimate_count(cursor, table, where_sql: str, params: List[Any]) -> Tuple[int, bool]:
+        """估算满足条件的行数，返回 (total, approximate)
+        
+        无过滤条件时直接使用表行数估算；有过滤条件时在若干个均匀分布的rowid区间内
+        抽样，按命中比例推算。小表直接精确计数。
+        """
+        sample_size = Config.COUNT_ESTIMATE_SAMPLE_SIZE
+        table_rows = DataService._estimate_table_rows(cursor, table)
+        if 0 <= table_rows <= sample_size:
+            cursor.execute(f"SELECT COUNT(*) FROM {quote_identifier(table.name)} WHERE {where_sql}", params)
+            return cursor.fetchone()[0], False
+        if where_sql == '1=1' and table_rows >= 0:
+            return table_rows, True
+        
+        quoted = quote_identifier(table.name)
+        if table.without_rowid:
+            cursor.execute(f"SELECT COUNT(*), SUM(CASE WHEN {where_sql} THEN 1 ELSE 0 END) "
+                           f"FROM (SELECT * FROM {quoted} LIMIT ?)", params + [sample_size])
+            sampled, matched = cursor.fetchone()
+            cursor.execute(f"SELECT COUNT(*) FROM {quoted}")
+            table_rows = cursor.fetchone()[0]
+        else:
+            # 分层抽样：把rowid范围切成若干段，每段从起点顺序读取一小块
+            cursor.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {quoted}")
+            low, high = cursor.fetchone()
+            blocks = 8
+            block_size = max(sample_size // blocks, 1)
+            step = max((high - low + 1) // blocks, 1)
+            parts = []
+            sample_params = []
+            for i in range(blocks):
+                parts.append(f"SELECT * FROM (SELECT CASE WHEN {where_sql} THEN 1 ELSE 0 END AS m "
+                             f"FROM {quoted} WHERE rowid >= ? ORDER BY rowid LIMIT ?)")
+                sample_params.extend(params + [low + i * step, block_size])
+            cursor.execute(f"SELECT COUNT(*), SUM(m) FROM ({' UNION ALL '.join(parts)})", sample_params)
+            sampled, matched = cursor.fetchone()
+        if not sampled:
+            return 0, True
+        return int(round(table_rows * (matched or 0) / sampled)), True
+    
+    @staticmethod
+    def _count_rows(cursor, dataset: Dataset, table_name: str, where_sql: str,
+                    params: List[Any], count_mode: str = 'exact') -> Tuple[int, bool]:
+        """计算满足条件的总行数，返回 (total, approximate)
+        
+        结果按 (数据集, 表, 规范化的过滤条件) 缓存，数据集写入后失效；
+        count_mode='estimate' 时返回基于 sqlite_stat1 或抽样的近似值。
+        """
+        estimate = count_mode == 'estimate'
+        key = (
+            dataset.database_path,
+            table_name.lower(),
+            where_sql,
+            json.dumps(params, ensure_ascii=False, default=str),
+            estimate,
+        )
+        # 先读取代数再计数，计数期间发生的写入会使该条目在下次读取时失效
+        version = get_data_version(dataset.database_path)
+        cached = totals_cache.get(key, version)
+        if cached is not None:
+            return cached
+        
+        table = get_schema_catalog(dataset.database_path, cursor.connection).get_table(table_name) if estimate else None
+        if table is not None:
+            total, approximate = DataService._estimate_count(cursor, table, where_sql, params)
+        else:
+            rows = _timed_fetchall(cursor, f"SELECT COUNT(*) as total FROM {table_name} WHERE {where_sql}", params,
+                                  dataset.database_path, dataset.id, table_name, 'count')
+            total, approximate = rows[0]['total'], False
+        
+        totals_cache.put(key, version, total, approximate)
+        return total, approximate
+    
     @staticmethod
     def get_table_data(dataset_id: int, table_name: str = None, filters: List[Dict] = None, 
-                      limit: int = 100, offset: int = 0) -> Dict:
+                      limit: int = 100, offset: int = 0, pagination: str = 'offset',
+                      cursor: str = None, order_by: str = None, order: str = 'asc',
+                      count_mode: str = 'exact', use_cache: bool = True, approximate: bool = False) -> Dict:
+        """分页获取表数据
+        
+        pagination='offset' 为原有的 LIMIT/OFFSET 分页；pagination='cursor'（或传入cursor）
+        时使用键集分页：按 rowid（WITHOUT ROWID表为主键）及可选的 order_by 列排序，
+        返回的 next_cursor 用于获取下一页，每页都是一次索引范围定位，代价与页码无关。
+        count_mode='estimate' 时 total 为近似值，并通过 total_approximate 标记。
+        approximate=True 且表有样本时（仅限 offset 分页），行取自样本表，total 为估计值并附带置信区间。
+        """
         dataset = Dataset.get_by_id(dataset_id)
         if not dataset:
             raise ValueError(f"Dataset {dataset_id} not found")
@@ -143,56 +616,135 @@ class DataService:
             table_name = DataService.find_table_by_filters(dataset_id, filters)
         
         # 构建WHERE子句
-        where_clauses = []
-        params = []
+        where_sql, params = DataService._build_where(filters)
         
-        for filter_item in filters:
-            field = filter_item.get('field')
-            operator = filter_item.get('operator', '=')
-            value = filter_item.get('value')
-            
-            if field and value is not None:
-                if operator == '>=':
-                    where_clauses.append(f"{field} >= ?")
-                elif operator == '<=':
-                    where_clauses.append(f"{field} <= ?")
-                elif operator == '>':
-                    where_clauses.append(f"{field} > ?")
-                elif operator == '<':
-                    where_clauses.append(f"{field} < ?")
-                elif operator == 'LIKE':
-                    where_clauses.append(f"{field} LIKE ?")
-                else:
-                    where_clauses.append(f"{field} = ?")
-                params.append(value)
+        use_cursor = pagination == 'cursor' or bool(cursor)
+        cache_key = (
+            dataset.database_path, 'table', table_name.lower(), where_sql, make_params_key(params),
+            limit, None if use_cursor else offset, use_cursor, cursor, order_by, order, count_mode,
+            approximate and not use_cursor,
+        )
+        version = get_data_version(dataset.database_path)
+        if use_cache:
+            cached = query_cache.get(cache_key, version)
+            if cached is not None:
+                return cached
         
-        where_sql = ' AND '.join(where_clauses) if where_clauses else '1=1'
+        sample = None
+        if approximate and not use_cursor:
+            table = get_schema_catalog(dataset.database_path).get_table(table_name)
+            if table:
+                sample = DataService._match_sample(dataset, table, [f.get('field') for f in filters])
+        
+        if sample:
+            result = DataService._get_table_data_from_sample(dataset, table_name, sample, where_sql, params,
+                                                             limit, offset)
+        elif use_cursor:
+            index_advisor.record(dataset.id, dataset.database_path, table_name, filters, order_by)
+            result = DataService._get_table_data_by_cursor(
+                dataset, table_name, filters, where_sql, params, limit, cursor, order_by, order, count_mode)
+        else:
+            index_advisor.record(dataset.id, dataset.database_path, table_name, filters)
+            result = DataService._get_table_data_by_offset(
+                dataset, table_name, where_sql, params, limit, offset, count_mode)
+        
+        if use_cache:
+            query_cache.put(cache_key, version, result)
+        return result
+    
+    @staticmethod
+    def _match_sample(dataset: Dataset, table, fields: List[str]) -> Optional[Dict]:
+        """近似查询使用的样本，没有覆盖查询字段的样本时返回None
+
+        读请求不创建样本（建表和触发器是写操作），样本只通过 POST /api/datasets/<id>/samples 创建。
+        """
+        return SampleService.match(dataset.database_path, table.name, fields)
+    
+    @staticmethod
+    def _sample_info(sample: Dict, sample_rows: int) -> Dict:
+        return {
+            'table_name': sample['source_table'],
+            'rate': sample['rate'],
+            'sample_rows': sample_rows,
+            'confidence': Config.SAMPLE_CONFIDENCE,
+            'refreshed_at': sample['refreshed_at'],
+        }
+    
+    @staticmethod
+    def _apply_sample_estimates(data: List[Dict], measures: List[Dict], rate: float) -> List[Dict]:
+        """把样本上的聚合值换算为全表估计值（原地修改 data 并移除辅助列），返回与 data 对齐的
+        [{'sample_rows': 分组的样本行数, 'intervals': {度量别名: [下限, 上限] 或 None}}]"""
+        estimates = []
+        for item in data:
+            intervals = {}
+            for i, measure in enumerate(measures):
+                value, interval = SampleService.estimate(measure['func'], rate, item[measure['alias']],
+                                                         item.pop(f'__sq_{i}', None), item.pop(f'__n_{i}', None))
+                item[measure['alias']] = value
+                intervals[measure['alias']] = interval
+            estimates.append({'sample_rows': item.pop('__sample_rows'), 'intervals': intervals})
+        return estimates
+    
+    @staticmethod
+    def _get_table_data_from_sample(dataset: Dataset, table_name: str, sample: Dict, where_sql: str,
+                                    params: List[Any], limit: int, offset: int) -> Dict:
+        """近似模式的分页：行取自样本表，总数为样本中满足条件的行数除以入样概率"""
+        select_list = ', '.join(quote_identifier(c) for c in sample['columns'])
+        sample_table = quote_identifier(sample['table_name'])
+        sql = f"SELECT {select_list} FROM {sample_table} WHERE {where_sql} LIMIT ? OFFSET ?"
+        try:
+            with read_connection(dataset.database_path) as conn:
+                cursor = conn.cursor()
+                rows = _timed_fetchall(cursor, sql, params + [limit, offset], dataset.database_path, dataset.id,
+                                      sample['table_name'], 'table-data')
+                columns = [description[0] for description in cursor.description] if cursor.description else []
+                data = [dict(row) for row in rows]
+                count = _timed_fetchall(cursor, f"SELECT COUNT(*) AS total FROM {sample_table} WHERE {where_sql}",
+                                        params, dataset.database_path, dataset.id, sample['table_name'],
+                                        'count')[0]['total']
+        except Exception as e:
+            raise ValueError(f"Query error: {str(e)}")
         
+        total, interval = SampleService.estimate('count', sample['rate'], count)
+        return {
+            'data': data,
+            'columns': columns,
+            'total': total,
+            'total_approximate': True,
+            'total_interval': interval,
+            'limit': limit,
+            'offset': offset,
+            'table_name': table_name,
+            'approximate': True,
+            'sample': DataService._sample_info(sample, count),
+        }
+    
+    @staticmethod
+    def _get_table_data_by_offset(dataset: Dataset, table_name: str, where_sql: str, params: List[Any],
+                                  limit: int, offset: int, count_mode: str = 'exact') -> Dict:
+        """LIMIT/OFFSET 分页"""
         sql = f"SELECT * FROM {table_name} WHERE {where_sql} LIMIT ? OFFSET ?"
-        params.extend([limit, offset])
+        params = params + [limit, offset]
         
         try:
-            conn = sqlite3.connect(dataset.database_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            cursor.execute(sql, params)
-            rows = cursor.fetchall()
-            
-            columns = [description[0] for description in cursor.description] if cursor.description else []
-            data = [dict(row) for row in rows]
-            
-            # 获取总数
-            count_sql = f"SELECT COUNT(*) as total FROM {table_name} WHERE {where_sql}"
-            cursor.execute(count_sql, params[:-2])  # 去掉LIMIT和OFFSET参数
-            total = cursor.fetchone()['total']
-            
-            conn.close()
+            with read_connection(dataset.database_path) as conn:
+                cursor = conn.cursor()
+                
+                rows = _timed_fetchall(cursor, sql, params, dataset.database_path, dataset.id,
+                                      table_name, 'table-data')
+                
+                columns = [description[0] for description in cursor.description] if cursor.description else []
+                data = [dict(row) for row in rows]
+                
+                # 获取总数（去掉LIMIT和OFFSET参数）
+                total, approximate = DataService._count_rows(
+                    cursor, dataset, table_name, where_sql, params[:-2], count_mode)
             
             return {
                 'data': data,
                 'columns': columns,
                 'total': total,
+                'total_approximate': approximate,
                 'limit': limit,
                 'offset': offset,
                 'table_name': table_name,  # 返回实际使用的表名
@@ -201,60 +753,335 @@ class DataService:
             raise ValueError(f"Query error: {str(e)}")
     
     @staticmethod
-    def insert_table_data(dataset_id: int, table_name: str, data: Dict[str, Any]) -> Dict:
-        """插入数据到指定表"""
+    def _get_table_data_by_cursor(dataset: Dataset, table_name: str, filters: List[Dict],
+                                  where_sql: str, params: List[Any], limit: int, cursor_token: str,
+                                  order_by: str, order: str, count_mode: str = 'exact') -> Dict:
+        """键集（seek）分页"""
+        table = get_schema_catalog(dataset.database_path).get_table(table_name)
+        if not table:
+            raise ValueError(f"Table {table_name} not found")
+        
+        descending = str(order or 'asc').lower() == 'desc'
+        fingerprint = DataService._filters_fingerprint(filters)
+        
+        if cursor_token:
+            state = DataService._decode_cursor(cursor_token)
+            # 续页沿用游标中记录的排序方式，并校验查询条件未变化
+            if state.get('t') != table.name or state.get('f') != fingerprint:
+                raise ValueError("Cursor does not match the query")
+            order_by = state.get('o')
+            descending = bool(state.get('d'))
+        
+        order_field = None
+        if order_by:
+            order_field = table.resolve_field(order_by)
+            if not order_field:
+                raise ValueError(f"Field {order_by} not found in table {table.name}")
+        
+        if table.without_rowid:
+            key_fields = table.primary_key
+            key_columns = [quote_identifier(f) for f in key_fields]
+        else:
+            key_fields = ['rowid']
+            key_columns = ['rowid']
+        order_column = quote_identifier(order_field) if order_field else None
+        
+        seek_alias = [f"__seek_{i}" for i in range(len(key_columns))]
+        select_extra = ', '.join(f"{col} AS {alias}" for col, alias in zip(key_columns, seek_alias))
+        
+        page_where = where_sql
+        page_params = list(params)
+        if cursor_token:
+            expected = len(key_columns) + (1 if order_column else 0)
+            if len(state['v']) != expected:
+                raise ValueError("Invalid cursor")
+            seek_sql, seek_params = DataService._seek_clause(order_column, key_columns, state['v'], descending)
+            page_where = f"({where_sql}) AND {seek_sql}"
+            page_params.extend(seek_params)
+        
+        direction = 'DESC' if descending else 'ASC'
+        order_items = ([f"{order_column} {direction}"] if order_column else []) + \
+                      [f"{col} {direction}" for col in key_columns]
+        
+        # 多取一行用于判断是否还有下一页
+        sql = (f"SELECT *, {select_extra} FROM {quote_identifier(table.name)} WHERE {page_where} "
+               f"ORDER BY {', '.join(order_items)} LIMIT ?")
+        page_params.append(limit + 1)
+        
+        try:
+            with read_connection(dataset.database_path) as conn:
+                cursor = conn.cursor()
+                
+                rows = _timed_fetchall(cursor, sql, page_params, dataset.database_path, dataset.id,
+                                      table.name, 'table-data')
+                
+                columns = [d[0] for d in cursor.description if d[0] not in seek_alias] if cursor.description else []
+                
+                has_more = len(rows) > limit
+                rows = rows[:limit]
+                data = []
+                for row in rows:
+                    item = dict(row)
+                    for alias in seek_alias:
+                        item.pop(alias, None)
+                    data.append(item)
+                
+                # 获取总数
+                total, approximate = DataService._count_rows(
+                    cursor, dataset, table_name, where_sql, params, count_mode)
+            
+            next_cursor = None
+            if has_more and rows:
+                last = rows[-1]
+                values = ([last[order_field]] if order_field else []) + [last[alias] for alias in seek_alias]
+                next_cursor = DataService._encode_cursor({
+                    't': table.name,
+                    'f': fingerprint,
+                    'o': order_field,
+                    'd': descending,
+                    'v': values,
+                })
+            
+            return {
+                'data': data,
+                'columns': columns,
+                'total': total,
+                'total_approximate': approximate,
+                'limit': limit,
+                'offset': None,
+                'next_cursor': next_cursor,
+                'has_more': has_more,
+                'table_name': table.name,
+            }
+        except Exception as e:
+            raise ValueError(f"Query error: {str(e)}")
+    
+    @staticmethod
+    def aggregate(dataset_id: int, table_name: str = None, dimensions: List[str] = None,
+                  measures: List[Dict] = None, filters: List[Dict] = None,
+                  sort: List[Dict] = None, limit: int = None, use_cache: bool = True,
+                  use_rollup: bool = True, approximate: bool = False) -> Dict:
+        """在数据库中按维度分组聚合，只返回分组后的结果
+        
+        measures 每项形如 {'field': 'amount', 'func': 'sum', 'alias': 'total'}，
+        func 支持 sum/avg/count/min/max/count_distinct；sort 每项形如
+        {'field': 'total', 'order': 'desc'}，可引用维度或度量别名；limit 用于Top-N。
+        维度、过滤字段和度量都能由某个汇总表满足时，直接对汇总表做二次聚合
+        （结果中的 rollup 为使用的汇总表名称），use_rollup=False 时始终查询源表。
+        approximate=True 且没有可用的汇总表时，在源表的样本上聚合：count/sum 按入样概率放大，
+        estimates 中给出每个分组的样本行数和各度量的置信区间；表没有样本时按精确查询执行。
+        """
         dataset = Dataset.get_by_id(dataset_id)
         if not dataset:
             raise ValueError(f"Dataset {dataset_id} not found")
         
+        dimensions = dimensions or []
+        measures = measures or []
+        filters = filters or []
+        sort = sort or []
+        
+        if not dimensions and not measures:
+            raise ValueError("At least one dimension or measure is required")
+        
+        # 如果未指定表名，根据维度、度量和过滤字段自动选择表
+        if not table_name:
+            used_fields = [{'field': d} for d in dimensions]
+            used_fields += [{'field': m.get('field')} for m in measures if m.get('field') != '*']
+            table_name = DataService.find_table_by_filters(dataset_id, filters + used_fields)
+        
+        table = get_schema_catalog(dataset.database_path).get_table(table_name)
+        if not table:
+            raise ValueError(f"Table {table_name} not found")
+        
+        def resolve(field_name: str) -> str:
+            resolved = table.resolve_field(field_name)
+            if not resolved:
+                raise ValueError(f"Field {field_name} not found in table {table.name}")
+            return resolved
+        
+        # 校验度量
+        resolved_measures = []
+        for measure in measures:
+            func = (measure.get('func') or 'sum').lower()
+            field = measure.get('field') or '*'
+            if func not in AGGREGATE_FUNCTIONS:
+                raise ValueError(f"Unsupported aggregate function: {func}")
+            if field == '*':
+                if func != 'count':
+                    raise ValueError(f"Aggregate function {func} requires a field")
+                resolved = '*'
+            else:
+                resolved = resolve(field)
+            alias = measure.get('alias') or (f"{func}_{field}" if field != '*' else func)
+            resolved_measures.append({'func': func, 'field': resolved, 'alias': alias})
+        
+        # 能由汇总表满足时改为查询汇总表
+        rollup = None
+        if use_rollup:
+            rollup = RollupService.match(
+                dataset.database_path, table.name, [resolve(d) for d in dimensions], resolved_measures,
+                [f.get('field') for f in filters if f.get('field') and f.get('value') is not None])
+        
+        # 近似模式：精确的汇总表优先，其次使用样本表
+        sample = None
+        if approximate and not rollup:
+            sample = DataService._match_sample(
+                dataset, table, [resolve(d) for d in dimensions] + [m['field'] for m in resolved_measures] +
+                [f.get('field') for f in filters])
+        
+        # 维度
+        select_items = []
+        group_items = []
+        output_names = {}
+        for dimension in dimensions:
+            column = quote_identifier(resolve(dimension))
+            select_items.append(f"{column} AS {quote_identifier(dimension)}")
+            group_items.append(column)
+            output_names[dimension.lower()] = quote_identifier(dimension)
+        
+        # 度量；样本上的 sum/avg 额外计算平方和与非空计数，用于置信区间
+        helper_items = []
+        for i, measure in enumerate(resolved_measures):
+            if rollup:
+                expression = rollup['measures'][i]
+            else:
+                column = '*' if measure['field'] == '*' else quote_identifier(measure['field'])
+                expression = AGGREGATE_FUNCTIONS[measure['func']].format(field=column)
+                if sample and measure['func'] in ('sum', 'avg'):
+                    helper_items.append(f"SUM(CAST({column} AS REAL) * {column}) AS {quote_identifier(f'__sq_{i}')}")
+                    helper_items.append(f"COUNT({column}) AS {quote_identifier(f'__n_{i}')}")
+            select_items.append(f"{expression} AS {quote_identifier(measure['alias'])}")
+            output_names[measure['alias'].lower()] = quote_identifier(measure['alias'])
+        if sample:
+            helper_items.append(f"COUNT(*) AS {quote_identifier('__sample_rows')}")
+        select_items.extend(helper_items)
+        
+        # 排序：只能引用维度或度量别名，默认按维度排序
+        order_items = []
+        for sort_item in sort:
+            name = sort_item.get('field')
+            if not name or name.lower() not in output_names:
+                raise ValueError(f"Sort field {name} must be a dimension or measure alias")
+            direction = 'DESC' if str(sort_item.get('order', 'asc')).lower() == 'desc' else 'ASC'
+            order_items.append(f"{output_names[name.lower()]} {direction}")
+        if not order_items:
+            order_items = group_items
+        
+        where_sql, params = DataService._build_where(filters)
+        
+        # 样本上的 count/sum 放大的是同一个正数倍，按度量排序和Top-N在样本上直接执行即可
+        source_table = rollup['table_name'] if rollup else (sample['table_name'] if sample else table.name)
+        sql = f"SELECT {', '.join(select_items)} FROM {quote_identifier(source_table)} WHERE {where_sql}"
+        if group_items:
+            sql += f" GROUP BY {', '.join(group_items)}"
+        if order_items:
+            sql += f" ORDER BY {', '.join(order_items)}"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        
+        cache_key = (dataset.database_path, 'aggregate', normalize_sql(sql), make_params_key(params))
+        version = get_data_version(dataset.database_path)
+        if use_cache:
+            cached = query_cache.get(cache_key, version)
+            if cached is not None:
+                return cached
+        
+        if not rollup and not sample:
+            index_advisor.record(dataset.id, dataset.database_path, table.name, filters)
         try:
-            conn = sqlite3.connect(dataset.database_path)
-            cursor = conn.cursor()
+            with read_connection(dataset.database_path) as conn:
+                cursor = conn.cursor()
+                rows = _timed_fetchall(cursor, sql, params, dataset.database_path, dataset.id,
+                                      source_table, 'aggregate')
+                columns = [description[0] for description in cursor.description] if cursor.description else []
+                data = [dict(row) for row in rows]
             
-            # 获取表结构，确定哪些字段需要插入
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            columns_info = cursor.fetchall()
+            result = {
+                'data': data,
+                'columns': columns,
+                'table_name': table.name,
+                'rollup': rollup['rollup'] if rollup else None,
+                'approximate': sample is not None,
+                'sample': None,
+                'estimates': None,
+            }
+            if sample:
+                columns = columns[:len(columns) - len(helper_items)]
+                estimates = DataService._apply_sample_estimates(data, resolved_measures, sample['rate'])
+                result.update({
+                    'columns': columns,
+                    'sample': DataService._sample_info(sample, sum(e['sample_rows'] for e in estimates)),
+                    'estimates': estimates,
+                })
+        except Exception as e:
+            raise ValueError(f"Aggregate error: {str(e)}")
+        
+        if use_cache:
+            query_cache.put(cache_key, version, result)
+        return result
+    
+    @staticmethod
+    def _insert_fields(table, provided_fields) -> List[str]:
+        """根据表结构确定要插入的字段
+
+        自增主键（INTEGER PRIMARY KEY）跳过；未提供的字段有默认值时跳过，
+        不允许为空且没有默认值时报错。
+        """
+        provided = set(provided_fields)
+        fields = []
+        for col_info in table.fields:
+            col_name = col_info['name']
+            has_default = col_info['default'] is not None
             
-            # 构建字段名和值的列表
-            fields = []
-            values = []
-            placeholders = []
+            # 如果是主键且自增，跳过
+            if col_info['pk'] and col_info['type'].upper() == 'INTEGER':
+                continue
             
-            for col_info in columns_info:
-                col_name = col_info[1]
-                col_type = col_info[2]
-                is_pk = bool(col_info[5])
-                has_default = col_info[4] is not None
+            # 如果数据中提供了该字段的值，使用提供的值
+            if col_name in provided:
+                fields.append(col_name)
+            # 如果字段不允许为空且没有默认值，必须提供值
+            elif col_info['notnull'] and not has_default:
+                raise ValueError(f"Field {col_name} is required but not provided")
+        
+        if not fields:
+            raise ValueError("No fields to insert")
+        return fields
+    
+    @staticmethod
+    def _insert_sql(table_name: str, fields: List[str]) -> str:
+        placeholders = ', '.join('?' for _ in fields)
+        return f"INSERT INTO {table_name} ({', '.join(fields)}) VALUES ({placeholders})"
+    
+    @staticmethod
+    def insert_table_data(dataset_id: int, table_name: str, data: Dict[str, Any]) -> Dict:
+        """插入数据到指定表"""
+        dataset = Dataset.get_by_id(dataset_id)
+        if not dataset:
+            raise ValueError(f"Dataset {dataset_id} not found")
+        
+        try:
+            with get_connection(dataset.database_path) as conn:
+                cursor = conn.cursor()
                 
-                # 如果是主键且自增，跳过
-                if is_pk and col_type.upper() == 'INTEGER':
-                    continue
+                # 获取表结构，确定哪些字段需要插入
+                table = get_schema_catalog(dataset.database_path, conn).get_table(table_name)
+                if not table:
+                    raise ValueError(f"Table {table_name} not found")
                 
-                # 如果数据中提供了该字段的值，使用提供的值
-                if col_name in data:
-                    fields.append(col_name)
-                    values.append(data[col_name])
-                    placeholders.append('?')
-                # 如果有默认值，可以跳过
-                elif has_default:
-                    continue
-                # 如果字段不允许为空且没有默认值，必须提供值
-                elif col_info[3] == 1 and not has_default:
-                    raise ValueError(f"Field {col_name} is required but not provided")
-            
-            if not fields:
-                raise ValueError("No fields to insert")
-            
-            # 构建INSERT语句
-            sql = f"INSERT INTO {table_name} ({', '.join(fields)}) VALUES ({', '.join(placeholders)})"
-            
-            cursor.execute(sql, values)
-            conn.commit()
-            
-            # 获取插入的行的ID（如果有主键）
-            inserted_id = cursor.lastrowid
-            
-            conn.close()
+                # 构建字段名和值的列表
+                fields = DataService._insert_fields(table, data.keys())
+                values = [data[name] for name in fields]
+                
+                # 构建INSERT语句
+                sql = DataService._insert_sql(table_name, fields)
+                
+                cursor.execute(sql, values)
+                conn.commit()
+                
+                # 获取插入的行的ID（如果有主键）
+                inserted_id = cursor.lastrowid
             
             return {
                 'success': True,
@@ -264,6 +1091,112 @@ class DataService:
         except Exception as e:
             raise ValueError(f"Insert error: {str(e)}")
     
+    @staticmethod
+    def _bulk_insert_params(fields: List[str], rows: List[Dict[str, Any]] = None,
+                            columns: Dict[str, List[Any]] = None):
+        """把行数组或列数组转换为按 fields 排列的参数元组，返回 (行数, 取批次函数)"""
+        if columns is not None:
+            arrays = [columns.get(name) for name in fields]
+            lengths = {len(values) for values in arrays if values is not None}
+            if len(lengths) > 1:
+                raise ValueError("All columns must have the same number of values")
+            total = lengths.pop() if lengths else 0
+            arrays = [values if values is not None else [None] * total for values in arrays]
+
+            def get_batch(start: int, end: int) -> List[tuple]:
+                return list(zip(*(values[start:end] for values in arrays)))
+        else:
+            total = len(rows)
+
+            def get_batch(start: int, end: int) -> List[tuple]:
+                return [tuple(row.get(name) for name in fields) for row in rows[start:end]]
+        return total, get_batch
+
+    @staticmethod
+    def bulk_insert_table_data(dataset_id: int, table_name: str, rows: List[Dict[str, Any]] = None,
+                               columns: Dict[str, List[Any]] = None, batch_size: int = None,
+                               atomic: bool = False) -> Dict:
+        """批量插入数据
+
+        rows 为字典数组；或使用列式的 columns（{字段名: 值数组}）。表结构只校验一次，
+        所有批次在同一个事务中用 executemany 插入，每批对应一个SAVEPOINT：某批失败时只回滚该批
+        并记录错误，其余批次照常提交；atomic=True 时任一批失败则整体回滚。
+        """
+        dataset = Dataset.get_by_id(dataset_id)
+        if not dataset:
+            raise ValueError(f"Dataset {dataset_id} not found")
+        if (rows is None) == (columns is None):
+            raise ValueError("Exactly one of rows or columns must be provided")
+        if rows is not None and not isinstance(rows, list):
+            raise ValueError("rows must be an array of objects")
+        if columns is not None and not (isinstance(columns, dict)
+                                        and all(isinstance(v, list) for v in columns.values())):
+            raise ValueError("columns must be an object of arrays")
+
+        batch_size = min(max(int(batch_size or Config.BULK_INSERT_BATCH_SIZE), 1),
+                         Config.BULK_INSERT_MAX_BATCH_SIZE)
+
+        if rows is not None:
+            provided = set()
+            for index, row in enumerate(rows):
+                if not isinstance(row, dict):
+                    raise ValueError(f"Row {index} is not an object")
+                provided.update(row)
+        else:
+            provided = set(columns)
+
+        with get_connection(dataset.database_path) as conn:
+            table = get_schema_catalog(dataset.database_path, conn).get_table(table_name)
+            if not table:
+                raise ValueError(f"Table {table_name} not found")
+
+            fields = DataService._insert_fields(table, provided)
+            total, get_batch = DataService._bulk_insert_params(fields, rows, columns)
+            sql = DataService._insert_sql(table.name, fields)
+
+            inserted = 0
+            errors = []
+            batches = 0
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                for batch_index, start in enumerate(range(0, total, batch_size)):
+                    batch = get_batch(start, start + batch_size)
+                    batches = batch_index + 1
+                    conn.execute("SAVEPOINT bulk_batch")
+                    try:
+                        conn.executemany(sql, batch)
+                    except sqlite3.Error as e:
+                        conn.execute("ROLLBACK TO SAVEPOINT bulk_batch")
+                        errors.append({
+                            'batch': batch_index,
+                            'start': start,
+                            'size': len(batch),
+                            'error': str(e),
+                        })
+                        if atomic:
+                            break
+                    else:
+                        inserted += len(batch)
+                    conn.execute("RELEASE SAVEPOINT bulk_batch")
+
+                if atomic and errors:
+                    conn.rollback()
+                    inserted = 0
+                else:
+                    conn.commit()
+            except sqlite3.Error as e:
+                raise ValueError(f"Bulk insert error: {str(e)}")
+
+        return {
+            'success': not errors,
+            'inserted': inserted,
+            'failed': total - inserted,
+            'total': total,
+            'batches': batches,
+            'batch_size': batch_size,
+            'errors': errors,
+        }
+    
     @staticmethod
     def find_tables_by_field(dataset_id: int, field_name: str) -> List[Dict[str, Any]]:
         """根据字段名查找包含该字段的表"""
@@ -272,43 +1205,17 @@ class DataService:
             raise ValueError(f"Dataset {dataset_id} not found")
         
         try:
-            conn = sqlite3.connect(dataset.database_path)
-            cursor = conn.cursor()
-            
-            # 获取所有表名
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
-            tables = cursor.fetchall()
+            catalog = get_schema_catalog(dataset.database_path)
             
             result = []
-            for (table_name,) in tables:
-                # 检查表是否包含该字段
-                cursor.execute(f"PRAGMA table_info({table_name})")
-                columns = cursor.fetchall()
-                
-                for col in columns:
-                    if col[1].lower() == field_name.lower():  # 字段名不区分大小写
-                        # 获取表的完整结构信息
-                        fields = []
-                        for c in columns:
-                            fields.append({
-                                'name': c[1],
-                                'type': c[2],
-                                'notnull': bool(c[3]),
-                                'default': c[4],
-                                'pk': bool(c[5]),
-                            })
-                        
-                        result.append({
-                            'table_name': table_name,
-                            'display_name': table_name,
-                            'schema_info': {
-                                'fields': fields,
-                            },
-                        })
-                        break  # 找到字段后，不需要继续检查该表的其他字段
+            # 字段名不区分大小写
+            for table_name in catalog.tables_with_field(field_name):
+                result.append({
+                    'table_name': table_name,
+                    'display_name': table_name,
+                    'schema_info': catalog.get_table(table_name).to_schema_info(),
+                })
             
-            conn.close()
             return result
         except Exception as e:
             raise ValueError(f"Find tables error: {str(e)}")
-
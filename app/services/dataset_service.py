@@ -1,15 +1,76 @@
 import sqlite3
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from app.models.dataset import Dataset
 from app.models.data_table import DataTable
 from app.config import Config
+from app.db import (
+    get_connection, closing_database, invalidate_schema_catalog, get_data_version,
+    replica_manager, federated_pool, RESERVED_TABLE_PREFIX,
+)
 
 class DatasetService:
     @staticmethod
     def get_datasets() -> List[Dataset]:
         return Dataset.get_all()
     
+    @staticmethod
+    def get_datasets_version() -> str:
+        """数据集列表的版本标识（系统数据库的数据版本）"""
+        return get_data_version(Config.DATABASE_PATH)
+    
+    @staticmethod
+    def get_dataset_version(dataset_id: int) -> Optional[str]:
+        """数据集数据库的版本标识，数据集不存在时返回None"""
+        dataset = Dataset.get_by_id(dataset_id)
+        if not dataset:
+            return None
+        return get_data_version(dataset.database_path)
+    
+    @staticmethod
+    def pin_dataset(dataset_id: int, wait: bool = False) -> Dict:
+        """把数据集固定到内存副本，wait 为真时等待首次复制完成"""
+        dataset = Dataset.get_by_id(dataset_id)
+        if not dataset:
+            raise ValueError(f"Dataset {dataset_id} not found")
+        return replica_manager.pin(dataset.database_path, dataset.id, wait=wait)
+    
+    @staticmethod
+    def unpin_dataset(dataset_id: int) -> bool:
+        """取消固定并释放内存副本，数据集未固定时返回False"""
+        dataset = Dataset.get_by_id(dataset_id)
+        if not dataset:
+            raise ValueError(f"Dataset {dataset_id} not found")
+        return replica_manager.unpin(dataset.database_path)
+    
+    @staticmethod
+    def pin_configured_datasets() -> List[int]:
+        """启动时固定 MEMORY_REPLICA_DATASETS 中的数据集，不存在或超出预算的跳过"""
+        pinned = []
+        for dataset_id in Config.MEMORY_REPLICA_DATASETS:
+            try:
+                DatasetService.pin_dataset(dataset_id)
+                pinned.append(dataset_id)
+            except ValueError:
+                continue
+        return pinned
+    
+    @staticmethod
+    def _remove_database_file(database_path: Path):
+        """关闭数据库文件的连接池、跨数据集连接和内存副本后，删除文件及其WAL/SHM文件
+
+        仍有查询在使用该文件时拒绝删除，否则借出中的连接会继续读写旧文件，
+        残留的WAL也可能被回放到新建的同名数据库中。
+        """
+        with closing_database(database_path):
+            if federated_pool.in_use_count(database_path):
+                raise ValueError(f"Database file {database_path.name} is in use by a running query")
+            federated_pool.detach_path(database_path)
+            replica_manager.unpin(database_path)
+            invalidate_schema_catalog(database_path)
+            for suffix in ('', '-wal', '-shm', '-journal'):
+                Path(str(database_path) + suffix).unlink(missing_ok=True)
+    
     @staticmethod
     def create_dataset(name: str, description: str, database_name: str = None) -> Dataset:
         """创建数据集，自动创建数据库文件"""
@@ -26,9 +87,9 @@ class DatasetService:
         # 构建数据库路径
         database_path = Config.DATASETS_DIR / database_name
         
-        # 如果数据库文件已存在，删除它
+        # 如果数据库文件已存在，删除它（先关闭该文件的全部连接）
         if database_path.exists():
-            database_path.unlink()
+            DatasetService._remove_database_file(database_path)
         
         # 创建数据库文件（SQLite会自动创建）
         conn = sqlite3.connect(str(database_path))
@@ -48,6 +109,8 @@ class DatasetService:
         dataset = Dataset.get_by_id(dataset_id)
         if not dataset:
             raise ValueError(f"Dataset {dataset_id} not found")
+        if table_name.lower().startswith(RESERVED_TABLE_PREFIX):
+            raise ValueError(f"Table names starting with {RESERVED_TABLE_PREFIX} are reserved")
         
         # 构建CREATE TABLE语句
         field_definitions = []
@@ -79,11 +142,11 @@ class DatasetService:
         sql = f"CREATE TABLE {table_name} ({', '.join(field_definitions)})"
         
         try:
-            conn = sqlite3.connect(dataset.database_path)
-            cursor = conn.cursor()
-            cursor.execute(sql)
-            conn.commit()
-            conn.close()
+            with get_connection(dataset.database_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute(sql)
+                conn.commit()
+            invalidate_schema_catalog(dataset.database_path)
             return True
         except Exception as e:
             raise ValueError(f"Failed to create table: {str(e)}")
@@ -111,11 +174,11 @@ class DatasetService:
         sql = f"ALTER TABLE {table_name} ADD COLUMN {column_def}"
         
         try:
-            conn = sqlite3.connect(dataset.database_path)
-            cursor = conn.cursor()
-            cursor.execute(sql)
-            conn.commit()
-            conn.close()
+            with get_connection(dataset.database_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute(sql)
+                conn.commit()
+            invalidate_schema_catalog(dataset.database_path)
             return True
         except Exception as e:
             raise ValueError(f"Failed to add column: {str(e)}")
@@ -0,0 +1,539 @@
+import csv
+import io
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.config import Config
+from app.db import get_connection, get_schema_catalog
+from app.models.dataset import Dataset
+from app.services.dataset_service import DatasetService
+
+IMPORT_FORMATS = ('csv', 'parquet')
+
+# 导入任务在后台线程中执行；任务状态保存在旁路SQLite文件 IMPORT_JOBS_PATH 中（不写系统数据库，
+# 导入期间的进度更新不会改变系统数据库的数据版本），任何工作进程都可以按任务ID查询进度
+_executor = ThreadPoolExecutor(max_workers=Config.IMPORT_WORKERS, thread_name_prefix='dataset-import')
+
+JOB_COLUMNS = ('id', 'dataset_id', 'table_name', 'format', 'file_name', 'status', 'bytes_total', 'bytes_read',
+               'rows_total', 'rows_imported', 'fields', 'indexes', 'error', 'created_at', 'started_at',
+               'finished_at')
+
+
+class ImportJob:
+    """一次文件导入的状态和进度"""
+
+    def __init__(self, dataset_id: int, table_name: str, file_format: str, file_path: Path,
+                 file_name: str = None):
+        self.id = uuid.uuid4().hex
+        self.dataset_id = dataset_id
+        self.table_name = table_name
+        self.format = file_format
+        self.file_path = file_path
+        self.file_name = file_name or file_path.name
+        self.status = 'pending'  # pending / loading / indexing / completed / failed
+        self.bytes_total = file_path.stat().st_size
+        self.bytes_read = 0
+        self.rows_total = None  # Parquet可从元数据读取总行数
+        self.rows_imported = 0
+        self.fields: List[Dict] = []
+        self.indexes: List[str] = []
+        self.error = None
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.saved_at = 0.0
+
+    @classmethod
+    def from_row(cls, row) -> 'ImportJob':
+        """由任务记录还原（只用于查询，不对应本进程中执行的任务）"""
+        job = cls.__new__(cls)
+        for column in JOB_COLUMNS:
+            setattr(job, column, row[column])
+        job.file_path = None
+        job.fields = json.loads(row['fields']) if row['fields'] else []
+        job.indexes = json.loads(row['indexes']) if row['indexes'] else []
+        job.saved_at = 0.0
+        return job
+
+    @property
+    def progress(self) -> float:
+        if self.status == 'completed':
+            return 1.0
+        if self.rows_total:
+            return min(self.rows_imported / self.rows_total, 1.0)
+        if self.bytes_total:
+            return min(self.bytes_read / self.bytes_total, 1.0)
+        return 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'dataset_id': self.dataset_id,
+            'table_name': self.table_name,
+            'format': self.format,
+            'file_name': self.file_name,
+            'status': self.status,
+            'progress': round(self.progress, 4),
+            'bytes_total': self.bytes_total,
+            'bytes_read': self.bytes_read,
+            'rows_total': self.rows_total,
+            'rows_imported': self.rows_imported,
+            'fields': self.fields,
+            'indexes': self.indexes,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+def _clean_column_name(name: str, index: int) -> str:
+    """把文件中的列名转换为可直接用于建表的标识符"""
+    cleaned = re.sub(r'\W+', '_', (name or '').strip()).strip('_')
+    if not cleaned:
+        cleaned = f'column_{index + 1}'
+    if cleaned[0].isdigit():
+        cleaned = f'c_{cleaned}'
+    return cleaned
+
+
+def _unique_names(names: List[str]) -> List[str]:
+    seen = {}
+    result = []
+    for i, name in enumerate(names):
+        cleaned = _clean_column_name(name, i)
+        key = cleaned.lower()
+        if key in seen:
+            seen[key] += 1
+            cleaned = f'{cleaned}_{seen[key]}'
+        else:
+            seen[key] = 1
+        result.append(cleaned)
+    return result
+
+
+def _check_identifier(name: str, kind: str) -> str:
+    if not isinstance(name, str) or not re.fullmatch(r'\w+', name):
+        raise ValueError(f"Invalid {kind} name: {name}")
+    return name
+
+
+def _check_fields(fields) -> Optional[List[Dict]]:
+    """校验请求中的字段定义：每项需要 name 和 type（与 create_table 相同）"""
+    if not fields:
+        return None
+    if not isinstance(fields, list):
+        raise ValueError("fields must be a list")
+    for field in fields:
+        if not isinstance(field, dict):
+            raise ValueError("Each field must be an object with name and type")
+        _check_identifier(field.get('name'), 'field')
+        if not isinstance(field.get('type'), str) or not field['type'].strip():
+            raise ValueError(f"Field {field['name']} requires a type")
+    return fields
+
+
+def _infer_csv_type(values: List[str]) -> str:
+    """根据样本值推断列类型：全部为整数时为INTEGER，全部为数值时为REAL，否则为TEXT"""
+    kind = None
+    for value in values:
+        if value == '':
+            continue
+        try:
+            int(value)
+            kind = kind or 'INTEGER'
+        except ValueError:
+            try:
+                float(value)
+            except ValueError:
+                return 'TEXT'
+            kind = 'REAL'
+    return kind or 'TEXT'
+
+
+class _CsvSource:
+    """按批读取CSV文件，内存占用只与批大小有关"""
+
+    def __init__(self, job: ImportJob, delimiter: str = ',', encoding: str = 'utf-8-sig',
+                 has_header: bool = True):
+        self.job = job
+        self.delimiter = delimiter
+        self.encoding = encoding
+        self.has_header = has_header
+
+    def _open(self):
+        raw = open(self.job.file_path, 'rb')
+        text = io.TextIOWrapper(raw, encoding=self.encoding, newline='')
+        return raw, text, csv.reader(text, delimiter=self.delimiter)
+
+    def columns(self) -> Tuple[List[str], List[str]]:
+        """读取表头和前若干行，返回 (列名, 推断的类型)"""
+        raw, text, reader = self._open()
+        try:
+            first = next(reader, None)
+            if first is None:
+                raise ValueError("The file is empty")
+            if self.has_header:
+                names = first
+                sample = []
+            else:
+                names = [f'column_{i + 1}' for i in range(len(first))]
+                sample = [first]
+            for row in reader:
+                sample.append(row)
+                if len(sample) >= Config.IMPORT_INFER_ROWS:
+                    break
+        finally:
+            text.close()
+        types = [_infer_csv_type([row[i] if i < len(row) else '' for row in sample])
+                 for i in range(len(names))]
+        return names, types
+
+    def batches(self, width: int, batch_size: int) -> Iterator[List[tuple]]:
+        raw, text, reader = self._open()
+        try:
+            if self.has_header:
+                next(reader, None)
+            batch = []
+            for row in reader:
+                if not row:
+                    continue
+                # 列数不足补空，多余的列丢弃；空字符串按NULL写入，由列类型亲和性完成数值转换
+                if len(row) != width:
+                    row = (row + [''] * width)[:width]
+                batch.append(tuple(value if value != '' else None for value in row))
+                if len(batch) >= batch_size:
+                    self.job.bytes_read = raw.tell()
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+            self.job.bytes_read = self.job.bytes_total
+        finally:
+            text.close()
+
+
+def _import_parquet():
+    try:
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError("Parquet import requires the pyarrow package")
+    return pyarrow
+
+
+def _arrow_sqlite_type(pa, arrow_type) -> str:
+    if pa.types.is_integer(arrow_type) or pa.types.is_boolean(arrow_type):
+        return 'INTEGER'
+    if pa.types.is_floating(arrow_type) or pa.types.is_decimal(arrow_type):
+        return 'REAL'
+    if pa.types.is_binary(arrow_type) or pa.types.is_large_binary(arrow_type):
+        return 'BLOB'
+    return 'TEXT'
+
+
+def _sqlite_value(value: Any) -> Any:
+    # 日期、Decimal等SQLite不支持的类型转为字符串（Decimal转为浮点数）
+    if value is None or isinstance(value, (int, float, str, bytes)):
+        return value
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if type(value).__name__ == 'Decimal':
+        return float(value)
+    return str(value)
+
+
+class _ParquetSource:
+    """按记录批读取Parquet文件（需要安装 pyarrow）"""
+
+    def __init__(self, job: ImportJob):
+        self.job = job
+        self.pa = _import_parquet()
+        self.file = self.pa.parquet.ParquetFile(str(job.file_path))
+        job.rows_total = self.file.metadata.num_rows
+
+    def columns(self) -> Tuple[List[str], List[str]]:
+        schema = self.file.schema_arrow
+        return list(schema.names), [_arrow_sqlite_type(self.pa, field.type) for field in schema]
+
+    def batches(self, width: int, batch_size: int) -> Iterator[List[tuple]]:
+        try:
+            for record_batch in self.file.iter_batches(batch_size=batch_size):
+                columns = [[_sqlite_value(v) for v in column.to_pylist()]
+                           for column in record_batch.columns[:width]]
+                yield list(zip(*columns))
+            self.job.bytes_read = self.job.bytes_total
+        finally:
+            self.file.close()
+
+
+class ImportJobStore:
+    """导入任务记录，保存在旁路SQLite文件中，多个工作进程共用"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # 只在持有 _lock 的线程中访问
+        if self._conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=Config.SQLITE_BUSY_TIMEOUT / 1000,
+                                   check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS import_jobs (
+                    id TEXT PRIMARY KEY,
+                    dataset_id INTEGER NOT NULL,
+                    table_name TEXT NOT NULL,
+                    format TEXT NOT NULL,
+                    file_name TEXT,
+                    status TEXT NOT NULL,
+                    bytes_total INTEGER,
+                    bytes_read INTEGER,
+                    rows_total INTEGER,
+                    rows_imported INTEGER,
+                    fields TEXT,
+                    indexes TEXT,
+                    error TEXT,
+                    created_at TEXT,
+                    started_at TEXT,
+                    finished_at TEXT
+                )
+            ''')
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def save(self, job: 'ImportJob'):
+        values = [getattr(job, column) for column in JOB_COLUMNS]
+        values[JOB_COLUMNS.index('fields')] = json.dumps(job.fields, ensure_ascii=False)
+        values[JOB_COLUMNS.index('indexes')] = json.dumps(job.indexes, ensure_ascii=False)
+        updates = ', '.join(f"{column} = excluded.{column}" for column in JOB_COLUMNS[1:])
+        with self._lock:
+            conn = self._connect()
+            conn.execute(f'''
+                INSERT INTO import_jobs ({', '.join(JOB_COLUMNS)}) VALUES ({', '.join('?' for _ in JOB_COLUMNS)})
+                ON CONFLICT(id) DO UPDATE SET {updates}
+            ''', values)
+            conn.commit()
+
+    def prune(self, keep: int):
+        """只保留最近的 keep 条已结束的任务记录"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute('''
+                DELETE FROM import_jobs
+                WHERE status IN ('completed', 'failed')
+                  AND rowid <= (SELECT rowid FROM import_jobs ORDER BY rowid DESC LIMIT 1 OFFSET ?)
+            ''', (keep,))
+            conn.commit()
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._connect().execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM import_jobs WHERE id = ?",
+                                           (job_id,)).fetchone()
+
+    def list(self, dataset_id: int = None) -> list:
+        sql = f"SELECT {', '.join(JOB_COLUMNS)} FROM import_jobs"
+        params = []
+        if dataset_id is not None:
+            sql += " WHERE dataset_id = ?"
+            params.append(dataset_id)
+        with self._lock:
+            return self._connect().execute(sql + " ORDER BY rowid DESC", params).fetchall()
+
+
+job_store = ImportJobStore(Config.IMPORT_JOBS_PATH)
+
+
+class ImportService:
+
+    @staticmethod
+    def _save(job: ImportJob, progress_only: bool = False):
+        """把任务状态写入任务记录文件
+
+        progress_only 为真时（导入过程中的进度更新）距上次写入不足 IMPORT_PROGRESS_INTERVAL 秒则跳过。
+        """
+        now = time.monotonic()
+        if progress_only and now - job.saved_at < Config.IMPORT_PROGRESS_INTERVAL:
+            return
+        job.saved_at = now
+        job_store.save(job)
+
+    @staticmethod
+    def _register(job: ImportJob):
+        ImportService._save(job)
+        job_store.prune(Config.IMPORT_JOB_HISTORY)
+
+    @staticmethod
+    def get_job(job_id: str) -> Optional[Dict]:
+        row = job_store.get(job_id)
+        return ImportJob.from_row(row).to_dict() if row else None
+
+    @staticmethod
+    def list_jobs(dataset_id: int = None) -> List[Dict]:
+        return [ImportJob.from_row(row).to_dict() for row in job_store.list(dataset_id)]
+
+    @staticmethod
+    def detect_format(file_name: str, file_format: str = None) -> str:
+        if not file_format:
+            suffix = Path(file_name or '').suffix.lower().lstrip('.')
+            file_format = 'parquet' if suffix in ('parquet', 'pq') else 'csv'
+        file_format = file_format.lower()
+        if file_format not in IMPORT_FORMATS:
+            raise ValueError(f"Unsupported import format: {file_format}")
+        if file_format == 'parquet':
+            _import_parquet()
+        return file_format
+
+    @staticmethod
+    def save_upload(file_storage) -> Path:
+        """把上传文件写入导入目录（Werkzeug按块写盘，不会整体读入内存）"""
+        path = Config.IMPORT_DIR / f'{uuid.uuid4().hex}.upload'
+        file_storage.save(str(path))
+        return path
+
+    @staticmethod
+    def start_import(dataset_id: int, table_name: str, file_path: Path, file_name: str = None,
+                     file_format: str = None, fields: List[Dict] = None, indexes: List[str] = None,
+                     if_exists: str = 'fail', delimiter: str = ',', encoding: str = 'utf-8-sig',
+                     has_header: bool = True, delete_file: bool = True) -> Dict:
+        """创建导入任务并在后台执行，返回任务信息
+
+        fields 可指定字段定义（与 create_table 相同的格式），未指定时根据文件推断；
+        if_exists 为 'fail' 或 'append'，表已存在且为 'append' 时追加到已有表。
+        """
+        try:
+            dataset = Dataset.get_by_id(dataset_id)
+            if not dataset:
+                raise ValueError(f"Dataset {dataset_id} not found")
+            _check_identifier(table_name, 'table')
+            fields = _check_fields(fields)
+            if if_exists not in ('fail', 'append'):
+                raise ValueError(f"Unsupported if_exists: {if_exists}")
+            file_format = ImportService.detect_format(file_name or str(file_path), file_format)
+
+            job = ImportJob(dataset_id, table_name, file_format, Path(file_path), file_name)
+            job.indexes = [_check_identifier(field, 'index field') for field in indexes or []]
+            options = {
+                'fields': fields,
+                'if_exists': if_exists,
+                'delimiter': delimiter,
+                'encoding': encoding,
+                'has_header': has_header,
+            }
+        except Exception:
+            if delete_file:
+                Path(file_path).unlink(missing_ok=True)
+            raise
+
+        ImportService._register(job)
+        _executor.submit(ImportService._run, job, dataset, options, delete_file)
+        return job.to_dict()
+
+    @staticmethod
+    def _resolve_fields(job: ImportJob, database_path: str, source, options: Dict) -> List[Dict]:
+        """确定导入的字段，表不存在时按字段定义建表"""
+        names, types = source.columns()
+        table = get_schema_catalog(database_path).get_table(job.table_name)
+
+        if table:
+            if options['if_exists'] != 'append':
+                raise ValueError(f"Table {job.table_name} already exists")
+            # 追加时按列名（不区分大小写）匹配已有字段
+            columns = _unique_names(names)
+            missing = [name for name in columns if not table.has_field(name)]
+            if missing:
+                raise ValueError(f"Fields not in table {table.name}: {', '.join(missing)}")
+            job.table_name = table.name
+            return [{'name': table.resolve_field(name)} for name in columns]
+
+        if options['fields']:
+            fields = options['fields']
+            if len(fields) != len(names):
+                raise ValueError(f"Expected {len(names)} fields, got {len(fields)}")
+            for field in fields:
+                _check_identifier(field.get('name'), 'field')
+        else:
+            fields = [{'name': name, 'type': type_}
+                      for name, type_ in zip(_unique_names(names), types)]
+        DatasetService.create_table(job.dataset_id, job.table_name, fields)
+        return fields
+
+    @staticmethod
+    def _load(job: ImportJob, database_path: str, source, field_names: List[str]):
+        """分批写入，每 IMPORT_COMMIT_ROWS 行提交一次"""
+        sql = (f"INSERT INTO {job.table_name} ({', '.join(field_names)}) "
+               f"VALUES ({', '.join('?' for _ in field_names)})")
+        with get_connection(database_path) as conn:
+            # 导入期间放宽同步级别（WAL下 OFF 只在掉电时可能丢失最近的事务，不会损坏数据库）
+            conn.execute("PRAGMA synchronous = OFF")
+            try:
+                pending = 0
+                conn.execute("BEGIN IMMEDIATE")
+                for batch in source.batches(len(field_names), Config.BULK_INSERT_BATCH_SIZE):
+                    conn.executemany(sql, batch)
+                    pending += len(batch)
+                    job.rows_imported += len(batch)
+                    ImportService._save(job, progress_only=True)
+                    if pending >= Config.IMPORT_COMMIT_ROWS:
+                        conn.commit()
+                        pending = 0
+                        conn.execute("BEGIN IMMEDIATE")
+                conn.commit()
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                conn.execute("PRAGMA synchronous = NORMAL")
+
+    @staticmethod
+    def _finish(job: ImportJob, database_path: str):
+        """导入完成后建索引并更新统计信息"""
+        job.status = 'indexing'
+        ImportService._save(job)
+        table = get_schema_catalog(database_path).get_table(job.table_name)
+        with get_connection(database_path) as conn:
+            for field in job.indexes:
+                field_name = table.resolve_field(field)
+                if not field_name:
+                    raise ValueError(f"Index field {field} not found in table {job.table_name}")
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{job.table_name}_{field_name} "
+                             f"ON {job.table_name} ({field_name})")
+            conn.execute(f"ANALYZE {job.table_name}")
+            conn.commit()
+
+    @staticmethod
+    def _run(job: ImportJob, dataset: Dataset, options: Dict, delete_file: bool):
+        job.status = 'loading'
+        job.started_at = datetime.now().isoformat()
+        ImportService._save(job)
+        try:
+            if job.format == 'parquet':
+                source = _ParquetSource(job)
+            else:
+                source = _CsvSource(job, options['delimiter'], options['encoding'], options['has_header'])
+            fields = ImportService._resolve_fields(job, dataset.database_path, source, options)
+            job.fields = fields
+            ImportService._load(job, dataset.database_path, source, [f['name'] for f in fields])
+            ImportService._finish(job, dataset.database_path)
+            job.status = 'completed'
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.now().isoformat()
+            ImportService._save(job)
+            if delete_file:
+                try:
+                    os.remove(job.file_path)
+                except OSError:
+                    pass
@@ -0,0 +1,241 @@
+import re
+import sqlite3
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from app.config import Config
+from app.db import get_connection, get_schema_catalog, quote_identifier
+
+# 范围运算符：索引中等值列在前，范围列最多一个放在等值列之后
+RANGE_OPERATORS = ('>', '<', '>=', '<=')
+
+# EXPLAIN QUERY PLAN 中按索引顺序扫描的步骤，如 "SCAN t USING COVERING INDEX idx_t_a"
+_SCAN_INDEX = re.compile(r'^SCAN .+? USING (?:COVERING )?INDEX (.+)$')
+
+
+class IndexAdvisor:
+    """根据实际查询负载推荐（或自动创建）过滤字段上的索引
+
+    get_table_data / aggregate 每次实际查询数据库时记录一次查询模式：
+    等值过滤字段、范围过滤字段和排序字段。生成建议时对每种模式执行
+    EXPLAIN QUERY PLAN，只对仍然全表扫描（或需要临时排序）的模式给出索引建议。
+    """
+
+    def __init__(self, max_patterns: int):
+        self.max_patterns = max_patterns
+        # (数据库路径, 小写表名) -> {查询模式: 次数}
+        self._patterns: Dict[Tuple[str, str], Counter] = {}
+        self._datasets: Dict[str, int] = {}
+        self._pattern_count = 0
+        self._dropped = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='index-advisor')
+
+    @staticmethod
+    def _pattern(filters: List[Dict], order_by: str = None) -> Optional[Tuple]:
+        """把过滤条件转换为查询模式 (等值字段, 范围字段, 排序字段)，字段名小写"""
+        equality = set()
+        ranges = set()
+        for filter_item in filters or []:
+            field = filter_item.get('field')
+            # 与 _build_where 一致：值为None的条件不参与查询
+            if not field or filter_item.get('value') is None:
+                continue
+            operator = filter_item.get('operator', '=')
+            if operator in RANGE_OPERATORS:
+                ranges.add(field.lower())
+            elif operator != 'LIKE':
+                # LIKE '%x%' 无法使用普通索引，不参与推荐
+                equality.add(field.lower())
+        ranges -= equality
+        order_field = order_by.lower() if order_by else None
+        if not equality and not ranges and not order_field:
+            return None
+        return tuple(sorted(equality)), tuple(sorted(ranges)), order_field
+
+    def record(self, dataset_id: int, database_path: str, table_name: str,
+               filters: List[Dict], order_by: str = None):
+        """记录一次查询的过滤模式（热路径上只做一次计数）"""
+        pattern = self._pattern(filters, order_by)
+        if pattern is None or not table_name:
+            return
+        key = (database_path, table_name.lower())
+        with self._lock:
+            counter = self._patterns.get(key)
+            if counter is None:
+                counter = self._patterns[key] = Counter()
+                self._datasets[database_path] = dataset_id
+            if pattern not in counter:
+                if self._pattern_count >= self.max_patterns:
+                    self._dropped += 1
+                    return
+                self._pattern_count += 1
+            counter[pattern] += 1
+            count = counter[pattern]
+
+        if Config.INDEX_ADVISOR_AUTO_CREATE and count == Config.INDEX_ADVISOR_MIN_QUERIES:
+            # 达到阈值时在后台检查并创建索引，不阻塞当前请求
+            self._executor.submit(self.apply, dataset_id)
+
+    @staticmethod
+    def _index_columns(pattern: Tuple, field_counts: Counter) -> List[str]:
+        """等值字段按出现频率排在前面，之后接一个范围字段；没有范围字段时接排序字段"""
+        equality, ranges, order_field = pattern
+        columns = sorted(equality, key=lambda name: (-field_counts[name], name))
+        if ranges:
+            columns.append(min(ranges, key=lambda name: (-field_counts[name], name)))
+        elif order_field and order_field not in columns:
+            columns.append(order_field)
+        return columns[:Config.INDEX_ADVISOR_MAX_COLUMNS]
+
+    @staticmethod
+    def _explain(conn, table, pattern: Tuple) -> List[str]:
+        """对查询模式的代表性SQL执行 EXPLAIN QUERY PLAN，返回计划明细"""
+        equality, ranges, order_field = pattern
+        clauses = [f"{quote_identifier(table.resolve_field(name))} = ?" for name in equality]
+        clauses += [f"{quote_identifier(table.resolve_field(name))} > ?" for name in ranges]
+        sql = f"SELECT * FROM {quote_identifier(table.name)}"
+        if clauses:
+            sql += " WHERE " + ' AND '.join(clauses)
+        if order_field:
+            sql += f" ORDER BY {quote_identifier(table.resolve_field(order_field))}"
+        rows = conn.execute("EXPLAIN QUERY PLAN " + sql, [None] * len(clauses)).fetchall()
+        return [row[3] for row in rows]
+
+    @staticmethod
+    def _index_columns_of(conn, index_name: str) -> List[str]:
+        rows = conn.execute(f"PRAGMA index_info({quote_identifier(index_name)})").fetchall()
+        return [row[2].lower() for row in sorted(rows) if row[2] is not None]
+
+    @staticmethod
+    def _needs_index(conn, plan: List[str], columns: List[str], check_sort: bool) -> bool:
+        """计划中存在全表扫描或全索引扫描，或（索引可以覆盖排序时）需要临时B树排序
+
+        SCAN ... USING [COVERING] INDEX 同样要读完整个索引，只有所用索引以建议的列开头时
+        （例如只有排序字段、按索引顺序扫描）才视为已被索引满足。
+        """
+        for detail in plan:
+            if detail.startswith('SCAN'):
+                match = _SCAN_INDEX.match(detail)
+                if not match:
+                    return True
+                if IndexAdvisor._index_columns_of(conn, match.group(1))[:len(columns)] != columns:
+                    return True
+            if check_sort and 'TEMP B-TREE' in detail:
+                return True
+        return False
+
+    def _table_recommendations(self, database_path: str, table_key: str, counter: Counter,
+                               min_count: int) -> List[Dict]:
+        catalog = get_schema_catalog(database_path)
+        table = catalog.get_table(table_key)
+        if not table:
+            return []
+
+        field_counts = Counter()
+        for (equality, ranges, order_field), count in counter.items():
+            for name in equality + ranges:
+                field_counts[name] += count
+
+        candidates: Dict[Tuple[str, ...], Dict] = {}
+        # EXPLAIN QUERY PLAN 不会开启读事务检查schema，池化连接的语句缓存可能返回
+        # 建索引之前的计划，因此使用单独的只读连接
+        conn = sqlite3.connect('file:' + database_path.replace('\\', '/') + '?mode=ro', uri=True)
+        try:
+            for pattern, count in counter.items():
+                if count < min_count:
+                    continue
+                # 忽略表中不存在的字段
+                equality, ranges, order_field = pattern
+                pattern = (
+                    tuple(name for name in equality if table.has_field(name)),
+                    tuple(name for name in ranges if table.has_field(name)),
+                    order_field if order_field and table.has_field(order_field) else None,
+                )
+                columns = self._index_columns(pattern, field_counts)
+                if not columns:
+                    continue
+                plan = self._explain(conn, table, pattern)
+                # 有范围条件时排序字段不进入索引，临时排序无法通过索引消除
+                if not self._needs_index(conn, plan, columns, check_sort=not pattern[1]):
+                    continue
+                candidate = candidates.setdefault(tuple(columns), {'queries': 0, 'plans': []})
+                candidate['queries'] += count
+                if plan not in candidate['plans']:
+                    candidate['plans'].append(plan)
+        finally:
+            conn.close()
+
+        # 前缀被其他建议覆盖的索引不再单独建议（复合索引可服务其前缀列上的查询）
+        for columns in sorted(candidates, key=len):
+            for other in candidates:
+                if len(other) > len(columns) and other[:len(columns)] == columns:
+                    candidates[other]['queries'] += candidates[columns]['queries']
+                    candidates[columns] = None
+                    break
+
+        recommendations = []
+        for columns, candidate in candidates.items():
+            if candidate is None:
+                continue
+            names = [table.resolve_field(name) for name in columns]
+            index_name = f"idx_auto_{table.name}_{'_'.join(names)}"
+            recommendations.append({
+                'dataset_id': self._datasets.get(database_path),
+                'database_path': database_path,
+                'table_name': table.name,
+                'columns': names,
+                'index_name': index_name,
+                'sql': (f"CREATE INDEX IF NOT EXISTS {quote_identifier(index_name)} "
+                        f"ON {quote_identifier(table.name)} ({', '.join(quote_identifier(n) for n in names)})"),
+                'queries': candidate['queries'],
+                'plans': candidate['plans'],
+            })
+        return recommendations
+
+    def recommendations(self, dataset_id: int = None, min_count: int = None) -> List[Dict]:
+        """按受益查询次数从高到低返回索引建议"""
+        if min_count is None:
+            min_count = Config.INDEX_ADVISOR_MIN_QUERIES
+        with self._lock:
+            tables = [(key, Counter(counter)) for key, counter in self._patterns.items()
+                      if dataset_id is None or self._datasets.get(key[0]) == dataset_id]
+
+        result = []
+        for (database_path, table_key), counter in tables:
+            result.extend(self._table_recommendations(database_path, table_key, counter, min_count))
+        result.sort(key=lambda item: -item['queries'])
+        return result
+
+    def apply(self, dataset_id: int = None, min_count: int = None) -> List[Dict]:
+        """创建当前建议的索引并更新统计信息，返回已创建的索引"""
+        created = []
+        for recommendation in self.recommendations(dataset_id, min_count):
+            with get_connection(recommendation['database_path']) as conn:
+                conn.execute(recommendation['sql'])
+                conn.execute(f"ANALYZE {quote_identifier(recommendation['index_name'])}")
+                conn.commit()
+            created.append(recommendation)
+        return created
+
+    def clear(self):
+        with self._lock:
+            self._patterns.clear()
+            self._datasets.clear()
+            self._pattern_count = 0
+            self._dropped = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'tables': len(self._patterns),
+                'patterns': self._pattern_count,
+                'max_patterns': self.max_patterns,
+                'dropped': self._dropped,
+                'queries': sum(sum(counter.values()) for counter in self._patterns.values()),
+                'auto_create': Config.INDEX_ADVISOR_AUTO_CREATE,
+            }
+
+
+index_advisor = IndexAdvisor(Config.INDEX_ADVISOR_MAX_PATTERNS)
@@ -0,0 +1,405 @@
+import bisect
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+from app.config import Config
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROWS_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """带标签的直方图，导出为Prometheus histogram，并可按桶插值估算分位数
+
+    observe 只做一次二分查找和几次加法，每个直方图一把锁。
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # 标签值 -> [各桶计数（不累计，最后一个为+Inf）, 总和, 次数]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        labels = tuple('' if label is None else str(label) for label in labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def _snapshot(self) -> List[Tuple[Tuple[str, ...], List[int], float, int]]:
+        with self._lock:
+            return [(labels, list(s[0]), s[1], s[2]) for labels, s in sorted(self._series.items())]
+
+    def export(self) -> list:
+        """可JSON序列化的快照，用于合并多个工作进程的统计"""
+        return [[list(labels), counts, total_sum, count] for labels, counts, total_sum, count in self._snapshot()]
+
+    def quantile(self, counts: List[int], total: int, q: float) -> float:
+        """按桶线性插值估算分位数（与Prometheus histogram_quantile相同的方法）"""
+        if not total:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if count and cumulative + count >= rank:
+                if i >= len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else min(0.0, self.buckets[0])
+                upper = self.buckets[i]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def render(self, series: list = None) -> List[str]:
+        """series 为合并后的快照（见 merge_series），缺省时导出当前进程的统计"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, counts, total_sum, count in (self._snapshot() if series is None else series):
+            label_text = ','.join(f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, labels))
+            prefix = label_text + ',' if label_text else ''
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{_format_value(bound)}"}} {cumulative}')
+            suffix = f'{{{label_text}}}' if label_text else ''
+            lines.append(f"{self.name}_sum{suffix} {_format_value(total_sum)}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+    def summary(self, series: list = None) -> List[Dict]:
+        result = []
+        for labels, counts, total_sum, count in (self._snapshot() if series is None else series):
+            result.append({
+                'labels': dict(zip(self.labelnames, labels)),
+                'count': count,
+                'sum': round(total_sum, 6),
+                'p50': round(self.quantile(counts, count, 0.50), 6),
+                'p95': round(self.quantile(counts, count, 0.95), 6),
+                'p99': round(self.quantile(counts, count, 0.99), 6),
+            })
+        return result
+
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds',
+    'HTTP request latency in seconds (streamed responses are measured until the headers are sent)',
+    ('method', 'blueprint', 'route', 'status'), LATENCY_BUCKETS)
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes', 'HTTP response body size in bytes (responses with a known length)',
+    ('method', 'blueprint', 'route'), BYTES_BUCKETS)
+SERIALIZATION_DURATION = Histogram(
+    'http_response_serialization_seconds', 'Time spent encoding JSON response bodies',
+    ('route',), LATENCY_BUCKETS)
+QUERY_DURATION = Histogram(
+    'sql_query_duration_seconds', 'SQLite execute and fetch time per query',
+    ('source', 'dataset_id'), LATENCY_BUCKETS)
+QUERY_ROWS = Histogram(
+    'sql_query_rows', 'Rows returned per query', ('source', 'dataset_id'), ROWS_BUCKETS)
+
+HISTOGRAMS = (REQUEST_DURATION, RESPONSE_SIZE, SERIALIZATION_DURATION, QUERY_DURATION, QUERY_ROWS)
+
+
+def merge_series(snapshots: List[list]) -> List[Tuple[Tuple[str, ...], List[int], float, int]]:
+    """把多个进程导出的同一直方图快照按标签累加"""
+    merged: Dict[Tuple[str, ...], list] = {}
+    for snapshot in snapshots:
+        for labels, counts, total_sum, count in snapshot:
+            labels = tuple(labels)
+            current = merged.get(labels)
+            if current is None:
+                merged[labels] = [list(counts), total_sum, count]
+            else:
+                current[0] = [a + b for a, b in zip(current[0], counts)]
+                current[1] += total_sum
+                current[2] += count
+    return [(labels, s[0], s[1], s[2]) for labels, s in sorted(merged.items())]
+
+
+def _local_snapshot() -> Dict:
+    """当前进程的直方图以及连接池、查询缓存统计"""
+    from app.db import pool_stats
+    from app.services.query_cache import query_cache
+
+    cache = query_cache.stats()
+    return {
+        'histograms': {histogram.name: histogram.export() for histogram in HISTOGRAMS},
+        'pools': [{
+            'database': os.path.basename(str(s['database_path'])),
+            'mode': 'ro' if s['readonly'] else 'rw',
+            'in_use': s['in_use'],
+            'idle': s['idle'],
+            'checkouts': s['checkouts'],
+            'waits': s['waits'],
+            'wait_time_ms': s['wait_time_ms'],
+        } for s in pool_stats()],
+        'cache': {'hits': cache['hits'], 'misses': cache['misses'], 'bytes': cache['bytes']},
+    }
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsStore:
+    """各工作进程的指标快照
+
+    每个工作进程只统计自己处理的请求，而一次抓取只落到其中一个进程。各进程每隔 flush_interval 秒
+    （以及被抓取时）把自己的快照写入旁路SQLite文件（不写系统数据库），导出时合并同一次服务启动的
+    所有进程：直方图累加，已退出进程的计数并入 retired 行，重启工作进程后计数器仍然单调递增；
+    连接池和查询缓存统计属于各个进程，只导出存活进程的值并带 pid 标签。
+    旁路文件不可用时只导出当前进程的统计。
+    """
+
+    RETIRED = 'retired'
+
+    def __init__(self, path: str, flush_interval: float, instance_id: str):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.instance_id = instance_id
+        self.token = uuid.uuid4().hex
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='metrics')
+        self._flushing = False
+        self._last_flush = time.monotonic()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # 只在持有 _lock 的线程中访问
+        if self._conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=Config.SQLITE_BUSY_TIMEOUT / 1000,
+                                   check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS worker_metrics (
+                    token TEXT PRIMARY KEY,
+                    instance TEXT NOT NULL,
+                    pid INTEGER NOT NULL,
+                    started_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    data TEXT NOT NULL
+                )
+            ''')
+            self._conn = conn
+        return self._conn
+
+    def maybe_flush(self):
+        """距上次写入超过 flush_interval 秒时在后台写入快照（由请求结束时调用）"""
+        if self._flushing or time.monotonic() - self._last_flush < self.flush_interval:
+            return
+        self._flushing = True
+        self._executor.submit(self._flush_in_background)
+
+    def _flush_in_background(self):
+        try:
+            self.publish()
+        except sqlite3.Error:
+            pass
+        finally:
+            self._flushing = False
+
+    def publish(self, snapshot: Dict = None):
+        """写入当前进程的快照"""
+        data = json.dumps(snapshot or _local_snapshot())
+        self._last_flush = time.monotonic()
+        with self._lock:
+            self._connect().execute('''
+                INSERT INTO worker_metrics (token, instance, pid, started_at, updated_at, data)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(token) DO UPDATE SET updated_at = excluded.updated_at, data = excluded.data
+            ''', (self.token, self.instance_id, os.getpid(), self.started_at, time.time(), data))
+
+    def _retire(self, conn: sqlite3.Connection, rows: list) -> list:
+        """把已退出进程的直方图并入 retired 行并删除其快照，返回存活进程的 (pid, 快照)"""
+        latest_by_pid: Dict[int, float] = {}
+        for token, pid, started_at, data in rows:
+            if token != self.RETIRED:
+                latest_by_pid[pid] = max(latest_by_pid.get(pid, 0), started_at)
+        retired = None
+        dead = []
+        live = []
+        for token, pid, started_at, data in rows:
+            if token == self.RETIRED:
+                retired = json.loads(data)
+            elif (token != self.token and pid == os.getpid()) or not _pid_alive(pid) \
+                    or started_at < latest_by_pid[pid]:
+                # 进程已退出，或PID已被新的工作进程复用
+                dead.append((token, json.loads(data)))
+            else:
+                live.append((pid, json.loads(data)))
+        if dead:
+            retired = retired or {'histograms': {}}
+            for _, data in dead:
+                for name, series in data['histograms'].items():
+                    retired['histograms'][name] = [list(s) for s in merge_series(
+                        [retired['histograms'].get(name, []), series])]
+            conn.execute('''
+                INSERT OR REPLACE INTO worker_metrics (token, instance, pid, started_at, updated_at, data)
+                VALUES (?, ?, 0, 0, ?, ?)
+            ''', (self.RETIRED, self.instance_id, time.time(), json.dumps(retired)))
+            conn.executemany("DELETE FROM worker_metrics WHERE token = ?", [(token,) for token, _ in dead])
+        if retired:
+            live.append((None, retired))
+        return live
+
+    def collect(self) -> List[Tuple[Optional[int], Dict]]:
+        """同一次服务启动的所有进程的 (pid, 快照)，已退出进程合并为 pid 为None的一项"""
+        local = _local_snapshot()
+        try:
+            self.publish(local)
+            with self._lock:
+                conn = self._connect()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.execute("DELETE FROM worker_metrics WHERE instance != ?", (self.instance_id,))
+                    rows = conn.execute("SELECT token, pid, started_at, data FROM worker_metrics "
+                                        "ORDER BY pid").fetchall()
+                    snapshots = self._retire(conn, rows)
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+            return snapshots
+        except sqlite3.Error:
+            return [(os.getpid(), local)]
+
+
+metrics_store = MetricsStore(Config.METRICS_PATH, Config.METRICS_FLUSH_INTERVAL, Config.SERVER_INSTANCE_ID)
+
+
+# 跨数据集查询的 dataset_id 标签：数据集组合的数量不受限，不能作为标签值
+FEDERATED_DATASET_LABEL = 'federated'
+
+
+def observe_query(source: str, dataset_id, duration: float, rows: int):
+    """记录一次SQL执行（由数据服务的查询计时点调用）"""
+    if not Config.METRICS_ENABLED:
+        return
+    QUERY_DURATION.observe(duration, source, dataset_id)
+    QUERY_ROWS.observe(rows, source, dataset_id)
+
+
+def init_app(app):
+    """注册请求计时中间件和带计时的JSON序列化"""
+    if not Config.METRICS_ENABLED:
+        return
+    from flask import g, request
+    from flask.json.provider import DefaultJSONProvider
+
+    class TimedJSONProvider(DefaultJSONProvider):
+        def response(self, *args, **kwargs):
+            started = time.perf_counter()
+            response = super().response(*args, **kwargs)
+            rule = request.url_rule.rule if request and request.url_rule else ''
+            SERIALIZATION_DURATION.observe(time.perf_counter() - started, rule)
+            return response
+
+    # 保留应用已有的JSON配置（如 ensure_ascii、sort_keys）
+    provider = TimedJSONProvider(app)
+    provider.ensure_ascii = app.json.ensure_ascii
+    provider.sort_keys = app.json.sort_keys
+    app.json = provider
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        rule = request.url_rule.rule if request.url_rule else 'unmatched'
+        blueprint = request.blueprint or ''
+        REQUEST_DURATION.observe(time.perf_counter() - started, request.method, blueprint, rule,
+                                 response.status_code)
+        if not response.is_streamed:
+            RESPONSE_SIZE.observe(response.calculate_content_length() or 0, request.method, blueprint, rule)
+        metrics_store.maybe_flush()
+        return response
+
+
+def _gauge(lines: List[str], name: str, documentation: str, kind: str, samples: List[Tuple[Dict, float]]):
+    lines.append(f"# HELP {name} {documentation}")
+    lines.append(f"# TYPE {name} {kind}")
+    for labels, value in samples:
+        label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+        lines.append(f"{name}{{{label_text}}} {_format_value(value)}" if label_text
+                     else f"{name} {_format_value(value)}")
+
+
+def _merged_histograms(snapshots: List[Tuple[Optional[int], Dict]]) -> Dict[str, list]:
+    return {histogram.name: merge_series([data['histograms'].get(histogram.name, []) for _, data in snapshots])
+            for histogram in HISTOGRAMS}
+
+
+def render_prometheus() -> str:
+    """以Prometheus文本格式导出全部工作进程的指标"""
+    snapshots = metrics_store.collect()
+    merged = _merged_histograms(snapshots)
+
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render(merged[histogram.name]))
+
+    # 连接池和缓存统计属于各个工作进程，按 pid 区分，可用 sum without (pid) 汇总
+    workers = [(str(pid), data) for pid, data in snapshots if pid is not None]
+    pools = [({'database': s['database'], 'mode': s['mode'], 'pid': pid}, s)
+             for pid, data in workers for s in data['pools']]
+    _gauge(lines, 'sqlite_pool_connections_in_use', 'Connections checked out', 'gauge',
+           [(labels, s['in_use']) for labels, s in pools])
+    _gauge(lines, 'sqlite_pool_connections_idle', 'Idle pooled connections', 'gauge',
+           [(labels, s['idle']) for labels, s in pools])
+    _gauge(lines, 'sqlite_pool_checkouts_total', 'Connection checkouts', 'counter',
+           [(labels, s['checkouts']) for labels, s in pools])
+    _gauge(lines, 'sqlite_pool_waits_total', 'Checkouts that had to wait for a connection', 'counter',
+           [(labels, s['waits']) for labels, s in pools])
+    _gauge(lines, 'sqlite_pool_wait_seconds_total', 'Total time spent waiting for a connection', 'counter',
+           [(labels, s['wait_time_ms'] / 1000.0) for labels, s in pools])
+
+    caches = [({'pid': pid}, data['cache']) for pid, data in workers]
+    _gauge(lines, 'query_cache_hits_total', 'Query result cache hits', 'counter',
+           [(labels, c['hits']) for labels, c in caches])
+    _gauge(lines, 'query_cache_misses_total', 'Query result cache misses', 'counter',
+           [(labels, c['misses']) for labels, c in caches])
+    _gauge(lines, 'query_cache_bytes', 'Estimated size of cached results', 'gauge',
+           [(labels, c['bytes']) for labels, c in caches])
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_summary() -> Dict:
+    """全部工作进程合并后，各直方图按标签的次数、总和及 p50/p95/p99"""
+    merged = _merged_histograms(metrics_store.collect())
+    return {histogram.name: histogram.summary(merged[histogram.name]) for histogram in HISTOGRAMS}
@@ -0,0 +1,123 @@
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+from app.config import Config
+
+
+def normalize_sql(sql: str) -> str:
+    """规范化SQL用作缓存键：合并空白、去掉末尾分号"""
+    return re.sub(r'\s+', ' ', sql.strip()).rstrip(';').strip()
+
+
+def make_params_key(params: Any) -> str:
+    return json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class _Entry:
+    __slots__ = ('version', 'value', 'size', 'expires_at')
+
+    def __init__(self, version: Hashable, value: Any, size: int, expires_at: float):
+        self.version = version
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+
+
+class QueryCache:
+    """查询结果缓存
+
+    同时按条目数和估算字节数限制容量，LRU淘汰，并带TTL；每个条目记录
+    写入时数据集的数据版本（get_data_version，由数据库文件状态得出，在各工作进程间一致），
+    任何进程写入数据集后旧条目不再命中。
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float, enabled: bool = True):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.enabled = enabled
+        self._entries: 'OrderedDict[Hashable, _Entry]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale = 0
+
+    def _remove_locked(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def get(self, key: Hashable, version: Hashable) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.version != version:
+                self._remove_locked(key)
+                self.stale += 1
+                self.misses += 1
+                return None
+            if entry.expires_at < time.monotonic():
+                self._remove_locked(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def put(self, key: Hashable, version: Hashable, value: Any):
+        if not self.enabled:
+            return
+        # 以JSON长度估算结果占用的内存
+        size = len(json.dumps(value, ensure_ascii=False, default=str))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove_locked(key)
+            self._entries[key] = _Entry(version, value, size, time.monotonic() + self.ttl)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove_locked(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'stale': self.stale,
+            }
+
+
+query_cache = QueryCache(
+    max_entries=Config.QUERY_CACHE_MAX_ENTRIES,
+    max_bytes=Config.QUERY_CACHE_MAX_BYTES,
+    ttl=Config.QUERY_CACHE_TTL,
+    enabled=Config.QUERY_CACHE_ENABLED,
+)
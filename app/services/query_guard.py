@@ -0,0 +1,354 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+from app.config import Config
+
+
+class QueryInterruptedError(ValueError):
+    """查询因超出时间预算或被取消而中止"""
+
+    def __init__(self, message: str, reason: str, query_id: str):
+        super().__init__(message)
+        self.reason = reason
+        self.query_id = query_id
+
+
+def resolve_budget(dataset_id: int, timeout_ms: float = None, max_rows: int = None,
+                   max_bytes: int = None) -> Dict:
+    """计算查询的执行预算
+
+    全局默认值可被 QUERY_DATASET_BUDGETS 中该数据集的设置覆盖；请求中的值只能收紧预算，
+    不能超过数据集的上限。0 表示不限制。
+    """
+    budget = {
+        'timeout_ms': Config.QUERY_TIMEOUT_MS,
+        'max_rows': Config.QUERY_MAX_ROWS,
+        'max_bytes': Config.QUERY_MAX_BYTES,
+    }
+    budget.update(Config.QUERY_DATASET_BUDGETS.get(str(dataset_id), {}))
+    for key, requested in (('timeout_ms', timeout_ms), ('max_rows', max_rows), ('max_bytes', max_bytes)):
+        if requested is None:
+            continue
+        requested = float(requested) if key == 'timeout_ms' else int(requested)
+        if requested <= 0:
+            raise ValueError(f"{key} must be positive")
+        budget[key] = min(budget[key], requested) if budget[key] else requested
+    return budget
+
+
+def _row_size(row, overhead: int) -> int:
+    # 按JSON输出估算：字符串按字符数，其他值按固定宽度
+    size = overhead
+    for value in row:
+        if isinstance(value, (str, bytes)):
+            size += len(value) + 2
+        else:
+            size += 8
+    return size
+
+
+def fetch_capped(cursor, columns: List[str], max_rows: int, max_bytes: int,
+                 batch_size: int = None) -> Tuple[list, Optional[str]]:
+    """按批取回结果，超过行数或估算字节数上限时停止
+
+    返回 (行, 截断原因)，截断原因为 'rows'、'bytes' 或 None（结果完整）。
+    """
+    batch_size = batch_size or Config.STREAM_BATCH_SIZE
+    overhead = sum(len(column) + 4 for column in columns)
+    rows = []
+    size = 0
+    while True:
+        if max_rows and len(rows) >= max_rows:
+            # 多取一行判断结果是否确实被截断
+            return rows, ('rows' if cursor.fetchone() is not None else None)
+        wanted = min(batch_size, max_rows - len(rows)) if max_rows else batch_size
+        batch = cursor.fetchmany(wanted)
+        if not batch:
+            return rows, None
+        if max_bytes:
+            for index, row in enumerate(batch):
+                size += _row_size(row, overhead)
+                if size > max_bytes:
+                    rows.extend(batch[:index])
+                    return rows, 'bytes'
+        rows.extend(batch)
+
+
+class RunningQuery:
+    """一个执行中的查询：累计数据库执行时间，由进度回调在超时或取消时中止"""
+
+    def __init__(self, query_id: str, dataset_id: int, sql: str, conn: sqlite3.Connection, timeout_ms: float,
+                 registry: 'QueryRegistry' = None, shared: bool = False):
+        self.query_id = query_id
+        self.dataset_id = dataset_id
+        self.sql = sql
+        self.conn = conn
+        self.timeout = timeout_ms / 1000.0 if timeout_ms else None
+        self.started_at = time.time()
+        self.cancelled = False
+        self.timed_out = False
+        self._used = 0.0
+        self._resumed: Optional[float] = None
+        self._deadline = float('inf')
+        # shared：已写入多个工作进程共用的登记表
+        self.shared = shared
+        self._registry = registry
+        self._next_poll = time.monotonic() + (registry.poll_interval if registry else 0)
+
+    def resume(self):
+        """开始计入数据库执行时间（流式查询在两批之间暂停计时）"""
+        self._resumed = time.monotonic()
+        if self.timeout:
+            self._deadline = self._resumed + self.timeout - self._used
+
+    def pause(self):
+        if self._resumed is not None:
+            self._used += time.monotonic() - self._resumed
+            self._resumed = None
+        self._deadline = float('inf')
+
+    def progress(self) -> int:
+        # SQLite每执行 QUERY_PROGRESS_STEPS 条虚拟机指令回调一次，返回非0时中止查询
+        if self.cancelled:
+            return 1
+        now = time.monotonic()
+        if now > self._deadline:
+            self.timed_out = True
+            return 1
+        if self._registry and now >= self._next_poll:
+            self._next_poll = now + self._registry.poll_interval
+            if not self.shared:
+                # 执行超过一个轮询间隔的查询才写入共享登记表，短查询只登记在进程内
+                self.shared = self._registry._share(self)
+            elif self._registry._cancel_requested(self.query_id):
+                # 其他工作进程收到的取消请求只写入共享登记表，按间隔检查一次
+                self.cancelled = True
+                return 1
+        return 0
+
+    def interrupted_error(self) -> QueryInterruptedError:
+        if self.cancelled:
+            return QueryInterruptedError(f"Query {self.query_id} was cancelled", 'cancelled', self.query_id)
+        return QueryInterruptedError(
+            f"Query {self.query_id} exceeded its time budget of {int(self.timeout * 1000)} ms",
+            'timeout', self.query_id)
+
+    def to_dict(self) -> Dict:
+        return {
+            'query_id': self.query_id,
+            'dataset_id': self.dataset_id,
+            'sql': self.sql,
+            'pid': os.getpid(),
+            'started_at': self.started_at,
+            'elapsed_ms': round((time.time() - self.started_at) * 1000, 1),
+            'db_time_ms': round((self._used + (time.monotonic() - self._resumed if self._resumed else 0)) * 1000, 1),
+            'timeout_ms': self.timeout * 1000 if self.timeout else None,
+            'cancelled': self.cancelled,
+        }
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class QueryRegistry:
+    """执行中查询的登记表，用于按查询ID取消
+
+    查询登记在进程内；客户端指定了 query_id 的查询（以及流式查询）立即、其他查询在执行超过
+    poll_interval 秒后再登记到旁路SQLite文件中（不写系统数据库，避免改变系统数据库的数据版本），
+    多个工作进程共用同一个文件，短查询不产生任何文件写入。取消请求落在执行查询的进程时直接中断连接；
+    落在其他进程时在文件中设置取消标记，由执行查询的进程在进度回调中每隔 poll_interval 秒检查一次。
+    旁路文件不可用时退化为只在当前进程内登记和取消。
+    """
+
+    def __init__(self, path: str, poll_interval: float):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._queries: Dict[str, RunningQuery] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._schema_ready = False
+
+    @staticmethod
+    def new_query_id() -> str:
+        return uuid.uuid4().hex
+
+    def _connect(self) -> sqlite3.Connection:
+        # 每个线程一个连接：进度回调在执行查询的线程中检查取消标记
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=Config.SQLITE_BUSY_TIMEOUT / 1000,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            # 登记表只反映当前执行中的查询，掉电后内容本就失效，不需要同步到磁盘
+            conn.execute("PRAGMA synchronous = OFF")
+            if not self._schema_ready:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS running_queries (
+                        query_id TEXT PRIMARY KEY,
+                        dataset_id,
+                        sql TEXT,
+                        pid INTEGER NOT NULL,
+                        started_at REAL NOT NULL,
+                        timeout_ms REAL,
+                        cancelled INTEGER NOT NULL DEFAULT 0
+                    )
+                ''')
+                self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _stale(pid: int) -> bool:
+        # 当前进程的查询都在 _queries 中，登记表中属于当前进程却不在其中的是遗留记录
+        return pid == os.getpid() or not _pid_alive(pid)
+
+    def _share(self, query: RunningQuery) -> bool:
+        """把查询写入共享登记表，返回是否写入成功"""
+        try:
+            return self._register(query)
+        except ValueError:
+            return False
+
+    def _register(self, query: RunningQuery) -> bool:
+        """写入共享登记表；同一 query_id 正在其他进程中执行时抛出 ValueError"""
+        try:
+            conn = self._connect()
+            values = (query.query_id, query.dataset_id, query.sql, os.getpid(), query.started_at,
+                      query.timeout * 1000 if query.timeout else None)
+            try:
+                conn.execute('''
+                    INSERT INTO running_queries (query_id, dataset_id, sql, pid, started_at, timeout_ms)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', values)
+            except sqlite3.IntegrityError:
+                row = conn.execute("SELECT pid FROM running_queries WHERE query_id = ?",
+                                   (query.query_id,)).fetchone()
+                if row and not self._stale(row[0]):
+                    raise ValueError(f"Query {query.query_id} is already running")
+                # 进程退出时遗留的记录
+                conn.execute('''
+                    INSERT OR REPLACE INTO running_queries (query_id, dataset_id, sql, pid, started_at, timeout_ms)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', values)
+        except sqlite3.Error:
+            return False
+        return True
+
+    def _unregister(self, query_id: str):
+        try:
+            self._connect().execute("DELETE FROM running_queries WHERE query_id = ? AND pid = ?",
+                                    (query_id, os.getpid()))
+        except sqlite3.Error:
+            pass
+
+    def _cancel_requested(self, query_id: str) -> bool:
+        try:
+            row = self._connect().execute("SELECT cancelled FROM running_queries WHERE query_id = ?",
+                                          (query_id,)).fetchone()
+        except sqlite3.Error:
+            return False
+        return bool(row and row[0])
+
+    @contextmanager
+    def guard(self, conn: sqlite3.Connection, query_id: str, dataset_id: int, sql: str, timeout_ms: float,
+              shared: bool = False):
+        """在连接上安装进度回调并登记查询，退出时移除回调，避免影响连接池中连接的下一次使用
+
+        shared 为真时（query_id 由客户端指定，或查询ID会在执行期间返回给客户端）立即写入共享登记表，
+        并检查 query_id 是否已在其他进程中执行。查询被中止时抛出 QueryInterruptedError。
+        """
+        query = RunningQuery(query_id, dataset_id, sql, conn, timeout_ms, self)
+        with self._lock:
+            if query_id in self._queries:
+                raise ValueError(f"Query {query_id} is already running")
+            self._queries[query_id] = query
+        if shared:
+            try:
+                query.shared = self._register(query)
+            except ValueError:
+                with self._lock:
+                    self._queries.pop(query_id, None)
+                raise
+        conn.set_progress_handler(query.progress, Config.QUERY_PROGRESS_STEPS)
+        query.resume()
+        try:
+            yield query
+        except sqlite3.OperationalError as e:
+            if query.cancelled or query.timed_out:
+                raise query.interrupted_error() from e
+            raise
+        finally:
+            with self._lock:
+                self._queries.pop(query_id, None)
+            conn.set_progress_handler(None, 0)
+            if query.shared:
+                self._unregister(query_id)
+
+    def cancel(self, query_id: str) -> bool:
+        """取消执行中的查询：当前进程中的查询直接中断，其他进程中的查询设置共享的取消标记"""
+        with self._lock:
+            query = self._queries.get(query_id)
+            if query is not None:
+                query.cancelled = True
+                # 在锁内中断，保证连接仍属于该查询（guard退出前先移除登记）
+                query.conn.interrupt()
+                return True
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT pid FROM running_queries WHERE query_id = ?", (query_id,)).fetchone()
+            if not row or self._stale(row[0]):
+                return False
+            conn.execute("UPDATE running_queries SET cancelled = 1 WHERE query_id = ?", (query_id,))
+        except sqlite3.Error:
+            return False
+        return True
+
+    def running(self, dataset_id: int = None) -> List[Dict]:
+        """所有工作进程中执行中的查询；其他进程的查询没有 db_time_ms"""
+        with self._lock:
+            local = {query.query_id: query.to_dict() for query in self._queries.values()}
+        result = dict(local)
+        try:
+            conn = self._connect()
+            rows = conn.execute('''
+                SELECT query_id, dataset_id, sql, pid, started_at, timeout_ms, cancelled
+                FROM running_queries ORDER BY started_at
+            ''').fetchall()
+            stale = []
+            for query_id, row_dataset, sql, pid, started_at, timeout_ms, cancelled in rows:
+                if query_id in local:
+                    continue
+                if self._stale(pid):
+                    stale.append((query_id, pid))
+                    continue
+                result[query_id] = {
+                    'query_id': query_id,
+                    'dataset_id': row_dataset,
+                    'sql': sql,
+                    'pid': pid,
+                    'started_at': started_at,
+                    'elapsed_ms': round((time.time() - started_at) * 1000, 1),
+                    'db_time_ms': None,
+                    'timeout_ms': timeout_ms,
+                    'cancelled': bool(cancelled),
+                }
+            if stale:
+                conn.executemany("DELETE FROM running_queries WHERE query_id = ? AND pid = ?", stale)
+        except sqlite3.Error:
+            pass
+        queries = sorted(result.values(), key=lambda query: query['started_at'])
+        return [query for query in queries if dataset_id is None or query['dataset_id'] == dataset_id]
+
+
+running_queries = QueryRegistry(Config.RUNNING_QUERIES_PATH, Config.QUERY_CANCEL_POLL_INTERVAL)
@@ -0,0 +1,275 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from app.config import Config
+from app.db import get_data_version
+from app.models.dataset import Dataset
+from app.models.report import Report
+from app.services.condition_evaluator import select_conditional_source
+from app.services.data_service import DataService
+
+# 报表组件查询共用的有界线程池
+_executor = ThreadPoolExecutor(max_workers=Config.REPORT_DATA_WORKERS,
+                               thread_name_prefix='report-data')
+
+
+class ReportDataService:
+    @staticmethod
+    def _merge_component_values(components: List[Dict], component_values: Dict[str, Dict]) -> Dict[str, Dict]:
+        """用客户端提交的组件当前值（下拉选中值、树图选中路径、钻取状态等）覆盖保存的props"""
+        merged = {}
+        for comp in components:
+            comp_id = comp.get('id')
+            if not comp_id:
+                continue
+            props = dict(comp.get('props') or {})
+            props.update((component_values or {}).get(comp_id) or {})
+            merged[comp_id] = {**comp, 'props': props}
+        return merged
+
+    @staticmethod
+    def get_component_value(components_by_id: Dict[str, Dict], component_id: str, field: str = None) -> Any:
+        """获取组件的值，规则与前端 getComponentValue 保持一致"""
+        comp = components_by_id.get(component_id)
+        if not comp:
+            return None
+
+        field_name = field or 'value'
+        props = comp.get('props') or {}
+
+        # 对于下拉列表，value和selectedValue都指向同一个值
+        if comp.get('type') == 'dropdown' and field_name in ('value', 'selectedValue'):
+            return props.get('value')
+
+        # 对于树图，支持 selectedNodePath 字段
+        if comp.get('type') == 'tree_chart':
+            if field_name == 'selectedNodePath':
+                return props.get('selectedNodePath')
+            if field_name in ('selectedNode', 'value'):
+                # 返回选中路径的最后一个节点名称
+                path = props.get('selectedNodePath') or []
+                return path[-1] if path else None
+
+        return props.get(field_name)
+
+    @staticmethod
+    def resolve_source(comp: Dict, components_by_id: Dict[str, Dict]) -> Optional[Dict]:
+        """确定组件使用的数据源
+
+        返回 {'dataset_id', 'dataset_ids', 'table_name', 'sql', 'fields', 'source'}，其中 fields 为条件数据源
+        的字段映射（未设置时为None），source 为 'fixed'/'conditional'/'default'；数据源配置了
+        datasetIds 时 dataset_ids 为这些数据集（跨数据集查询），否则为None；无数据源时返回None。
+        """
+        data_source = comp.get('dataSource') or {}
+        if data_source.get('type') == 'conditional':
+            # 评估条件，选择合适的数据源，都不匹配时使用默认数据源
+            matched = select_conditional_source(
+                data_source,
+                lambda component_id, field: ReportDataService.get_component_value(
+                    components_by_id, component_id, field),
+            )
+            if matched:
+                source = {
+                    'dataset_id': matched.get('datasetId'),
+                    'dataset_ids': matched.get('datasetIds') or None,
+                    'table_name': matched.get('tableName'),
+                    'sql': matched.get('sql'),
+                    'fields': matched.get('fields'),
+                    'source': 'conditional',
+                }
+            else:
+                default_source = data_source.get('defaultSource') or {}
+                source = {
+                    'dataset_id': default_source.get('datasetId'),
+                    'dataset_ids': default_source.get('datasetIds') or None,
+                    'table_name': default_source.get('tableName'),
+                    'sql': default_source.get('sql'),
+                    'fields': None,
+                    'source': 'default',
+                }
+        else:
+            source = {
+                'dataset_id': data_source.get('datasetId'),
+                'dataset_ids': data_source.get('datasetIds') or None,
+                'table_name': data_source.get('tableName'),
+                'sql': data_source.get('sql') if data_source.get('type') == 'sql' else None,
+                'fields': None,
+                'source': 'fixed',
+            }
+        if not source['dataset_id'] and source['dataset_ids']:
+            source['dataset_id'] = source['dataset_ids'][0]
+        if not source['dataset_id']:
+            return None
+        return source
+
+    @staticmethod
+    def build_filters(comp: Dict, components_by_id: Dict[str, Dict]) -> List[Dict]:
+        """构建组件的过滤条件：数据源过滤器 + 联动过滤 + 钻取过滤"""
+        data_source = comp.get('dataSource') or {}
+        interaction = comp.get('interaction') or {}
+        filters = list(data_source.get('filters') or [])
+
+        # 联动过滤：取来源组件的值作为目标字段的过滤条件
+        linkage = interaction.get('linkage') or {}
+        if linkage.get('enabled') and linkage.get('sourceComponentId') and linkage.get('targetField'):
+            linkage_value = ReportDataService.get_component_value(
+                components_by_id, linkage['sourceComponentId'], linkage.get('sourceField') or 'value')
+            if linkage_value is not None and linkage_value != '':
+                filters.append({
+                    'field': linkage['targetField'],
+                    'operator': linkage.get('operator') or '=',
+                    'value': linkage_value,
+                })
+
+        # 钻取本组件：按当前层级逐级添加维度过滤
+        drill_down = interaction.get('drillDown') or {}
+        drill_state = (comp.get('props') or {}).get('drillDownState') or {}
+        level = drill_state.get('level') or 0
+        if drill_down.get('enabled') and drill_down.get('type') == 'self' and level > 0:
+            dimensions = drill_down.get('dimensions') or {}
+            values = drill_state.get('values') or {}
+            for i in range(1, 4):
+                key = f'level{i}'
+                if level >= i and values.get(key) and dimensions.get(key):
+                    filters.append({
+                        'field': dimensions[key],
+                        'operator': '=',
+                        'value': values[key],
+                    })
+
+        return filters
+
+    @staticmethod
+    def _run_query(query: Dict, limit: int) -> Dict:
+        if query.get('dataset_ids'):
+            return ReportDataService._run_federated_query(query, limit)
+        if query.get('sql'):
+            result = DataService.execute_sql(query['dataset_id'], query['sql'])
+            return {
+                'data': result['data'],
+                'columns': result['columns'],
+            }
+        result = DataService.get_table_data(
+            dataset_id=query['dataset_id'],
+            table_name=query.get('table_name'),
+            filters=query['filters'],
+            limit=limit,
+        )
+        return {
+            'data': result['data'],
+            'columns': result['columns'],
+            'total': result['total'],
+            'table_name': result['table_name'],
+        }
+
+    @staticmethod
+    def _run_federated_query(query: Dict, limit: int) -> Dict:
+        """跨数据集数据源：SQL中以 ds<ID>.<表名> 引用各数据集，未配置SQL时合并各数据集的同名表"""
+        if query.get('sql'):
+            result = DataService.execute_federated_sql(query['dataset_ids'], query['sql'])
+            return {
+                'data': result['data'],
+                'columns': result['columns'],
+            }
+        if not query.get('table_name'):
+            raise ValueError("Federated data sources require a table name or SQL")
+        result = DataService.get_federated_table_data(
+            dataset_ids=query['dataset_ids'],
+            table_name=query['table_name'],
+            filters=query['filters'],
+            limit=limit,
+        )
+        return {
+            'data': result['data'],
+            'columns': result['columns'],
+            'total': result['total'],
+            'table_name': result['table_name'],
+        }
+
+    @staticmethod
+    def _plan_queries(report: Report, component_values: Dict[str, Dict]) -> Dict[str, Dict]:
+        """为每个组件确定数据源和过滤条件，返回 {组件ID: 查询}"""
+        components = (report.config or {}).get('components') or []
+        components_by_id = ReportDataService._merge_component_values(components, component_values)
+
+        plans = {}
+        for comp_id, comp in components_by_id.items():
+            source = ReportDataService.resolve_source(comp, components_by_id)
+            if not source:
+                continue
+            plans[comp_id] = {
+                **source,
+                'filters': ReportDataService.build_filters(comp, components_by_id),
+            }
+        return plans
+
+    @staticmethod
+    def _query_key(query: Dict) -> str:
+        """相同数据集、表/SQL和过滤条件的组件共用一次查询"""
+        return json.dumps([query['dataset_id'], query.get('dataset_ids'), query.get('table_name'), query.get('sql'),
+                           query['filters']],
+                          sort_keys=True, ensure_ascii=False, default=str)
+
+    @staticmethod
+    def resolve_sources(report_id: int, component_values: Dict[str, Dict] = None) -> Optional[Dict]:
+        """只在服务端求值条件数据源，返回每个组件选中的数据源和过滤条件，不执行查询"""
+        report = Report.get_by_id(report_id)
+        if not report:
+            return None
+        return {
+            'report_id': report.id,
+            'components': ReportDataService._plan_queries(report, component_values),
+        }
+
+    @staticmethod
+    def get_data_version(report_id: int) -> Optional[str]:
+        """报表数据的版本标识：报表修订号加上所有数据集的数据版本（条件数据源可能切换到任意数据集），
+        不解析报表配置；报表不存在时返回None"""
+        version = Report.get_version(report_id)
+        if version is None:
+            return None
+        parts = [f"{version[0]}@{version[1]}"]
+        parts.extend(f"{dataset.id}:{get_data_version(dataset.database_path)}" for dataset in Dataset.get_all())
+        return '|'.join(parts)
+
+    @staticmethod
+    def get_report_data(report_id: int, component_values: Dict[str, Dict] = None,
+                        limit: int = 100) -> Optional[Dict]:
+        """一次性解析报表所有组件的数据源并并发执行查询
+
+        component_values 为组件当前值快照，形如 {组件ID: {props字段: 值}}。条件数据源在服务端
+        求值，解析到相同查询的组件只执行一次。报表不存在时返回None，单个组件查询失败只影响该组件。
+        """
+        report = Report.get_by_id(report_id)
+        if not report:
+            return None
+
+        plans = ReportDataService._plan_queries(report, component_values)
+
+        # 按查询去重后提交到线程池
+        futures = {}
+        component_keys = {}
+        for comp_id, query in plans.items():
+            key = ReportDataService._query_key(query)
+            component_keys[comp_id] = key
+            if key not in futures:
+                futures[key] = _executor.submit(ReportDataService._run_query, query, limit)
+
+        results = {}
+        for comp_id, query in plans.items():
+            meta = {
+                'dataset_id': query['dataset_id'],
+                'source': query['source'],
+                'fields': query['fields'],
+            }
+            try:
+                results[comp_id] = {**meta, **futures[component_keys[comp_id]].result()}
+            except Exception as e:
+                results[comp_id] = {**meta, 'error': str(e)}
+
+        return {
+            'report_id': report.id,
+            'updated_at': report.updated_at,
+            'components': results,
+            'queries_executed': len(futures),
+        }
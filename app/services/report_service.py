@@ -1,3 +1,5 @@
+from app.config import Config
+from app.db import get_data_version
 from app.models.report import Report
 
 class ReportService:
@@ -15,10 +17,38 @@ class ReportService:
     def get_report(report_id: int) -> Report:
         return Report.get_by_id(report_id)
     
+    @staticmethod
+    def get_report_version(report_id: int):
+        """报表的 (修订号, 更新时间)，报表不存在时返回None"""
+        return Report.get_version(report_id)
+    
+    @staticmethod
+    def get_reports_version() -> str:
+        """报表列表的版本标识（系统数据库的数据版本）"""
+        return get_data_version(Config.DATABASE_PATH)
+    
     @staticmethod
     def get_all_reports() -> list:
         return Report.get_all()
     
+    @staticmethod
+    def list_reports(limit: int = None, offset: int = 0, sort: str = 'updated_at', order: str = 'desc',
+                     search: str = None) -> dict:
+        """分页获取报表摘要（不含config），返回 {'data', 'total', 'limit', 'offset'}"""
+        limit = Config.REPORT_LIST_PAGE_SIZE if limit is None else int(limit)
+        offset = int(offset or 0)
+        if limit <= 0 or offset < 0:
+            raise ValueError("limit must be positive and offset must not be negative")
+        limit = min(limit, Config.REPORT_LIST_MAX_PAGE_SIZE)
+        summaries, total = Report.list_summaries(limit, offset, sort or 'updated_at', order or 'desc',
+                                                 (search or '').strip() or None)
+        return {
+            'data': summaries,
+            'total': total,
+            'limit': limit,
+            'offset': offset,
+        }
+    
     @staticmethod
     def update_report(report_id: int, name: str = None, description: str = None, config: dict = None) -> Report:
         report = Report.get_by_id(report_id)
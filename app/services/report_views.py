@@ -0,0 +1,106 @@
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+from app.config import Config
+
+
+class ReportViewCounter:
+    """报表访问次数统计，用于启动预热时挑选访问最多的报表
+
+    计数先累积在内存中，由后台线程批量累加到旁路SQLite文件（不写系统数据库，
+    避免改变系统数据库的数据版本而让数据集缓存和ETag失效）。多个工作进程共用同一个文件，
+    各自累加自己的增量。
+    """
+
+    def __init__(self, path: str, flush_interval: float):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._pending: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='report-views')
+        self._flushing = False
+        self._last_flush = time.monotonic()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def record(self, report_id: int):
+        """记录一次报表访问；距上次写入超过 flush_interval 秒时在后台写入"""
+        with self._lock:
+            self._pending[report_id] = self._pending.get(report_id, 0) + 1
+            if self._flushing or time.monotonic() - self._last_flush < self.flush_interval:
+                return
+            self._flushing = True
+        self._executor.submit(self._flush_in_background)
+
+    def _connect(self) -> sqlite3.Connection:
+        # 只在持有 _write_lock 的线程中访问
+        if self._conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=Config.SQLITE_BUSY_TIMEOUT / 1000,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS report_views (
+                    report_id INTEGER PRIMARY KEY,
+                    view_count INTEGER NOT NULL DEFAULT 0,
+                    last_viewed_at TEXT
+                )
+            ''')
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        except sqlite3.Error:
+            pass
+        finally:
+            with self._lock:
+                self._flushing = False
+
+    def flush(self):
+        """把内存中的增量累加到旁路文件，写入失败时增量放回内存"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        now = datetime.now().isoformat()
+        try:
+            with self._write_lock:
+                conn = self._connect()
+                conn.executemany('''
+                    INSERT INTO report_views (report_id, view_count, last_viewed_at) VALUES (?, ?, ?)
+                    ON CONFLICT(report_id) DO UPDATE SET
+                        view_count = view_count + excluded.view_count,
+                        last_viewed_at = excluded.last_viewed_at
+                ''', [(report_id, count, now) for report_id, count in pending.items()])
+                conn.commit()
+        except sqlite3.Error:
+            with self._lock:
+                for report_id, count in pending.items():
+                    self._pending[report_id] = self._pending.get(report_id, 0) + count
+            raise
+
+    def top(self, limit: int) -> List[Dict]:
+        """访问次数最多的报表（包括尚未写入的增量），按次数从高到低排列"""
+        counts: Dict[int, int] = {}
+        try:
+            with self._write_lock:
+                rows = self._connect().execute(
+                    'SELECT report_id, view_count FROM report_views ORDER BY view_count DESC LIMIT ?',
+                    (limit,)).fetchall()
+            counts.update(rows)
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            for report_id, count in self._pending.items():
+                counts[report_id] = counts.get(report_id, 0) + count
+        ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [{'report_id': report_id, 'views': count} for report_id, count in ranked]
+
+
+report_views = ReportViewCounter(Config.REPORT_VIEWS_PATH, Config.REPORT_VIEWS_FLUSH_INTERVAL)
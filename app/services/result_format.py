@@ -0,0 +1,140 @@
+import io
+from typing import Any, Dict, Iterable, Iterator, List
+
+# 数据接口支持的响应格式：
+#   rows     - 默认格式，字典列表
+#   columnar - 列名 + 每列一个数组，避免每行重复列名
+#   arrow    - Apache Arrow IPC 流（需要安装 pyarrow）
+RESULT_FORMATS = ('rows', 'columnar', 'arrow')
+
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+
+def check_format(result_format: str) -> str:
+    result_format = result_format or 'rows'
+    if result_format not in RESULT_FORMATS:
+        raise ValueError(f"Unsupported format: {result_format}")
+    if result_format == 'arrow':
+        _import_pyarrow()
+    return result_format
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+    except ImportError:
+        raise ValueError("Arrow format requires the pyarrow package")
+    return pyarrow
+
+
+def to_columnar(columns: List[str], data: List[Dict[str, Any]]) -> List[List[Any]]:
+    """字典列表转换为与 columns 对齐的列数组"""
+    return [[row.get(column) for row in data] for column in columns]
+
+
+def _infer_type(pa, values: List[Any]):
+    """根据数据推断列类型：整数与浮点数混合时为 float64，全为空或其他类型混杂时使用字符串"""
+    kinds = {type(v) for v in values if v is not None}
+    if not kinds:
+        return pa.string()
+    if kinds <= {bool}:
+        return pa.bool_()
+    if kinds <= {int}:
+        return pa.int64()
+    if kinds <= {int, float}:
+        return pa.float64()
+    if kinds <= {bytes}:
+        return pa.binary()
+    return pa.string()
+
+
+# float64 能精确表示的整数范围
+_MAX_EXACT_FLOAT_INT = 2 ** 53
+_INT64_RANGE = (-2 ** 63, 2 ** 63 - 1)
+_MISMATCH = object()
+
+
+def _lossless_converter(pa, arrow_type):
+    """返回把单个值无损转换为列类型的函数，无法无损表示时返回 _MISMATCH"""
+    if arrow_type == pa.string():
+        return lambda value: value if isinstance(value, str) else str(value)
+    if arrow_type == pa.int64():
+        def to_int(value):
+            if isinstance(value, int) and not isinstance(value, bool):
+                return value if _INT64_RANGE[0] <= value <= _INT64_RANGE[1] else _MISMATCH
+            if isinstance(value, float) and value.is_integer() and _INT64_RANGE[0] <= value <= _INT64_RANGE[1]:
+                return int(value)
+            return _MISMATCH
+        return to_int
+    if arrow_type == pa.float64():
+        def to_float(value):
+            if isinstance(value, float):
+                return value
+            if isinstance(value, int) and not isinstance(value, bool) and abs(value) <= _MAX_EXACT_FLOAT_INT:
+                return float(value)
+            return _MISMATCH
+        return to_float
+    if arrow_type == pa.binary():
+        return lambda value: value if isinstance(value, bytes) else _MISMATCH
+    return lambda value: value if isinstance(value, bool) else _MISMATCH
+
+
+def _coerce(pa, column: str, values: List[Any], arrow_type):
+    """按列类型构建数组
+
+    SQLite为动态类型，同一列的值类型可能不同。只做无损转换（如整数值的浮点数转为整数），
+    值无法用列类型精确表示时（如 int64 列中出现 1.5）抛出ValueError，而不是截断或置空。
+    """
+    convert = _lossless_converter(pa, arrow_type)
+    converted = []
+    for value in values:
+        if value is None:
+            converted.append(None)
+            continue
+        result = convert(value)
+        if result is _MISMATCH:
+            raise ValueError(
+                f"Column {column} contains a {type(value).__name__} value ({value!r}) that cannot be "
+                f"represented as {arrow_type} (the type inferred from the first batch); "
+                f"CAST the column in SQL or use the rows/columnar format")
+        converted.append(result)
+    return pa.array(converted, type=arrow_type)
+
+
+def arrow_ipc_stream(columns: List[str], batches: Iterable[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    """把按批产出的字典行编码为 Arrow IPC 流，每批对应一个 RecordBatch
+
+    列类型由第一批数据推断，后续批次按该类型无损转换，无法转换时抛出ValueError
+    （流中途出错时响应被截断）。一次性返回的结果应作为单个批次传入，使类型由全部数据推断。
+    """
+    pa = _import_pyarrow()
+    sink = io.BytesIO()
+    writer = None
+    schema = None
+
+    def drain() -> bytes:
+        # 取出已写入的字节并清空缓冲区，保证内存只与单批大小有关
+        chunk = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return chunk
+
+    for batch in batches:
+        if not batch:
+            continue
+        column_values = [[row.get(column) for row in batch] for column in columns]
+        if schema is None:
+            schema = pa.schema([pa.field(column, _infer_type(pa, values))
+                                for column, values in zip(columns, column_values)])
+            writer = pa.ipc.new_stream(sink, schema)
+        arrays = [_coerce(pa, field.name, values, field.type) for values, field in zip(column_values, schema)]
+        writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+        yield drain()
+
+    if writer is None:
+        # 空结果：只输出schema
+        schema = pa.schema([pa.field(column, pa.string()) for column in columns])
+        writer = pa.ipc.new_stream(sink, schema)
+    writer.close()
+    yield drain()
@@ -0,0 +1,412 @@
+import json
+import re
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from app.db import RESERVED_TABLE_PREFIX, get_connection, get_schema_catalog, quote_identifier
+from app.models.dataset import Dataset
+
+# 汇总表定义保存在数据集数据库中，与汇总表、触发器一起随数据库文件迁移
+ROLLUPS_TABLE = RESERVED_TABLE_PREFIX + 'rollups'
+ROLLUP_TABLE_PREFIX = RESERVED_TABLE_PREFIX + 'rollup_'
+
+# 每种度量在汇总表中需要保存的列
+ROLLUP_MEASURE_COLUMNS = {
+    'sum': ('sum', 'cnt'),  # 非空计数用于在删除全部非空值后把和恢复为NULL
+    'avg': ('sum', 'cnt'),
+    'count': ('cnt',),
+    'min': ('min',),
+    'max': ('max',),
+}
+COUNT_COLUMN = '__count'
+
+_definitions: Dict[str, Tuple[int, List[Dict]]] = {}
+_definitions_lock = threading.Lock()
+
+
+def _measure_column(field: str, kind: str) -> str:
+    return f'{field}__{kind}'
+
+
+def _group_predicate(dimensions: List[str], row: str, alias: str = None) -> str:
+    """汇总表中与 NEW/OLD 行同组的条件；用 IS 比较以正确匹配NULL维度"""
+    if not dimensions:
+        return '1'
+    prefix = f'{alias}.' if alias else ''
+    return ' AND '.join(f"{prefix}{quote_identifier(d)} IS {row}.{quote_identifier(d)}" for d in dimensions)
+
+
+class RollupService:
+    """声明式汇总表
+
+    汇总表按维度保存源表的行数以及度量字段的 sum/count/min/max，由源表上的
+    INSERT/DELETE/UPDATE 触发器增量维护；aggregate 在维度、过滤字段和度量都能由
+    某个汇总表满足时，改为对汇总表做二次聚合。
+    """
+
+    @staticmethod
+    def _get_dataset(dataset_id: int) -> Dataset:
+        dataset = Dataset.get_by_id(dataset_id)
+        if not dataset:
+            raise ValueError(f"Dataset {dataset_id} not found")
+        return dataset
+
+    @staticmethod
+    def _stored_columns(measures: List[Dict]) -> Dict[str, List[str]]:
+        """度量定义 -> {字段: [需要保存的列类型]}"""
+        stored: Dict[str, List[str]] = {}
+        for measure in measures:
+            func = (measure.get('func') or 'sum').lower()
+            field = measure.get('field') or '*'
+            if field == '*':
+                if func != 'count':
+                    raise ValueError(f"Aggregate function {func} requires a field")
+                continue
+            if func not in ROLLUP_MEASURE_COLUMNS:
+                raise ValueError(f"Aggregate function {func} is not supported in rollups")
+            kinds = stored.setdefault(field, [])
+            for kind in ROLLUP_MEASURE_COLUMNS[func]:
+                if kind not in kinds:
+                    kinds.append(kind)
+        return stored
+
+    @staticmethod
+    def _insert_trigger_body(rollup_table: str, dimensions: List[str], stored: Dict[str, List[str]]) -> str:
+        """把 NEW 行计入所在分组：分组不存在时先插入空分组，再累加"""
+        table = quote_identifier(rollup_table)
+        columns = [quote_identifier(d) for d in dimensions] + [quote_identifier(COUNT_COLUMN)]
+        values = [f"NEW.{quote_identifier(d)}" for d in dimensions] + ['0']
+        sets = [f"{quote_identifier(COUNT_COLUMN)} = {quote_identifier(COUNT_COLUMN)} + 1"]
+        for field, kinds in stored.items():
+            new = f"NEW.{quote_identifier(field)}"
+            for kind in kinds:
+                column = quote_identifier(_measure_column(field, kind))
+                columns.append(column)
+                values.append('0' if kind == 'cnt' else 'NULL')
+                if kind == 'sum':
+                    sets.append(f"{column} = CASE WHEN {new} IS NULL THEN {column} "
+                                f"ELSE IFNULL({column}, 0) + {new} END")
+                elif kind == 'cnt':
+                    sets.append(f"{column} = {column} + ({new} IS NOT NULL)")
+                elif kind == 'min':
+                    sets.append(f"{column} = CASE WHEN {new} IS NULL THEN {column} "
+                                f"WHEN {column} IS NULL OR {new} < {column} THEN {new} ELSE {column} END")
+                else:
+                    sets.append(f"{column} = CASE WHEN {new} IS NULL THEN {column} "
+                                f"WHEN {column} IS NULL OR {new} > {column} THEN {new} ELSE {column} END")
+        predicate = _group_predicate(dimensions, 'NEW')
+        return (f"INSERT INTO {table} ({', '.join(columns)}) SELECT {', '.join(values)} "
+                f"WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {predicate});\n"
+                f"UPDATE {table} SET {', '.join(sets)} WHERE {predicate};")
+
+    @staticmethod
+    def _delete_trigger_body(rollup_table: str, source_table: str, dimensions: List[str],
+                             stored: Dict[str, List[str]]) -> str:
+        """把 OLD 行从所在分组中减去；min/max 无法递减，被删除的值是当前极值时从源表重新计算"""
+        table = quote_identifier(rollup_table)
+        predicate = _group_predicate(dimensions, 'OLD')
+        sets = [f"{quote_identifier(COUNT_COLUMN)} = {quote_identifier(COUNT_COLUMN)} - 1"]
+        statements = []
+        for field, kinds in stored.items():
+            old = f"OLD.{quote_identifier(field)}"
+            for kind in kinds:
+                column = quote_identifier(_measure_column(field, kind))
+                if kind == 'sum':
+                    # 非空值全部删除后恢复为NULL，与 SUM() 的语义一致（SET中引用的是更新前的计数）
+                    count_column = quote_identifier(_measure_column(field, 'cnt'))
+                    sets.append(f"{column} = CASE WHEN {old} IS NULL THEN {column} "
+                                f"WHEN {count_column} <= 1 THEN NULL ELSE {column} - {old} END")
+                elif kind == 'cnt':
+                    sets.append(f"{column} = {column} - ({old} IS NOT NULL)")
+                else:
+                    func = 'MIN' if kind == 'min' else 'MAX'
+                    statements.append(
+                        f"UPDATE {table} SET {column} = (SELECT {func}(s.{quote_identifier(field)}) "
+                        f"FROM {quote_identifier(source_table)} AS s WHERE {_group_predicate(dimensions, 'OLD', 's')}) "
+                        f"WHERE {predicate} AND {old} IS NOT NULL AND {column} = {old};")
+        statements.insert(0, f"UPDATE {table} SET {', '.join(sets)} WHERE {predicate};")
+        statements.append(f"DELETE FROM {table} WHERE {predicate} AND {quote_identifier(COUNT_COLUMN)} <= 0;")
+        return '\n'.join(statements)
+
+    @staticmethod
+    def _build_sql(rollup_table: str, source_table: str, dimensions: List[str],
+                   stored: Dict[str, List[str]]) -> str:
+        """从源表全量计算汇总表内容"""
+        columns = [quote_identifier(d) for d in dimensions] + [quote_identifier(COUNT_COLUMN)]
+        selects = [quote_identifier(d) for d in dimensions] + ['COUNT(*)']
+        functions = {'sum': 'SUM', 'cnt': 'COUNT', 'min': 'MIN', 'max': 'MAX'}
+        for field, kinds in stored.items():
+            for kind in kinds:
+                columns.append(quote_identifier(_measure_column(field, kind)))
+                selects.append(f"{functions[kind]}({quote_identifier(field)})")
+        sql = (f"INSERT INTO {quote_identifier(rollup_table)} ({', '.join(columns)}) "
+               f"SELECT {', '.join(selects)} FROM {quote_identifier(source_table)}")
+        if dimensions:
+            sql += f" GROUP BY {', '.join(quote_identifier(d) for d in dimensions)}"
+        return sql
+
+    @staticmethod
+    def create_rollup(dataset_id: int, name: str, source_table: str, dimensions: List[str],
+                      measures: List[Dict]) -> Dict:
+        """创建汇总表：建表、全量计算、创建增量维护触发器，在同一个事务中完成"""
+        dataset = RollupService._get_dataset(dataset_id)
+        if not name or not re.fullmatch(r'\w+', name):
+            raise ValueError(f"Invalid rollup name: {name}")
+
+        table = get_schema_catalog(dataset.database_path).get_table(source_table)
+        if not table or table.internal:
+            raise ValueError(f"Table {source_table} not found")
+
+        resolved_dimensions = []
+        for dimension in dimensions or []:
+            resolved = table.resolve_field(dimension)
+            if not resolved:
+                raise ValueError(f"Field {dimension} not found in table {table.name}")
+            if resolved not in resolved_dimensions:
+                resolved_dimensions.append(resolved)
+        resolved_measures = []
+        for measure in measures or []:
+            field = measure.get('field') or '*'
+            if field != '*':
+                resolved = table.resolve_field(field)
+                if not resolved:
+                    raise ValueError(f"Field {field} not found in table {table.name}")
+                field = resolved
+            resolved_measures.append({'field': field, 'func': (measure.get('func') or 'sum').lower()})
+        if not resolved_dimensions:
+            raise ValueError("At least one dimension is required")
+        stored = RollupService._stored_columns(resolved_measures)
+
+        rollup_table = ROLLUP_TABLE_PREFIX + name
+        # 维度列沿用源字段声明的类型，使过滤参数在汇总表和源表上按同样的列亲和性转换后比较
+        declared = {f['name']: f['type'] or '' for f in table.fields}
+        column_defs = [f"{quote_identifier(d)} {declared[d]}".rstrip() for d in resolved_dimensions]
+        column_defs.append(f"{quote_identifier(COUNT_COLUMN)} INTEGER NOT NULL DEFAULT 0")
+        for field, kinds in stored.items():
+            for kind in kinds:
+                column_defs.append(quote_identifier(_measure_column(field, kind)) +
+                                   (" INTEGER NOT NULL DEFAULT 0" if kind == 'cnt' else ''))
+
+        source = quote_identifier(table.name)
+        watched = ', '.join(quote_identifier(c) for c in resolved_dimensions + list(stored))
+        insert_body = RollupService._insert_trigger_body(rollup_table, resolved_dimensions, stored)
+        delete_body = RollupService._delete_trigger_body(rollup_table, table.name, resolved_dimensions, stored)
+
+        with get_connection(dataset.database_path) as conn:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(f'''
+                    CREATE TABLE IF NOT EXISTS {quote_identifier(ROLLUPS_TABLE)} (
+                        name TEXT PRIMARY KEY,
+                        source_table TEXT NOT NULL,
+                        table_name TEXT NOT NULL,
+                        dimensions TEXT NOT NULL,
+                        measures TEXT NOT NULL,
+                        created_at DATETIME
+                    )
+                ''')
+                exists = conn.execute(f"SELECT 1 FROM {quote_identifier(ROLLUPS_TABLE)} WHERE name = ?",
+                                      (name,)).fetchone()
+                if exists:
+                    raise ValueError(f"Rollup {name} already exists")
+                conn.execute(f"CREATE TABLE {quote_identifier(rollup_table)} ({', '.join(column_defs)})")
+                conn.execute(f"CREATE INDEX {quote_identifier(rollup_table + '__dims')} "
+                             f"ON {quote_identifier(rollup_table)} "
+                             f"({', '.join(quote_identifier(d) for d in resolved_dimensions)})")
+                # 删除当前极值时按分组重新计算 min/max，源表上的 (维度, 字段) 索引让重算只需一次索引查找
+                for field, kinds in stored.items():
+                    if 'min' in kinds or 'max' in kinds:
+                        conn.execute(f"CREATE INDEX {quote_identifier(f'{rollup_table}__{field}')} ON {source} "
+                                     f"({', '.join(quote_identifier(c) for c in resolved_dimensions + [field])})")
+                conn.execute(RollupService._build_sql(rollup_table, table.name, resolved_dimensions, stored))
+                conn.execute(f"CREATE TRIGGER {quote_identifier(rollup_table + '__ai')} AFTER INSERT ON {source} "
+                             f"BEGIN\n{insert_body}\nEND")
+                conn.execute(f"CREATE TRIGGER {quote_identifier(rollup_table + '__ad')} AFTER DELETE ON {source} "
+                             f"BEGIN\n{delete_body}\nEND")
+                conn.execute(f"CREATE TRIGGER {quote_identifier(rollup_table + '__au')} "
+                             f"AFTER UPDATE OF {watched} ON {source} "
+                             f"BEGIN\n{delete_body}\n{insert_body}\nEND")
+                conn.execute(f'''
+                    INSERT INTO {quote_identifier(ROLLUPS_TABLE)}
+                        (name, source_table, table_name, dimensions, measures, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (name, table.name, rollup_table, json.dumps(resolved_dimensions),
+                      json.dumps(resolved_measures), datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+                conn.commit()
+            except ValueError:
+                raise
+            except Exception as e:
+                raise ValueError(f"Failed to create rollup: {str(e)}")
+
+        return RollupService.get_rollup(dataset_id, name)
+
+    @staticmethod
+    def _load_definitions(database_path: str) -> List[Dict]:
+        """读取数据集的汇总表定义，按 schema_version 缓存（创建或删除汇总表都会改变schema）"""
+        catalog = get_schema_catalog(database_path)
+        if not catalog.get_table(ROLLUPS_TABLE):
+            return []
+        cached = _definitions.get(catalog.database_path)
+        if cached is not None and cached[0] == catalog.schema_version:
+            return cached[1]
+
+        with get_connection(database_path, readonly=True) as conn:
+            rows = conn.execute(f'''
+                SELECT name, source_table, table_name, dimensions, measures, created_at
+                FROM {quote_identifier(ROLLUPS_TABLE)}
+                ORDER BY name
+            ''').fetchall()
+        definitions = []
+        for row in rows:
+            measures = json.loads(row['measures'])
+            definitions.append({
+                'name': row['name'],
+                'source_table': row['source_table'],
+                'table_name': row['table_name'],
+                'dimensions': json.loads(row['dimensions']),
+                'measures': measures,
+                'stored': RollupService._stored_columns(measures),
+                'created_at': row['created_at'],
+            })
+        with _definitions_lock:
+            _definitions[catalog.database_path] = (catalog.schema_version, definitions)
+        return definitions
+
+    @staticmethod
+    def _public(definition: Dict, row_count: int = None) -> Dict:
+        result = {k: v for k, v in definition.items() if k != 'stored'}
+        if row_count is not None:
+            result['row_count'] = row_count
+        return result
+
+    @staticmethod
+    def list_rollups(dataset_id: int) -> List[Dict]:
+        dataset = RollupService._get_dataset(dataset_id)
+        definitions = RollupService._load_definitions(dataset.database_path)
+        result = []
+        with get_connection(dataset.database_path, readonly=True) as conn:
+            for definition in definitions:
+                count = conn.execute(f"SELECT COUNT(*) FROM {quote_identifier(definition['table_name'])}").fetchone()[0]
+                result.append(RollupService._public(definition, count))
+        return result
+
+    @staticmethod
+    def get_rollup(dataset_id: int, name: str) -> Optional[Dict]:
+        for rollup in RollupService.list_rollups(dataset_id):
+            if rollup['name'] == name:
+                return rollup
+        return None
+
+    @staticmethod
+    def drop_rollup(dataset_id: int, name: str) -> bool:
+        dataset = RollupService._get_dataset(dataset_id)
+        definition = next((d for d in RollupService._load_definitions(dataset.database_path)
+                           if d['name'] == name), None)
+        if not definition:
+            return False
+        rollup_table = definition['table_name']
+        with get_connection(dataset.database_path) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for suffix in ('__ai', '__ad', '__au'):
+                conn.execute(f"DROP TRIGGER IF EXISTS {quote_identifier(rollup_table + suffix)}")
+            for field, kinds in definition['stored'].items():
+                if 'min' in kinds or 'max' in kinds:
+                    conn.execute(f"DROP INDEX IF EXISTS {quote_identifier(f'{rollup_table}__{field}')}")
+            conn.execute(f"DROP TABLE IF EXISTS {quote_identifier(rollup_table)}")
+            conn.execute(f"DELETE FROM {quote_identifier(ROLLUPS_TABLE)} WHERE name = ?", (name,))
+            conn.commit()
+        return True
+
+    @staticmethod
+    def refresh_rollup(dataset_id: int, name: str) -> Optional[Dict]:
+        """从源表全量重建汇总表内容（触发器增量维护之外的修复手段）"""
+        dataset = RollupService._get_dataset(dataset_id)
+        definition = next((d for d in RollupService._load_definitions(dataset.database_path)
+                           if d['name'] == name), None)
+        if not definition:
+            return None
+        with get_connection(dataset.database_path) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(f"DELETE FROM {quote_identifier(definition['table_name'])}")
+            conn.execute(RollupService._build_sql(definition['table_name'], definition['source_table'],
+                                                  definition['dimensions'], definition['stored']))
+            conn.commit()
+        return RollupService.get_rollup(dataset_id, name)
+
+    @staticmethod
+    def _measure_expression(definition: Dict, func: str, field: str) -> Optional[str]:
+        """度量在汇总表上的二次聚合表达式，汇总表无法提供时返回None"""
+        if field == '*':
+            return f"COALESCE(SUM({quote_identifier(COUNT_COLUMN)}), 0)" if func == 'count' else None
+        if func == 'count_distinct':
+            # 维度字段的去重计数在汇总表上结果相同
+            return f"COUNT(DISTINCT {quote_identifier(field)})" if field in definition['dimensions'] else None
+        kinds = definition['stored'].get(field, [])
+        if not all(kind in kinds for kind in ROLLUP_MEASURE_COLUMNS.get(func, ('_',))):
+            return None
+        column = lambda kind: quote_identifier(_measure_column(field, kind))
+        if func == 'sum':
+            return f"SUM({column('sum')})"
+        if func == 'count':
+            return f"COALESCE(SUM({column('cnt')}), 0)"
+        if func == 'avg':
+            return f"CAST(SUM({column('sum')}) AS REAL) / NULLIF(SUM({column('cnt')}), 0)"
+        if func == 'min':
+            return f"MIN({column('min')})"
+        return f"MAX({column('max')})"
+
+    @staticmethod
+    def _dimension_types_match(catalog, definition: Dict) -> bool:
+        """汇总表维度列与源字段的声明类型一致
+
+        类型决定列亲和性：过滤参数 '2024' 与 INTEGER 列比较时先转换为整数，与无类型列比较时
+        按文本比较，类型不一致的汇总表（如早期创建的无类型维度列）会给出与源表不同的结果。
+        """
+        source = catalog.get_table(definition['source_table'])
+        rollup = catalog.get_table(definition['table_name'])
+        if not source or not rollup:
+            return False
+        source_types = {f['name'].lower(): (f['type'] or '').upper() for f in source.fields}
+        rollup_types = {f['name'].lower(): (f['type'] or '').upper() for f in rollup.fields}
+        return all(source_types.get(d.lower()) == rollup_types.get(d.lower())
+                   for d in definition['dimensions'])
+
+    @staticmethod
+    def match(database_path: str, table_name: str, dimensions: List[str], measures: List[Dict],
+              filter_fields: List[str]) -> Optional[Dict]:
+        """为聚合查询选择可用的汇总表
+
+        dimensions、measures 中的字段为源表中的实际字段名。维度和过滤字段都必须是汇总表的维度，
+        每个度量都必须能由汇总表的列计算。返回 {'rollup', 'table_name', 'measures': [表达式]}，
+        多个汇总表可用时选择维度最少（行数通常最少）的一个；维度列类型与源字段不一致的汇总表不参与匹配。
+        """
+        definitions = [d for d in RollupService._load_definitions(database_path)
+                       if d['source_table'].lower() == table_name.lower()]
+        if not definitions:
+            return None
+
+        catalog = get_schema_catalog(database_path)
+        best = None
+        for definition in definitions:
+            if not RollupService._dimension_types_match(catalog, definition):
+                continue
+            dims_lower = {d.lower() for d in definition['dimensions']}
+            if any(d.lower() not in dims_lower for d in dimensions):
+                continue
+            if any(f.lower() not in dims_lower for f in filter_fields):
+                continue
+            expressions = [RollupService._measure_expression(definition, m['func'], m['field'])
+                           for m in measures]
+            if any(e is None for e in expressions):
+                continue
+            if best is None or len(definition['dimensions']) < len(best[0]['dimensions']):
+                best = (definition, expressions)
+
+        if best is None:
+            return None
+        definition, expressions = best
+        return {
+            'rollup': definition['name'],
+            'table_name': definition['table_name'],
+            'measures': expressions,
+        }
@@ -0,0 +1,295 @@
+import math
+import threading
+from datetime import datetime
+from statistics import NormalDist
+from typing import Dict, List, Optional, Tuple
+from app.config import Config
+from app.db import (
+    RESERVED_TABLE_PREFIX, get_connection, get_schema_catalog, quote_identifier,
+)
+from app.models.dataset import Dataset
+
+# 样本定义保存在数据集数据库中，与样本表、触发器一起随数据库文件迁移
+SAMPLES_TABLE = RESERVED_TABLE_PREFIX + 'samples'
+SAMPLE_TABLE_PREFIX = RESERVED_TABLE_PREFIX + 'sample_'
+ROWID_COLUMN = '__rowid'
+
+# 按 rowid 的乘法散列决定一行是否进入样本：散列值小于阈值的行入样，入样概率为 阈值 / HASH_RANGE。
+# 同一行的判定结果是确定的，触发器因此可以在插入、删除、更新时精确维护样本。
+# 散列对 rowid 的低32位计算 (r * HASH_MULTIPLIER) mod HASH_RANGE，乘法按16位拆分，中间结果不超过2^48，
+# 不会溢出为REAL（SQLite整数乘法溢出时改用浮点数，散列值不再均匀）
+HASH_MULTIPLIER = 2654435761
+HASH_RANGE = 4294967296
+
+_definitions: Dict[str, Tuple[int, List[Dict]]] = {}
+_definitions_lock = threading.Lock()
+
+
+def _sample_hash(rowid: str) -> str:
+    # r = rowid & 0xFFFFFFFF（负数 rowid 按补码取低32位）；r * M = (r >> 16) * M * 2^16 + (r & 0xFFFF) * M
+    low = f"({rowid} & 4294967295)"
+    return (f"(((({low} >> 16) * {HASH_MULTIPLIER}) % 65536) * 65536 "
+            f"+ ({low} & 65535) * {HASH_MULTIPLIER}) % {HASH_RANGE}")
+
+
+def _sample_predicate(rowid: str, threshold: int) -> str:
+    return f"{_sample_hash(rowid)} < {int(threshold)}"
+
+
+def z_score() -> float:
+    """SAMPLE_CONFIDENCE 对应的双侧正态分位数"""
+    return NormalDist().inv_cdf((1 + Config.SAMPLE_CONFIDENCE) / 2)
+
+
+class SampleService:
+    """大表的样本表
+
+    每张源表最多一个样本表，保存按 rowid 散列抽取的伯努利样本（入样概率按目标样本行数
+    计算），由源表上的 INSERT/DELETE/UPDATE 触发器维护。近似查询在样本表上执行，
+    结果按入样概率放大，并给出置信区间。
+    """
+
+    @staticmethod
+    def _get_dataset(dataset_id: int) -> Dataset:
+        dataset = Dataset.get_by_id(dataset_id)
+        if not dataset:
+            raise ValueError(f"Dataset {dataset_id} not found")
+        return dataset
+
+    @staticmethod
+    def _threshold(source_rows: int, target_rows: int) -> int:
+        if source_rows <= target_rows:
+            return HASH_RANGE
+        return max(1, math.ceil(HASH_RANGE * target_rows / source_rows))
+
+    @staticmethod
+    def _create_triggers(conn, source_table: str, sample_table: str, columns: List[str], threshold: int):
+        source = quote_identifier(source_table)
+        sample = quote_identifier(sample_table)
+        column_list = ', '.join(quote_identifier(c) for c in columns)
+        new_values = ', '.join(f"NEW.{quote_identifier(c)}" for c in columns)
+        insert_body = (f"INSERT INTO {sample} ({quote_identifier(ROWID_COLUMN)}, {column_list}) "
+                       f"SELECT NEW.rowid, {new_values} WHERE {_sample_predicate('NEW.rowid', threshold)};")
+        delete_body = f"DELETE FROM {sample} WHERE {quote_identifier(ROWID_COLUMN)} = OLD.rowid;"
+        conn.execute(f"CREATE TRIGGER {quote_identifier(sample_table + '__ai')} AFTER INSERT ON {source} "
+                     f"BEGIN\n{insert_body}\nEND")
+        conn.execute(f"CREATE TRIGGER {quote_identifier(sample_table + '__ad')} AFTER DELETE ON {source} "
+                     f"BEGIN\n{delete_body}\nEND")
+        conn.execute(f"CREATE TRIGGER {quote_identifier(sample_table + '__au')} AFTER UPDATE ON {source} "
+                     f"BEGIN\n{delete_body}\n{insert_body}\nEND")
+
+    @staticmethod
+    def _drop_triggers(conn, sample_table: str):
+        for suffix in ('__ai', '__ad', '__au'):
+            conn.execute(f"DROP TRIGGER IF EXISTS {quote_identifier(sample_table + suffix)}")
+
+    @staticmethod
+    def _fill(conn, source_table: str, sample_table: str, columns: List[str], threshold: int):
+        column_list = ', '.join(quote_identifier(c) for c in columns)
+        conn.execute(f"INSERT INTO {quote_identifier(sample_table)} ({quote_identifier(ROWID_COLUMN)}, {column_list}) "
+                     f"SELECT rowid, {column_list} FROM {quote_identifier(source_table)} "
+                     f"WHERE {_sample_predicate('rowid', threshold)}")
+
+    @staticmethod
+    def create_sample(dataset_id: int, table_name: str, target_rows: int = None) -> Dict:
+        """为源表创建样本表：建表、抽样、创建维护触发器，在同一个事务中完成"""
+        dataset = SampleService._get_dataset(dataset_id)
+        target_rows = int(target_rows or Config.SAMPLE_TARGET_ROWS)
+        if target_rows <= 0:
+            raise ValueError("target_rows must be positive")
+
+        table = get_schema_catalog(dataset.database_path).get_table(table_name)
+        if not table or table.internal:
+            raise ValueError(f"Table {table_name} not found")
+        if table.without_rowid:
+            raise ValueError(f"Table {table.name} is a WITHOUT ROWID table and cannot be sampled")
+
+        sample_table = SAMPLE_TABLE_PREFIX + table.name
+        columns = [field['name'] for field in table.fields]
+        column_defs = [f"{quote_identifier(ROWID_COLUMN)} INTEGER PRIMARY KEY"]
+        column_defs += [f"{quote_identifier(field['name'])} {field['type'] or ''}".rstrip() for field in table.fields]
+
+        with get_connection(dataset.database_path) as conn:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(f'''
+                    CREATE TABLE IF NOT EXISTS {quote_identifier(SAMPLES_TABLE)} (
+                        source_table TEXT PRIMARY KEY,
+                        table_name TEXT NOT NULL,
+                        columns TEXT NOT NULL,
+                        threshold INTEGER NOT NULL,
+                        target_rows INTEGER NOT NULL,
+                        source_rows INTEGER NOT NULL,
+                        created_at DATETIME,
+                        refreshed_at DATETIME
+                    )
+                ''')
+                exists = conn.execute(f"SELECT 1 FROM {quote_identifier(SAMPLES_TABLE)} WHERE source_table = ?",
+                                      (table.name,)).fetchone()
+                if exists:
+                    raise ValueError(f"Table {table.name} already has a sample")
+                source_rows = conn.execute(f"SELECT COUNT(*) FROM {quote_identifier(table.name)}").fetchone()[0]
+                threshold = SampleService._threshold(source_rows, target_rows)
+                conn.execute(f"CREATE TABLE {quote_identifier(sample_table)} ({', '.join(column_defs)})")
+                SampleService._fill(conn, table.name, sample_table, columns, threshold)
+                SampleService._create_triggers(conn, table.name, sample_table, columns, threshold)
+                now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                conn.execute(f'''
+                    INSERT INTO {quote_identifier(SAMPLES_TABLE)}
+                        (source_table, table_name, columns, threshold, target_rows, source_rows, created_at, refreshed_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (table.name, sample_table, '\n'.join(columns), threshold, target_rows, source_rows, now, now))
+                conn.commit()
+            except ValueError:
+                raise
+            except Exception as e:
+                raise ValueError(f"Failed to create sample: {str(e)}")
+
+        return SampleService.get_sample(dataset_id, table.name)
+
+    @staticmethod
+    def _load_definitions(database_path: str) -> List[Dict]:
+        """读取数据集的样本定义，按 schema_version 缓存（创建、删除或重建样本都会改变schema）"""
+        catalog = get_schema_catalog(database_path)
+        if not catalog.get_table(SAMPLES_TABLE):
+            return []
+        cached = _definitions.get(catalog.database_path)
+        if cached is not None and cached[0] == catalog.schema_version:
+            return cached[1]
+
+        with get_connection(database_path, readonly=True) as conn:
+            rows = conn.execute(f'''
+                SELECT source_table, table_name, columns, threshold, target_rows, source_rows,
+                       created_at, refreshed_at
+                FROM {quote_identifier(SAMPLES_TABLE)}
+                ORDER BY source_table
+            ''').fetchall()
+        definitions = [{
+            'source_table': row['source_table'],
+            'table_name': row['table_name'],
+            'columns': row['columns'].split('\n'),
+            'threshold': row['threshold'],
+            'rate': row['threshold'] / HASH_RANGE,
+            'target_rows': row['target_rows'],
+            'source_rows': row['source_rows'],
+            'created_at': row['created_at'],
+            'refreshed_at': row['refreshed_at'],
+        } for row in rows]
+        with _definitions_lock:
+            _definitions[catalog.database_path] = (catalog.schema_version, definitions)
+        return definitions
+
+    @staticmethod
+    def _public(definition: Dict, sample_rows: int = None) -> Dict:
+        result = {k: v for k, v in definition.items() if k not in ('columns', 'threshold')}
+        if sample_rows is not None:
+            result['sample_rows'] = sample_rows
+        return result
+
+    @staticmethod
+    def list_samples(dataset_id: int) -> List[Dict]:
+        dataset = SampleService._get_dataset(dataset_id)
+        definitions = SampleService._load_definitions(dataset.database_path)
+        result = []
+        with get_connection(dataset.database_path, readonly=True) as conn:
+            for definition in definitions:
+                count = conn.execute(f"SELECT COUNT(*) FROM {quote_identifier(definition['table_name'])}").fetchone()[0]
+                result.append(SampleService._public(definition, count))
+        return result
+
+    @staticmethod
+    def get_sample(dataset_id: int, table_name: str) -> Optional[Dict]:
+        for sample in SampleService.list_samples(dataset_id):
+            if sample['source_table'].lower() == table_name.lower():
+                return sample
+        return None
+
+    @staticmethod
+    def _find(database_path: str, table_name: str) -> Optional[Dict]:
+        return next((d for d in SampleService._load_definitions(database_path)
+                     if d['source_table'].lower() == table_name.lower()), None)
+
+    @staticmethod
+    def drop_sample(dataset_id: int, table_name: str) -> bool:
+        dataset = SampleService._get_dataset(dataset_id)
+        definition = SampleService._find(dataset.database_path, table_name)
+        if not definition:
+            return False
+        with get_connection(dataset.database_path) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            SampleService._drop_triggers(conn, definition['table_name'])
+            conn.execute(f"DROP TABLE IF EXISTS {quote_identifier(definition['table_name'])}")
+            conn.execute(f"DELETE FROM {quote_identifier(SAMPLES_TABLE)} WHERE source_table = ?",
+                         (definition['source_table'],))
+            conn.commit()
+        return True
+
+    @staticmethod
+    def refresh_sample(dataset_id: int, table_name: str, target_rows: int = None) -> Optional[Dict]:
+        """按源表当前行数重新计算入样概率并重新抽样
+
+        入样概率在创建时固定，源表持续增长后样本会按比例变大，定期重建可使样本回到目标行数。
+        """
+        dataset = SampleService._get_dataset(dataset_id)
+        definition = SampleService._find(dataset.database_path, table_name)
+        if not definition:
+            return None
+        target_rows = int(target_rows or definition['target_rows'])
+        if target_rows <= 0:
+            raise ValueError("target_rows must be positive")
+        source_table, sample_table, columns = (definition['source_table'], definition['table_name'],
+                                               definition['columns'])
+        with get_connection(dataset.database_path) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            source_rows = conn.execute(f"SELECT COUNT(*) FROM {quote_identifier(source_table)}").fetchone()[0]
+            threshold = SampleService._threshold(source_rows, target_rows)
+            SampleService._drop_triggers(conn, sample_table)
+            conn.execute(f"DELETE FROM {quote_identifier(sample_table)}")
+            SampleService._fill(conn, source_table, sample_table, columns, threshold)
+            SampleService._create_triggers(conn, source_table, sample_table, columns, threshold)
+            conn.execute(f'''
+                UPDATE {quote_identifier(SAMPLES_TABLE)}
+                SET threshold = ?, target_rows = ?, source_rows = ?, refreshed_at = ?
+                WHERE source_table = ?
+            ''', (threshold, target_rows, source_rows, datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                  source_table))
+            conn.commit()
+        return SampleService.get_sample(dataset_id, source_table)
+
+    @staticmethod
+    def match(database_path: str, table_name: str, fields: List[str]) -> Optional[Dict]:
+        """返回能满足查询的样本定义：样本表需包含 fields 中的全部字段（源表新增的列不在样本中）"""
+        definition = SampleService._find(database_path, table_name)
+        if not definition:
+            return None
+        columns = {c.lower() for c in definition['columns']}
+        if any(field.lower() not in columns for field in fields if field and field != '*'):
+            return None
+        return definition
+
+    @staticmethod
+    def estimate(func: str, rate: float, value, sum_squares: float = None,
+                 count: int = None) -> Tuple[object, Optional[List[float]]]:
+        """由样本上的聚合值估计全表的值，返回 (估计值, 置信区间)
+
+        count/sum 为 Horvitz-Thompson 估计（样本值除以入样概率），方差按伯努利抽样计算；
+        avg 为样本均值，方差含有限总体修正 (1 - rate)。min/max/count_distinct 无法由样本
+        无偏估计，返回样本上的值且区间为None。
+        """
+        if func == 'count':
+            if value is None:
+                return value, None
+            half = z_score() * math.sqrt((1 - rate) * value) / rate
+            return round(value / rate), [max(0.0, value / rate - half), value / rate + half]
+        if func == 'sum':
+            if value is None or sum_squares is None:
+                return value, None
+            half = z_score() * math.sqrt(max(0.0, (1 - rate) * sum_squares)) / rate
+            return value / rate, [value / rate - half, value / rate + half]
+        if func == 'avg':
+            if value is None or not count or count < 2 or sum_squares is None:
+                return value, None
+            variance = max(0.0, (sum_squares - count * value * value) / (count - 1))
+            half = z_score() * math.sqrt((1 - rate) * variance / count)
+            return value, [value - half, value + half]
+        return value, None
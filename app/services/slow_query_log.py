@@ -0,0 +1,194 @@
+import re
+import sqlite3
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from app.config import Config
+from app.services.query_cache import normalize_sql
+
+
+def fingerprint_sql(sql: str) -> str:
+    """把SQL中的字符串和数值字面量替换为?，用于按语句聚合"""
+    sql = normalize_sql(sql)
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    return sql
+
+
+def _params_shape(params: List[Any]) -> List[str]:
+    # 只记录参数类型，不记录参数值
+    return [type(value).__name__ for value in params or []]
+
+
+class SlowQueryLog:
+    """慢查询记录
+
+    超过阈值的查询保存在定长环形缓冲区中，可选同时写入旁路SQLite文件。
+    EXPLAIN QUERY PLAN 和旁路文件写入在后台线程中完成，不增加请求耗时；
+    未超过阈值的查询只有一次比较的开销。
+    """
+
+    def __init__(self, threshold_ms: float, capacity: int, sidecar_path: str = None):
+        self.threshold_ms = threshold_ms
+        self.capacity = capacity
+        self.sidecar_path = sidecar_path
+        self._entries = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slow-query-log')
+        self._sidecar: Optional[sqlite3.Connection] = None
+        self._next_id = 1
+        self._recorded = 0
+
+    def observe(self, database_path: str, dataset_id: int, table_name: Optional[str], sql: str,
+                params: List[Any], duration: float, rows: int, source: str):
+        """记录一次查询的耗时（秒），超过阈值时写入慢查询日志"""
+        duration_ms = duration * 1000
+        if duration_ms < self.threshold_ms:
+            return
+        entry = {
+            'dataset_id': dataset_id,
+            'table_name': table_name,
+            'source': source,
+            'sql': normalize_sql(sql),
+            'fingerprint': fingerprint_sql(sql),
+            'params_shape': _params_shape(params),
+            'duration_ms': round(duration_ms, 3),
+            'rows': rows,
+            'plan': None,
+            'recorded_at': datetime.now().isoformat(),
+        }
+        with self._lock:
+            entry['id'] = self._next_id
+            self._next_id += 1
+            self._recorded += 1
+            self._entries.append(entry)
+        self._executor.submit(self._capture, database_path, entry, list(params or []))
+
+    @staticmethod
+    def _explain(database_path, sql: str, params: List[Any]) -> List[str]:
+        # 使用单独的只读连接，避免池化连接的语句缓存返回过期的执行计划；
+        # 跨数据集查询的 database_path 为 {别名: 数据库路径}，按相同别名附加后再解释
+        if isinstance(database_path, dict):
+            conn = sqlite3.connect('file::memory:', uri=True)
+            for alias, path in database_path.items():
+                conn.execute(f'ATTACH DATABASE ? AS "{alias}"', ('file:' + str(path).replace('\\', '/') + '?mode=ro',))
+        else:
+            conn = sqlite3.connect('file:' + str(database_path).replace('\\', '/') + '?mode=ro', uri=True)
+        try:
+            rows = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+            return [row[3] for row in rows]
+        finally:
+            conn.close()
+
+    def _capture(self, database_path: str, entry: Dict, params: List[Any]):
+        try:
+            entry['plan'] = self._explain(database_path, entry['sql'], params)
+        except Exception as e:
+            entry['plan'] = [f"EXPLAIN failed: {e}"]
+        if self.sidecar_path:
+            try:
+                self._write_sidecar(entry)
+            except sqlite3.Error:
+                pass
+
+    def _write_sidecar(self, entry: Dict):
+        # 只在后台线程中访问，不需要加锁
+        if self._sidecar is None:
+            self._sidecar = sqlite3.connect(str(self.sidecar_path), check_same_thread=False)
+            self._sidecar.execute("PRAGMA journal_mode = WAL")
+            self._sidecar.execute('''
+                CREATE TABLE IF NOT EXISTS slow_queries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    recorded_at TEXT NOT NULL,
+                    dataset_id INTEGER,
+                    table_name TEXT,
+                    source TEXT,
+                    sql TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    params_shape TEXT,
+                    duration_ms REAL NOT NULL,
+                    rows INTEGER,
+                    plan TEXT
+                )
+            ''')
+            self._sidecar.execute(
+                "CREATE INDEX IF NOT EXISTS idx_slow_queries_fingerprint ON slow_queries (fingerprint)")
+        self._sidecar.execute('''
+            INSERT INTO slow_queries (recorded_at, dataset_id, table_name, source, sql, fingerprint,
+                                      params_shape, duration_ms, rows, plan)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (entry['recorded_at'], entry['dataset_id'], entry['table_name'], entry['source'],
+              entry['sql'], entry['fingerprint'], ','.join(entry['params_shape']),
+              entry['duration_ms'], entry['rows'], '\n'.join(entry['plan'] or [])))
+        self._sidecar.commit()
+
+    def _snapshot(self, dataset_id: int = None) -> List[Dict]:
+        with self._lock:
+            entries = list(self._entries)
+        return [dict(entry) for entry in entries if dataset_id is None or entry['dataset_id'] == dataset_id]
+
+    def entries(self, dataset_id: int = None, limit: int = 100) -> List[Dict]:
+        """最近的慢查询，新的在前"""
+        entries = self._snapshot(dataset_id)
+        entries.reverse()
+        return entries[:limit]
+
+    def statements(self, dataset_id: int = None) -> List[Dict]:
+        """按规范化语句聚合，按总耗时从高到低排列"""
+        groups: Dict[tuple, Dict] = {}
+        for entry in self._snapshot(dataset_id):
+            key = (entry['dataset_id'], entry['fingerprint'])
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = {
+                    'dataset_id': entry['dataset_id'],
+                    'table_name': entry['table_name'],
+                    'source': entry['source'],
+                    'fingerprint': entry['fingerprint'],
+                    'count': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'rows': 0,
+                    'durations': [],
+                }
+            group['count'] += 1
+            group['total_ms'] += entry['duration_ms']
+            group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+            group['rows'] += entry['rows'] or 0
+            group['durations'].append(entry['duration_ms'])
+            # 保留最近一次的SQL、参数形态和执行计划
+            group['last_seen'] = entry['recorded_at']
+            group['example_sql'] = entry['sql']
+            group['params_shape'] = entry['params_shape']
+            group['plan'] = entry['plan']
+
+        result = []
+        for group in groups.values():
+            durations = sorted(group.pop('durations'))
+            group['avg_ms'] = round(group['total_ms'] / group['count'], 3)
+            group['p95_ms'] = durations[min(int(len(durations) * 0.95), len(durations) - 1)]
+            group['avg_rows'] = round(group.pop('rows') / group['count'], 1)
+            group['total_ms'] = round(group['total_ms'], 3)
+            result.append(group)
+        result.sort(key=lambda item: -item['total_ms'])
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'threshold_ms': self.threshold_ms,
+                'capacity': self.capacity,
+                'entries': len(self._entries),
+                'recorded': self._recorded,
+                'sidecar_path': str(self.sidecar_path) if self.sidecar_path else None,
+            }
+
+
+slow_query_log = SlowQueryLog(Config.SLOW_QUERY_THRESHOLD_MS, Config.SLOW_QUERY_LOG_SIZE,
+                              Config.SLOW_QUERY_LOG_PATH)
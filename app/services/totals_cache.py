@@ -0,0 +1,54 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+from app.config import Config
+
+
+class TotalsCache:
+    """get_table_data 中 COUNT(*) 结果的LRU缓存
+
+    每个条目记录计算时数据集的数据版本（get_data_version），任何进程写入数据集后条目自动失效。
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Hashable, Tuple[Hashable, int, bool]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, version: Hashable) -> Optional[Tuple[int, bool]]:
+        """返回 (total, approximate)，未命中或已过期时返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key: Hashable, version: Hashable, total: int, approximate: bool = False):
+        with self._lock:
+            self._entries[key] = (version, total, approximate)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+totals_cache = TotalsCache(Config.TOTALS_CACHE_SIZE)
@@ -0,0 +1,76 @@
+import threading
+import time
+from datetime import datetime
+from typing import Dict
+from app.config import Config
+from app.db import get_pool, get_schema_catalog, system_connection
+from app.models.dataset import Dataset
+from app.models.report import Report
+from app.services.report_data_service import ReportDataService
+from app.services.report_views import report_views
+
+_state_lock = threading.Lock()
+_state: Dict = {
+    'status': 'pending',
+    'started_at': None,
+    'finished_at': None,
+    'duration_ms': None,
+    'datasets': 0,
+    'reports': [],
+    'errors': [],
+}
+
+
+class WarmupService:
+    @staticmethod
+    def warm_up() -> Dict:
+        """预热当前进程：打开系统库和各数据集的连接池、加载结构目录，并执行访问最多的报表的默认查询
+
+        预热期间就绪检查返回未就绪；单个数据集或报表失败只记录错误，不影响其余部分。
+        """
+        started = time.perf_counter()
+        with _state_lock:
+            _state.update(status='warming', started_at=datetime.now().isoformat(), finished_at=None,
+                          duration_ms=None, datasets=0, reports=[], errors=[])
+        errors = []
+
+        with system_connection(readonly=True) as conn:
+            conn.execute('SELECT 1').fetchone()
+        Report.ensure_schema()
+
+        datasets = Dataset.get_all()
+        for dataset in datasets:
+            try:
+                pool = get_pool(dataset.database_path, readonly=True)
+                # 同时借出多个连接，让连接池预先建好这些连接
+                conns = [pool.acquire() for _ in range(min(Config.WARMUP_CONNECTIONS, pool.max_size))]
+                for conn in conns:
+                    pool.release(conn)
+                get_schema_catalog(dataset.database_path)
+            except Exception as e:
+                errors.append(f"dataset {dataset.id}: {e}")
+
+        warmed_reports = []
+        for item in report_views.top(Config.WARMUP_REPORTS) if Config.WARMUP_REPORTS else []:
+            try:
+                # 使用报表的默认组件值，结果进入查询缓存和总数缓存
+                if ReportDataService.get_report_data(item['report_id']) is not None:
+                    warmed_reports.append(item['report_id'])
+            except Exception as e:
+                errors.append(f"report {item['report_id']}: {e}")
+
+        with _state_lock:
+            _state.update(status='ready', finished_at=datetime.now().isoformat(),
+                          duration_ms=round((time.perf_counter() - started) * 1000, 1),
+                          datasets=len(datasets), reports=warmed_reports, errors=errors)
+            return dict(_state)
+
+    @staticmethod
+    def get_state() -> Dict:
+        with _state_lock:
+            return dict(_state)
+
+    @staticmethod
+    def is_ready() -> bool:
+        with _state_lock:
+            return _state['status'] == 'ready'
@@ -52,20 +52,20 @@ const ChartComponent: React.FC<ChartComponentProps> = ({ component, allComponent
               if (sourceComponent) {
                 // 对于下拉列表，value和selectedValue都指向同一个值
                 if (sourceComponent.type === 'dropdown' && (field === 'value' || field === 'selectedValue')) {
-                  value = (sourceComponent.props as any)?.value || null
+                  value = (sourceComponent.props as any)?.value ?? null
                 } else if (sourceComponent.type === 'tree_chart') {
                   // 对于树图，支持 selectedNodePath 字段
                   if (field === 'selectedNodePath') {
-                    value = (sourceComponent.props as any)?.selectedNodePath || null
+                    value = (sourceComponent.props as any)?.selectedNodePath ?? null
                   } else if (field === 'selectedNode' || field === 'value') {
                     // 返回选中路径的最后一个节点名称
                     const path = (sourceComponent.props as any)?.selectedNodePath || []
                     value = path.length > 0 ? path[path.length - 1] : null
                   } else {
-                    value = (sourceComponent.props as any)?.[field] || null
+                    value = (sourceComponent.props as any)?.[field] ?? null
                   }
                 } else {
-                  value = (sourceComponent.props as any)?.[field] || null
+                  value = (sourceComponent.props as any)?.[field] ?? null
                 }
               }
             }
@@ -89,20 +89,20 @@ const ChartComponent: React.FC<ChartComponentProps> = ({ component, allComponent
         if (sourceComponent) {
           // 对于下拉列表，value和selectedValue都指向同一个值
           if (sourceComponent.type === 'dropdown' && (sourceField === 'value' || sourceField === 'selectedValue')) {
-            linkageValue = (sourceComponent.props as any)?.value || null
+            linkageValue = (sourceComponent.props as any)?.value ?? null
           } else if (sourceComponent.type === 'tree_chart') {
             // 对于树图，支持 selectedNodePath 字段
             if (sourceField === 'selectedNodePath') {
-              linkageValue = (sourceComponent.props as any)?.selectedNodePath || null
+              linkageValue = (sourceComponent.props as any)?.selectedNodePath ?? null
             } else if (sourceField === 'selectedNode' || sourceField === 'value') {
               // 返回选中路径的最后一个节点名称
               const path = (sourceComponent.props as any)?.selectedNodePath || []
               linkageValue = path.length > 0 ? path[path.length - 1] : null
             } else {
-              linkageValue = (sourceComponent.props as any)?.[sourceField] || null
+              linkageValue = (sourceComponent.props as any)?.[sourceField] ?? null
             }
           } else {
-            linkageValue = (sourceComponent.props as any)?.[sourceField] || null
+            linkageValue = (sourceComponent.props as any)?.[sourceField] ?? null
           }
         }
       }
@@ -225,20 +225,20 @@ const ChartComponent: React.FC<ChartComponentProps> = ({ component, allComponent
           if (sourceComponent) {
             // 对于下拉列表，value和selectedValue都指向同一个值
             if (sourceComponent.type === 'dropdown' && (sourceField === 'value' || sourceField === 'selectedValue')) {
-              linkageValue = (sourceComponent.props as any)?.value || null
+              linkageValue = (sourceComponent.props as any)?.value ?? null
             } else if (sourceComponent.type === 'tree_chart') {
               // 对于树图，支持 selectedNodePath 字段
               if (sourceField === 'selectedNodePath') {
-                linkageValue = (sourceComponent.props as any)?.selectedNodePath || null
+                linkageValue = (sourceComponent.props as any)?.selectedNodePath ?? null
               } else if (sourceField === 'selectedNode' || sourceField === 'value') {
                 // 返回选中路径的最后一个节点名称
                 const path = (sourceComponent.props as any)?.selectedNodePath || []
                 linkageValue = path.length > 0 ? path[path.length - 1] : null
               } else {
-                linkageValue = (sourceComponent.props as any)?.[sourceField] || null
+                linkageValue = (sourceComponent.props as any)?.[sourceField] ?? null
               }
             } else {
-              linkageValue = (sourceComponent.props as any)?.[sourceField] || null
+              linkageValue = (sourceComponent.props as any)?.[sourceField] ?? null
             }
           }
         }
@@ -324,11 +324,24 @@ const ChartComponent: React.FC<ChartComponentProps> = ({ component, allComponent
         }
       }
       
-      const result = await dataService.getTableData({
-        dataset_id: datasetId,
-        table_name: tableName, // tableName 现在是可选的
-        filters: filters,
-      })
+      // 字段映射完整时由服务端按维度分组聚合，只返回图表需要的分组结果；
+      // 维度和度量以原字段名作为别名，渲染代码按字段映射取值不受影响
+      const aggregateRequest = buildAggregateRequest(
+        currentSelectedFields || component.dataSource.fields || {},
+        currentDrillDownState.level,
+      )
+      const result = aggregateRequest
+        ? await dataService.aggregate({
+            dataset_id: datasetId,
+            table_name: tableName,
+            filters: filters,
+            ...aggregateRequest,
+          })
+        : await dataService.getTableData({
+            dataset_id: datasetId,
+            table_name: tableName, // tableName 现在是可选的
+            filters: filters,
+          })
       
       // 如果返回了自动选择的表名，更新组件配置，以便字段配置可以正确显示
       if (result.table_name && !tableName && onComponentValueChange) {
@@ -359,6 +372,39 @@ const ChartComponent: React.FC<ChartComponentProps> = ({ component, allComponent
     }
   }
 
+  // 当前钻取层级对应的维度字段，未配置钻取维度时使用 fallback 字段
+  const getDrillField = (level: number, fallback?: string): string | undefined => {
+    const dimensions = component.interaction?.drillDown?.dimensions
+    if (level === 0) return dimensions?.level1 || fallback
+    if (level === 1) return dimensions?.level2 || fallback
+    return dimensions?.level3 || fallback
+  }
+
+  // 根据图表类型和字段映射构建聚合请求，字段映射不完整或组件不需要聚合时返回null
+  const buildAggregateRequest = (fields: Record<string, string>, level: number): {
+    dimensions: string[]
+    measures: Array<{ field: string, func: 'sum', alias: string }>
+  } | null => {
+    const sumOf = (field: string) => [{ field, func: 'sum' as const, alias: field }]
+    switch (component.type) {
+      case 'line_chart': {
+        const dimension = getDrillField(level, fields.x)
+        return dimension && fields.y ? { dimensions: [dimension], measures: sumOf(fields.y) } : null
+      }
+      case 'pie_chart': {
+        const dimension = getDrillField(level, fields.category)
+        return dimension && fields.value ? { dimensions: [dimension], measures: sumOf(fields.value) } : null
+      }
+      case 'tree_chart':
+        return fields.name && fields.value ? { dimensions: [fields.name], measures: sumOf(fields.value) } : null
+      case 'dropdown':
+        // 只需要去重后的选项值
+        return fields.option ? { dimensions: [fields.option], measures: [] } : null
+      default:
+        return null
+    }
+  }
+
   // 评估条件数据源，返回匹配的数据源配置（包括字段映射）
   const evaluateConditionalSource = (comp: ComponentConfig): { datasetId: number, tableName?: string, fields?: Record<string, string> } | null => {
     if (comp.dataSource.type !== 'conditional' || !comp.dataSource.conditionalSources) {
@@ -390,20 +436,20 @@ const ChartComponent: React.FC<ChartComponentProps> = ({ component, allComponent
             if (sourceComponent) {
               // 对于下拉列表，value和selectedValue都指向同一个值
               if (sourceComponent.type === 'dropdown' && (field === 'value' || field === 'selectedValue')) {
-                conditionValue = (sourceComponent.props as any)?.value || null
+                conditionValue = (sourceComponent.props as any)?.value ?? null
               } else if (sourceComponent.type === 'tree_chart') {
                 // 对于树图，支持 selectedNodePath 字段
                 if (field === 'selectedNodePath') {
-                  conditionValue = (sourceComponent.props as any)?.selectedNodePath || null
+                  conditionValue = (sourceComponent.props as any)?.selectedNodePath ?? null
                 } else if (field === 'selectedNode' || field === 'value') {
                   // 返回选中路径的最后一个节点名称
                   const path = (sourceComponent.props as any)?.selectedNodePath || []
                   conditionValue = path.length > 0 ? path[path.length - 1] : null
                 } else {
-                  conditionValue = (sourceComponent.props as any)?.[field] || null
+                  conditionValue = (sourceComponent.props as any)?.[field] ?? null
                 }
               } else {
-                conditionValue = (sourceComponent.props as any)?.[field] || null
+                conditionValue = (sourceComponent.props as any)?.[field] ?? null
               }
             }
           }
@@ -646,11 +692,7 @@ const ChartComponent: React.FC<ChartComponentProps> = ({ component, allComponent
     switch (component.type) {
       case 'line_chart':
         // 确定当前钻取层级对应的维度字段
-        const lineDrillField = drillDownState.level === 0 
-          ? (component.interaction?.drillDown?.dimensions?.level1 || fields.x)
-          : drillDownState.level === 1
-          ? (component.interaction?.drillDown?.dimensions?.level2 || fields.x)
-          : (component.interaction?.drillDown?.dimensions?.level3 || fields.x)
+        const lineDrillField = getDrillField(drillDownState.level, fields.x) as string
         
         return (
           <div style={{ height: '100%', width: '100%', position: 'relative' }}>
@@ -712,11 +754,7 @@ const ChartComponent: React.FC<ChartComponentProps> = ({ component, allComponent
       
       case 'pie_chart':
         // 确定当前钻取层级对应的维度字段
-        const pieDrillField = drillDownState.level === 0 
-          ? (component.interaction?.drillDown?.dimensions?.level1 || fields.category)
-          : drillDownState.level === 1
-          ? (component.interaction?.drillDown?.dimensions?.level2 || fields.category)
-          : (component.interaction?.drillDown?.dimensions?.level3 || fields.category)
+        const pieDrillField = getDrillField(drillDownState.level, fields.category) as string
         
         return (
           <div style={{ height: '100%', width: '100%', position: 'relative' }}>
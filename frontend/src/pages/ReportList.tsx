@@ -1,24 +1,44 @@
 import React, { useEffect, useState } from 'react'
 import { useNavigate } from 'react-router-dom'
-import { Table, Button, Space, message } from 'antd'
+import { Table, Button, Space, Input, message } from 'antd'
+import type { TablePaginationConfig } from 'antd'
+import type { SorterResult } from 'antd/es/table/interface'
 import { PlusOutlined, EditOutlined, DeleteOutlined, DatabaseOutlined, EyeOutlined } from '@ant-design/icons'
 import { reportService } from '../services/reportService'
-import type { Report } from '../types'
+import type { ReportSummary } from '../types'
+
+const PAGE_SIZE = 20
 
 const ReportList: React.FC = () => {
   const navigate = useNavigate()
-  const [reports, setReports] = useState<Report[]>([])
+  const [reports, setReports] = useState<ReportSummary[]>([])
+  const [total, setTotal] = useState(0)
+  const [page, setPage] = useState(1)
+  const [pageSize, setPageSize] = useState(PAGE_SIZE)
+  const [sort, setSort] = useState<{ field: 'updated_at' | 'created_at' | 'name' | 'id'; order: 'asc' | 'desc' }>({
+    field: 'updated_at',
+    order: 'desc',
+  })
+  const [search, setSearch] = useState('')
   const [loading, setLoading] = useState(false)
 
   useEffect(() => {
     loadReports()
-  }, [])
+  }, [page, pageSize, sort, search])
 
+  // 服务端分页：只获取当前页的报表摘要
   const loadReports = async () => {
     setLoading(true)
     try {
-      const data = await reportService.getReports()
-      setReports(data)
+      const result = await reportService.getReports({
+        limit: pageSize,
+        offset: (page - 1) * pageSize,
+        sort: sort.field,
+        order: sort.order,
+        search: search || undefined,
+      })
+      setReports(result.data)
+      setTotal(result.total)
     } catch (error) {
       message.error('加载报表列表失败')
     } finally {
@@ -26,6 +46,24 @@ const ReportList: React.FC = () => {
     }
   }
 
+  const handleTableChange = (
+    pagination: TablePaginationConfig,
+    _filters: any,
+    sorter: SorterResult<ReportSummary> | SorterResult<ReportSummary>[]
+  ) => {
+    const current = Array.isArray(sorter) ? sorter[0] : sorter
+    if (current && current.order && current.field) {
+      setSort({
+        field: current.field as 'updated_at' | 'created_at' | 'name' | 'id',
+        order: current.order === 'ascend' ? 'asc' : 'desc',
+      })
+    } else {
+      setSort({ field: 'updated_at', order: 'desc' })
+    }
+    setPage(pagination.current || 1)
+    setPageSize(pagination.pageSize || PAGE_SIZE)
+  }
+
   const handleDelete = async (id: number) => {
     try {
       await reportService.deleteReport(id)
@@ -41,12 +79,14 @@ const ReportList: React.FC = () => {
       title: 'ID',
       dataIndex: 'id',
       key: 'id',
+      sorter: true,
       width: 80,
     },
     {
       title: '报表名称',
       dataIndex: 'name',
       key: 'name',
+      sorter: true,
     },
     {
       title: '描述',
@@ -57,11 +97,12 @@ const ReportList: React.FC = () => {
       title: '创建时间',
       dataIndex: 'created_at',
       key: 'created_at',
+      sorter: true,
     },
         {
           title: '操作',
           key: 'action',
-          render: (_: any, record: Report) => (
+          render: (_: any, record: ReportSummary) => (
             <Space>
               <Button
                 type="link"
@@ -95,6 +136,15 @@ const ReportList: React.FC = () => {
       <div style={{ marginBottom: '16px', display: 'flex', justifyContent: 'space-between' }}>
         <h1>报表列表</h1>
         <Space>
+          <Input.Search
+            placeholder="搜索报表名称"
+            allowClear
+            onSearch={(value) => {
+              setPage(1)
+              setSearch(value.trim())
+            }}
+            style={{ width: 240 }}
+          />
           <Button
             icon={<DatabaseOutlined />}
             onClick={() => navigate('/database')}
@@ -115,6 +165,8 @@ const ReportList: React.FC = () => {
         dataSource={reports}
         loading={loading}
         rowKey="id"
+        pagination={{ current: page, pageSize, total, showSizeChanger: true }}
+        onChange={handleTableChange}
       />
     </div>
   )
@@ -57,13 +57,13 @@ const ReportPreview: React.FC = () => {
     
     // 对于下拉列表，value和selectedValue都指向同一个值
     if (comp.type === 'dropdown' && (fieldName === 'value' || fieldName === 'selectedValue')) {
-      return (comp.props as any)?.value || null
+      return (comp.props as any)?.value ?? null
     }
     
     // 对于树图，支持 selectedNodePath 字段
     if (comp.type === 'tree_chart') {
       if (fieldName === 'selectedNodePath') {
-        return (comp.props as any)?.selectedNodePath || null
+        return (comp.props as any)?.selectedNodePath ?? null
       } else if (fieldName === 'selectedNode' || fieldName === 'value') {
         // 返回选中路径的最后一个节点名称
         const path = (comp.props as any)?.selectedNodePath || []
@@ -72,7 +72,7 @@ const ReportPreview: React.FC = () => {
     }
     
     // 对于其他组件或字段，直接返回对应字段的值
-    return (comp.props as any)?.[fieldName] || null
+    return (comp.props as any)?.[fieldName] ?? null
   }, [components])
 
   if (loading) {
@@ -1,9 +1,56 @@
 import axios from 'axios'
+import type { AxiosResponse, InternalAxiosRequestConfig } from 'axios'
 
 const api = axios.create({
   baseURL: '/api',
   timeout: 10000,
+  // 304 由下面的拦截器换成缓存的响应
+  validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
 })
 
-export default api
+// POST查询接口的条件请求：浏览器只对GET自动发送 If-None-Match，
+// 这里按 URL+请求体 记录ETag和响应，数据未变化时服务端只返回304
+const ETAG_CACHE_SIZE = 200
+const etagCache = new Map<string, { etag: string; data: any }>()
+
+const cacheKey = (config: InternalAxiosRequestConfig) =>
+  `${config.url}|${typeof config.data === 'string' ? config.data : JSON.stringify(config.data ?? null)}`
+
+api.interceptors.request.use((config) => {
+  if (config.method === 'post' && !(config.data instanceof FormData)) {
+    const cached = etagCache.get(cacheKey(config))
+    if (cached) {
+      config.headers.set('If-None-Match', `"${cached.etag}"`)
+    }
+  }
+  return config
+})
 
+api.interceptors.response.use((response: AxiosResponse) => {
+  const { config } = response
+  if (config.method !== 'post' || config.data instanceof FormData) {
+    return response
+  }
+  const key = cacheKey(config)
+  if (response.status === 304) {
+    const cached = etagCache.get(key)
+    if (cached) {
+      // 重新插入，保持最近使用的在最后
+      etagCache.delete(key)
+      etagCache.set(key, cached)
+      return { ...response, status: 200, data: cached.data }
+    }
+    return response
+  }
+  const etag = response.headers['etag']
+  if (etag) {
+    etagCache.delete(key)
+    etagCache.set(key, { etag: String(etag).replace(/^W\//, '').replace(/"/g, ''), data: response.data })
+    if (etagCache.size > ETAG_CACHE_SIZE) {
+      etagCache.delete(etagCache.keys().next().value as string)
+    }
+  }
+  return response
+})
+
+export default api
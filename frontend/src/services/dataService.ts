@@ -5,8 +5,34 @@ export const dataService = {
     dataset_id: number
     sql: string
     params?: any[]
+    // 客户端生成的 query_id 可用于在查询返回前调用 cancelQuery
+    query_id?: string
+    timeout_ms?: number
+    max_rows?: number
+    max_bytes?: number
   }) => {
+    // 默认的字典列表格式；列式格式见 querySQLColumnar
     const response = await api.post('/data/query', data)
+    return {
+      data: response.data.data,
+      columns: response.data.columns,
+      query_id: response.data.query_id as string,
+      truncated: response.data.truncated as boolean,
+      truncated_reason: response.data.truncated_reason as 'rows' | 'bytes' | null,
+    }
+  },
+
+  cancelQuery: async (queryId: string): Promise<void> => {
+    await api.post(`/data/query/${queryId}/cancel`)
+  },
+
+  // 列式格式：data 为与 columns 对齐的列数组
+  querySQLColumnar: async (data: {
+    dataset_id: number
+    sql: string
+    params?: any[]
+  }): Promise<{ columns: string[]; data: any[][] }> => {
+    const response = await api.post('/data/query', { ...data, format: 'columnar' })
     return {
       data: response.data.data,
       columns: response.data.columns,
@@ -23,11 +49,79 @@ export const dataService = {
     }>
     limit?: number
     offset?: number
+    // 键集分页：pagination 为 'cursor' 时使用 next_cursor 获取下一页
+    pagination?: 'offset' | 'cursor'
+    cursor?: string
+    order_by?: string
+    order?: 'asc' | 'desc'
+    // 'estimate' 时 total 为近似值（total_approximate 为 true）
+    count_mode?: 'exact' | 'estimate'
+    format?: 'rows' | 'columnar'
+    // 从样本表查询（仅 offset 分页），total 为估计值并附带 total_interval
+    approximate?: boolean
   }) => {
     const response = await api.post('/data/table-data', data)
     return response.data
   },
 
+  aggregate: async (data: {
+    dataset_id: number
+    table_name?: string
+    dimensions?: string[]
+    measures?: Array<{
+      field: string
+      func: 'sum' | 'avg' | 'count' | 'min' | 'max' | 'count_distinct'
+      alias?: string
+    }>
+    filters?: Array<{
+      field: string
+      operator: string
+      value: any
+    }>
+    sort?: Array<{
+      field: string
+      order?: 'asc' | 'desc'
+    }>
+    limit?: number
+    use_rollup?: boolean
+    // 从样本表估算，estimates 中是每行各度量的置信区间
+    approximate?: boolean
+  }) => {
+    const response = await api.post('/data/aggregate', data)
+    return response.data
+  },
+
+  // 跨数据集查询：SQL中以 ds<数据集ID>.<表名> 引用，可以 UNION ALL 或关联多个数据集
+  queryFederated: async (data: {
+    dataset_ids: number[]
+    sql: string
+    params?: any[]
+    query_id?: string
+    timeout_ms?: number
+    max_rows?: number
+    max_bytes?: number
+  }) => {
+    const response = await api.post('/data/federated/query', data)
+    return response.data
+  },
+
+  // 合并多个数据集中的同名表，每行带来源数据集 __dataset_id
+  getFederatedTableData: async (data: {
+    dataset_ids: number[]
+    table_name: string
+    filters?: Array<{
+      field: string
+      operator: string
+      value: any
+    }>
+    limit?: number
+    offset?: number
+    count_mode?: 'exact' | 'none'
+  }) => {
+    const response = await api.post('/data/federated/table-data', data)
+    return response.data
+  },
+
   insertData: async (data: {
     dataset_id: number
     table_name: string
@@ -36,5 +130,17 @@ export const dataService = {
     const response = await api.post('/data/insert', data)
     return response.data
   },
+
+  bulkInsert: async (data: {
+    dataset_id: number
+    table_name: string
+    rows?: Array<Record<string, any>>
+    columns?: Record<string, any[]>
+    batch_size?: number
+    atomic?: boolean
+  }) => {
+    const response = await api.post('/data/bulk-insert', data)
+    return response.data
+  },
 }
 
@@ -42,5 +42,92 @@ export const datasetService = {
   }): Promise<void> => {
     await api.post(`/datasets/${datasetId}/tables/${tableName}/columns`, data)
   },
-}
 
+  importFile: async (datasetId: number, file: File, options: {
+    table_name: string
+    format?: 'csv' | 'parquet'
+    fields?: Array<{ name: string; type: string }>
+    indexes?: string[]
+    if_exists?: 'fail' | 'append'
+    delimiter?: string
+    encoding?: string
+    has_header?: boolean
+  }) => {
+    const form = new FormData()
+    form.append('file', file)
+    form.append('table_name', options.table_name)
+    if (options.format) form.append('format', options.format)
+    if (options.fields) form.append('fields', JSON.stringify(options.fields))
+    if (options.indexes) form.append('indexes', JSON.stringify(options.indexes))
+    if (options.if_exists) form.append('if_exists', options.if_exists)
+    if (options.delimiter) form.append('delimiter', options.delimiter)
+    if (options.encoding) form.append('encoding', options.encoding)
+    if (options.has_header !== undefined) form.append('has_header', String(options.has_header))
+    const response = await api.post(`/datasets/${datasetId}/import`, form)
+    return response.data.data
+  },
+
+  getImportJob: async (jobId: string) => {
+    const response = await api.get(`/datasets/imports/${jobId}`)
+    return response.data.data
+  },
+
+  getRollups: async (datasetId: number) => {
+    const response = await api.get(`/datasets/${datasetId}/rollups`)
+    return response.data.data
+  },
+
+  createRollup: async (datasetId: number, data: {
+    name: string
+    source_table: string
+    dimensions: string[]
+    measures: Array<{
+      field: string
+      func: 'sum' | 'avg' | 'count' | 'min' | 'max'
+    }>
+  }) => {
+    const response = await api.post(`/datasets/${datasetId}/rollups`, data)
+    return response.data.data
+  },
+
+  dropRollup: async (datasetId: number, name: string): Promise<void> => {
+    await api.delete(`/datasets/${datasetId}/rollups/${name}`)
+  },
+
+  refreshRollup: async (datasetId: number, name: string) => {
+    const response = await api.post(`/datasets/${datasetId}/rollups/${name}/refresh`)
+    return response.data.data
+  },
+
+  pinDataset: async (datasetId: number, wait = false) => {
+    const response = await api.post(`/datasets/${datasetId}/replica`, { wait })
+    return response.data.data
+  },
+
+  unpinDataset: async (datasetId: number): Promise<void> => {
+    await api.delete(`/datasets/${datasetId}/replica`)
+  },
+
+  getSamples: async (datasetId: number) => {
+    const response = await api.get(`/datasets/${datasetId}/samples`)
+    return response.data.data
+  },
+
+  createSample: async (datasetId: number, data: {
+    table_name: string
+    target_rows?: number
+  }) => {
+    const response = await api.post(`/datasets/${datasetId}/samples`, data)
+    return response.data.data
+  },
+
+  dropSample: async (datasetId: number, tableName: string): Promise<void> => {
+    await api.delete(`/datasets/${datasetId}/samples/${tableName}`)
+  },
+
+  refreshSample: async (datasetId: number, tableName: string, targetRows?: number) => {
+    const response = await api.post(`/datasets/${datasetId}/samples/${tableName}/refresh`,
+      targetRows ? { target_rows: targetRows } : {})
+    return response.data.data
+  },
+}
@@ -1,10 +1,20 @@
 import api from './api'
-import type { Report, ReportConfig } from '../types'
+import type { Report, ReportConfig, ReportSummary } from '../types'
 
 export const reportService = {
-  getReports: async (): Promise<Report[]> => {
-    const response = await api.get('/reports')
-    return response.data.data
+  // 报表摘要列表（不含 config），完整配置通过 getReport 获取
+  getReports: async (params: {
+    limit?: number
+    offset?: number
+    sort?: 'updated_at' | 'created_at' | 'name' | 'id'
+    order?: 'asc' | 'desc'
+    search?: string
+  } = {}): Promise<{ data: ReportSummary[]; total: number }> => {
+    const response = await api.get('/reports', { params: { ...params, fields: 'summary' } })
+    return {
+      data: response.data.data,
+      total: response.data.total,
+    }
   },
 
   getReport: async (reportId: number): Promise<Report> => {
@@ -34,6 +44,41 @@ export const reportService = {
     return response.data.data
   },
 
+  // 一次请求获取报表所有组件的数据，componentValues 为各组件当前值（如下拉选中值、钻取状态）
+  getReportData: async (
+    reportId: number,
+    data: {
+      component_values?: Record<string, Record<string, any>>
+      limit?: number
+    } = {}
+  ): Promise<{
+    report_id: number
+    updated_at: string
+    components: Record<string, {
+      dataset_id: number
+      data?: any[]
+      columns?: string[]
+      total?: number
+      table_name?: string
+      source: 'fixed' | 'conditional' | 'default'
+      fields?: Record<string, string> | null
+      error?: string
+    }>
+    queries_executed: number
+  }> => {
+    const response = await api.post(`/reports/${reportId}/data`, data)
+    return response.data.data
+  },
+
+  // 在服务端求值条件数据源，返回每个组件选中的数据源（不执行查询）
+  resolveReportSources: async (
+    reportId: number,
+    componentValues: Record<string, Record<string, any>> = {}
+  ) => {
+    const response = await api.post(`/reports/${reportId}/sources`, { component_values: componentValues })
+    return response.data.data
+  },
+
   deleteReport: async (reportId: number): Promise<void> => {
     await api.delete(`/reports/${reportId}`)
   },
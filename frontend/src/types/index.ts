@@ -32,6 +32,9 @@ export interface Report {
   updated_at: string
 }
 
+// 报表列表中的摘要（不含 config）
+export type ReportSummary = Omit<Report, 'config'>
+
 export interface ReportConfig {
   components: ComponentConfig[]
   relations?: Array<{
@@ -133,6 +136,7 @@ export interface ConditionalDataSource {
   conditions: DataSourceCondition[] // 多个条件，支持组合判断
   logicOperator?: 'AND' | 'OR' // 逻辑运算符，默认为 AND
   datasetId: number
+  datasetIds?: number[] // 跨数据集查询：SQL中以 ds<ID>.<表名> 引用，仅设置表名时合并各数据集的同名表
   tableName?: string
   sql?: string
   fields?: Record<string, string> // 字段映射，如果未设置则使用属性配置中的字段映射
@@ -143,6 +147,7 @@ export interface ConditionalDataSource {
 export interface DataSourceConfig {
   type?: 'table' | 'sql' | 'conditional'
   datasetId?: number
+  datasetIds?: number[]
   tableName?: string
   sql?: string
   fields: Record<string, string>
@@ -151,6 +156,7 @@ export interface DataSourceConfig {
   conditionalSources?: ConditionalDataSource[]
   defaultSource?: {
     datasetId: number
+    datasetIds?: number[]
     tableName?: string
     sql?: string
   }
@@ -0,0 +1,47 @@
+import multiprocessing
+import os
+import uuid
+
+# 生产环境启动：gunicorn -c gunicorn.conf.py wsgi:app
+# 平滑重载：向主进程发送 HUP，新工作进程预热完成后旧工作进程处理完当前请求再退出
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+# 每个工作进程内的线程用于在SQLite查询释放GIL期间处理其他请求
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# 工作进程从主进程继承环境变量：按进程平分的内存副本预算需要知道进程数；
+# 服务实例标识用于合并同一次启动的各进程指标，HUP重载时保留，计数器继续累加
+os.environ['WORKER_PROCESSES'] = str(workers)
+os.environ.setdefault('SERVER_INSTANCE_ID', uuid.uuid4().hex)
+
+# 不预加载应用：连接池、后台线程池和内存副本都必须在fork之后由各工作进程自己创建
+preload_app = False
+
+# 工作进程启动时的预热也计入超时，需要留出足够时间
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# 处理一定数量的请求后重启工作进程（0表示不重启），抖动避免所有进程同时重启
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 0))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = os.environ.get('GUNICORN_ERROR_LOG', '-')
+
+
+def worker_exit(server, worker):
+    # 退出前写入尚未保存的报表访问次数，供下次启动时预热使用
+    try:
+        from app.services.report_views import report_views
+        report_views.flush()
+    except Exception:
+        pass
+    # 写入最后的指标快照，退出后其计数并入 retired，不会从合并后的计数器中丢失
+    try:
+        from app.services.metrics import metrics_store
+        metrics_store.publish()
+    except Exception:
+        pass
@@ -42,10 +42,18 @@ def init_database():
             config TEXT NOT NULL,
             created_by VARCHAR(50),
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            revision INTEGER NOT NULL DEFAULT 0
         )
     ''')
     
+    # 报表列表按时间、名称排序和分页
+    cursor.execute('CREATE INDEX idx_reports_updated_at ON reports (updated_at)')
+    cursor.execute('CREATE INDEX idx_reports_created_at ON reports (created_at)')
+    cursor.execute('CREATE INDEX idx_reports_name ON reports (name)')
+    # 按名称前缀搜索（LIKE 不区分大小写，需要 NOCASE 索引）
+    cursor.execute('CREATE INDEX idx_reports_name_nocase ON reports (name COLLATE NOCASE)')
+    
     conn.commit()
     conn.close()
     print("系统数据库创建完成")
@@ -0,0 +1,7 @@
+from app import create_app
+from app.services.warmup import WarmupService
+
+app = create_app()
+
+# gunicorn 在每个工作进程中导入本模块：预热完成后工作进程才开始接受请求
+WarmupService.warm_up()